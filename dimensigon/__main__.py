@@ -31,6 +31,7 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 PLATFORM = platform.system()
 
 from dimensigon.domain.entities import *
+from dimensigon.network import crypto_backend
 from dimensigon.web.network import pack_msg2, unpack_msg2
 from dimensigon.web import create_app, db, get_root_auth
 from dimensigon.utils.helpers import generate_symmetric_key, generate_dimension, get_now
@@ -38,7 +39,7 @@ from dimensigon.utils.helpers import generate_symmetric_key, generate_dimension,
 app: Flask = create_app(os.getenv('FLASK_CONFIG') or 'default')
 
 
-def new(dm: Dimensigon, name: str):
+def new(dm: Dimensigon, name: str, password: str = None):
     dm.create_flask_instance()
     with dm.flask_app.app_context():
         from cryptography import x509
@@ -105,15 +106,18 @@ def new(dm: Dimensigon, name: str):
             User.set_initial()
             user = User.get_by_name('root')
 
-        p = False
-        p2 = True
-        while p != p2:
-            p = prompt_toolkit.prompt("Password for root user: ", is_password=True)
-            p2 = prompt_toolkit.prompt("Re-type same password: ", is_password=True)
-            if p != p2:
-                print('Password mismatch')
-        user.set_password(p)
-        del p, p2
+        if password is None:
+            p = False
+            p2 = True
+            while p != p2:
+                p = prompt_toolkit.prompt("Password for root user: ", is_password=True)
+                p2 = prompt_toolkit.prompt("Re-type same password: ", is_password=True)
+                if p != p2:
+                    print('Password mismatch')
+            password = p
+            del p, p2
+        user.set_password(password)
+        del password
 
         db.session.commit()
 
@@ -194,7 +198,7 @@ def join(dm: Dimensigon, server: str, token: str, port: int = None, ssl: bool =
         pub_key = rsa.PublicKey.load_pkcs1(resp.content)
 
         # Generate Public and Private Temporal Keys
-        tmp_pub, tmp_priv = rsa.newkeys(2048)
+        tmp_pub, tmp_priv = crypto_backend.backend.newkeys(2048)
         symmetric_key = generate_symmetric_key()
         s = Server.get_current()
         data = s.to_json(add_gates=True)
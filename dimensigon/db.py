@@ -80,7 +80,7 @@ def migrate_schema(dm: Dimensigon):
 
 
 def populate_initial_data(dm: Dimensigon):
-    from dimensigon.domain.entities import ActionTemplate, Locker, Server, User, Parameter
+    from dimensigon.domain.entities import ActionTemplate, CatalogDigest, Locker, Server, User, Parameter
 
     with session_scope(session=dm.get_session()) as session:
         gates = dm.config.http_conf.get('binds', None)
@@ -92,6 +92,7 @@ def populate_initial_data(dm: Dimensigon):
         ActionTemplate.set_initial(session)
         User.set_initial(session)
         Parameter.set_initial(session)
+        CatalogDigest.set_initial(session)
 
 
 def _add_columns(engine, table_name, columns_def):
@@ -349,6 +350,12 @@ def _apply_update(engine, new_version, old_version):
         _add_columns(engine, 'L_locker', ['disabled BOOLEAN'])
         with engine.connect() as connection:
             connection.execute(f"UPDATE L_locker SET disabled = 0")
+    elif new_version == 3:
+        _add_columns(engine, 'L_transfer', ['chunk_size INTEGER', 'chunk_checksums JSON'])
+    elif new_version == 4:
+        _add_columns(engine, 'L_transfer', ['chunks_bitmap BLOB'])
+    elif new_version == 5:
+        _create_table(engine, 'L_catalog_digest')
     #     _delete_columns(engine, 'D_server', ['alive'])
     #     with engine.connect() as connection:
     #         date = defaults.INITIAL_DATEMARK.strftime('%Y-%m-%d %H:%M:%S.%f')
@@ -36,9 +36,19 @@ JOIN_TOKEN_EXPIRE_TIME = 15  # join token expire time in minutes
 ROUTE_REFRESH_PERIOD = 300  # route table refresh process
 ROUTE_SEND_PERIOD = 10  # send changed routes every ROUTE_SEND_PERIOD seconds
 CATALOG_REFRESH_PERIOD = 300  # catalog table refresh process
+CATALOG_PAGE_SIZE = 500  # entities requested per page when fetching a catalog delta
+CATALOG_MAX_PAGE_SIZE = 5000  # max entities a node sends per catalog page
+CATALOG_DIGEST_BUCKETS = 256  # leaves of the hash tree kept for every catalog entity
 ZOMBIE_NODE = CATALOG_REFRESH_PERIOD * 2  # a node is considered zombie if we do not get a keepalive after ZOMBIE_NODE
 CLUSTER_SEND_PERIOD = 10  # send cluster changes every CLUSTER_SEND_PERIOD seconds
+CLUSTER_TABLE_SIZE = 10000  # max nodes kept in the shared memory cluster table
+CLUSTER_GOSSIP_FANOUT = 3  # neighbours receiving cluster changes every round. 0 sends changes to every neighbour
+CLUSTER_RETRANSMIT_MULT = 3  # a change is gossiped CLUSTER_RETRANSMIT_MULT * log2(cluster size) times
+CLUSTER_PROBE_PEERS = 3  # peers asked to probe a node before considering it a zombie
 FILE_SYNC_PERIOD = 5  # sync files every FILE_SYNC_PERIOD seconds
+LOG_BATCH_DELAY = 0.5  # seconds new log data is gathered before being sent to its destination
+LOG_BLOCK_SIZE = 4 * 1024 * 1024  # max bytes read from a log in a batch
+LOG_CHECKPOINT_PERIOD = 5  # seconds between writes of the log offset file
 
 # quorum algorithm
 ADULT_NODES = dt.timedelta(hours=24)  # age of a node to be selectable for the quorum
@@ -48,9 +58,39 @@ TIMEOUT_REQUEST = 60
 TIMEOUT_PREVENTING_LOCK = 60  # max time in seconds locker will be in PREVENTING_LOCK before returning to UNLOCK
 TIMEOUT_COMMAND = 20  # max time waiting for a command execution
 TIMEOUT_REMOTE_COMMAND = 2*60*60  # max time waiting for a command execution
+COMMAND_MAX_WORKERS = 4  # max commands of a composite command running concurrently
+COMPILE_CACHE_SIZE = 512  # step templates, expected output patterns and process codes kept compiled (each)
 TIMEOUT_LOCK_REQUEST = 60  # timeout on lock/unlock/prevent_lock HTTP request
 
+# Connection pool
+POOL_MAX_DESTINATIONS = 256  # max destinations with keep-alive connections
+POOL_MAXSIZE = 10  # max keep-alive connections per destination
+POOL_IDLE_TIMEOUT = 60  # seconds an idle connection is kept open
+PROXY_BUFFER_SIZE = 64 * 1024  # bytes relayed at once when forwarding a request to the next hop
+URL_CACHE_SIZE = 4096  # endpoint paths memoized when building urls of outgoing calls
+
+# Timer wheel
+TIMER_WHEEL_TICK = 0.1  # resolution in seconds of scheduled timers
+TIMER_WHEEL_SLOTS = 512  # buckets of the wheel. A full rotation takes TIMER_WHEEL_TICK * TIMER_WHEEL_SLOTS seconds
+TIMER_WHEEL_WORKERS = 4  # max timer functions running concurrently
+
+# Liveness probe
+LIVENESS_PATH = '/alive'  # answered before reaching the application. Used to check gates
+PROBE_CACHE_TTL = 5  # seconds a gate probe result is reused
+
+# Name resolution
+DNS_CACHE_TTL = 60  # seconds a resolved name is used before resolving it again
+DNS_NEGATIVE_TTL = 10  # seconds a name that does not resolve is not looked up again
+DNS_CACHE_SIZE = 1024  # max names kept in cache
+DNS_WORKERS = 4  # max names resolved concurrently in background
+
+# Securizer
+CRYPTO_BACKEND = 'cryptography'  # backend used for signing and key encryption: 'cryptography' or 'rsa'
+SESSION_KEY_TTL = 300  # seconds a symmetric key negotiated with a peer is used before rotating it
+SESSION_KEY_CACHE_SIZE = 1024  # max session keys kept in cache
+
 CHUNK_SIZE = 2  # in MB
+TRANSFER_BUFFER_SIZE = 64 * 1024  # buffer used when streaming chunks from/to disk
 MAX_SENDERS = 4
 
 MIN_SERVERS_QUORUM = 5  # minimum servers to run quorum algorithm
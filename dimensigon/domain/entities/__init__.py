@@ -3,9 +3,9 @@ import threading
 import time
 from contextlib import contextmanager
 
-from sqlalchemy import event, inspect
+from sqlalchemy import event, inspect, select, and_
 from sqlalchemy.engine import Engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.base import NO_VALUE
 from sqlalchemy.pool import Pool
 
 from dimensigon.utils.helpers import get_distributed_entities, get_now
@@ -13,7 +13,8 @@ from dimensigon.web import db
 # Server is used in most of the entities. It must be imported first
 from .server import Server
 from .action_template import ActionTemplate, ActionType
-from .catalog import Catalog
+from .catalog import Catalog, CatalogDigest, record_change, pending_changes, \
+    discard_changes
 from .dimension import Dimension
 from .execution import StepExecution, OrchExecution
 from .file import File, FileServerAssociation
@@ -31,7 +32,7 @@ from .transfer import Transfer, Status as TransferStatus
 from .user import User
 from .vault import Vault
 
-SCHEMA_VERSION = 2
+SCHEMA_VERSION = 5
 
 _LOGGER = logging.getLogger('dm.catalog')
 
@@ -39,6 +40,7 @@ __all__ = [
     "ActionTemplate",
     "ActionType",
     "Catalog",
+    "CatalogDigest",
     "Dimension",
     "StepExecution",
     "OrchExecution",
@@ -86,6 +88,18 @@ def update_datemark(set):
     catalog.datemark = set
 
 
+def _stored_datemark(mapper, connection, target):
+    """returns the last_modified_at of target in the database"""
+    it = inspect(target)
+    value = it.committed_state.get('last_modified_at', it.dict.get('last_modified_at'))
+    if value is None or value is NO_VALUE:
+        # not loaded
+        table = mapper.local_table
+        value = connection.scalar(select([table.c.last_modified_at]).where(
+            and_(*[c == v for c, v in zip(mapper.primary_key, mapper.primary_key_from_instance(target))])))
+    return value
+
+
 for name, entity in get_distributed_entities():
     def receive_before_insert(mapper, connection, target):
         if not hasattr(catalog, 'data'):
@@ -97,6 +111,9 @@ for name, entity in get_distributed_entities():
         else:
             catalog.data.update(
                 {target.__class__: max(target.last_modified_at, catalog.data[target.__class__])})
+        if not target.hard_delete:
+            record_change(target.__class__.__name__, mapper.primary_key_from_instance(target), None,
+                          target.last_modified_at)
 
 
     def receive_before_update(mapper, connection, target):
@@ -107,6 +124,7 @@ for name, entity in get_distributed_entities():
         if changed:
             if not hasattr(catalog, 'data'):
                 catalog.data = {}
+            old = None if target.hard_delete else _stored_datemark(mapper, connection, target)
             if getattr(catalog, 'datemark', True):
                 target.last_modified_at = get_now()
             if not target.__class__ in catalog.data:
@@ -114,34 +132,47 @@ for name, entity in get_distributed_entities():
             else:
                 catalog.data.update(
                     {target.__class__: max(target.last_modified_at, catalog.data[target.__class__])})
+            if not target.hard_delete:
+                record_change(target.__class__.__name__, mapper.primary_key_from_instance(target), old,
+                              target.last_modified_at)
+
+
+    def receive_before_delete(mapper, connection, target):
+        record_change(target.__class__.__name__, mapper.primary_key_from_instance(target),
+                      _stored_datemark(mapper, connection, target), None)
 
 
     event.listen(entity, 'before_insert', receive_before_insert, propagate=False)
     event.listen(entity, 'before_update', receive_before_update, propagate=False)
+    if not entity.hard_delete:
+        event.listen(entity, 'before_delete', receive_before_delete, propagate=False)
 
 
-@event.listens_for(db.session, 'after_commit')
-def receive_after_commit(session):
-    # TODO: run this peace of code in a thread to allow the request end while executing the queries
-    if hasattr(catalog, 'data'):
-        # create a different session as the request session is already commited
-        engine = db.get_engine()
-        Session = sessionmaker(bind=engine)
-        s = Session()
-        for e, last_modified_at in catalog.data.items():
-            # last_modified_at = s.query(func.max(e.last_modified_at)).scalar()
-            c = s.query(Catalog).filter_by(entity=e.__name__).first()
+@event.listens_for(db.session, 'before_commit')
+def receive_before_commit(session):
+    # catalog bookkeeping is written in the same transaction as the entities it tracks
+    session.flush()
+    data = getattr(catalog, 'data', None)
+    if data:
+        catalog.data = {}
+        last_modified = {e.__name__: last_modified_at for e, last_modified_at in data.items()}
+        existing = {c.entity: c for c in session.query(Catalog).filter(Catalog.entity.in_(last_modified))}
+        for entity, last_modified_at in last_modified.items():
+            c = existing.get(entity)
             if c is None:
-                c = Catalog(entity=e.__name__, last_modified_at=last_modified_at)
-            else:
-                if c.last_modified_at < last_modified_at:
-                    c.last_modified_at = last_modified_at
+                c = Catalog(entity=entity, last_modified_at=last_modified_at)
+                session.add(c)
+            elif c.last_modified_at < last_modified_at:
+                c.last_modified_at = last_modified_at
             _LOGGER.debug(f'changed catalog {c}')
-            s.add(c)
-            s.commit()
-            del c
-        catalog.data = {}
-        s.close()
+    if pending_changes():
+        CatalogDigest.apply(session)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def receive_after_rollback(session):
+    catalog.data = {}
+    discard_changes()
 
 
 @event.listens_for(Orchestration, 'refresh')
@@ -92,6 +92,7 @@ class SoftDeleteMixin:
 
 class DistributedEntityMixin:
     order = None
+    hard_delete = False  # rows are removed from the database. Deletions are not propagated, so not in catalog digest
     last_modified_at = Column(UtcDateTime(), nullable=False)
 
     def __init__(self, **kwargs):
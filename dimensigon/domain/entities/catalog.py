@@ -1,7 +1,13 @@
+import hashlib
+import json
+import threading
 import typing as t
-from datetime import datetime
+from datetime import datetime, timezone
+
+from sqlalchemy import inspect, text
 
 from dimensigon import defaults
+from dimensigon.domain.entities.parameter import Parameter
 from dimensigon.utils.typos import UtcDateTime
 from dimensigon.web import db
 
@@ -24,3 +30,166 @@ class Catalog(db.Model):
         if catalog_ver is None:
             catalog_ver = defaults.INITIAL_DATEMARK
         return catalog_ver.strftime(defaults.DATEMARK_FORMAT) if out is str else catalog_ver
+
+
+def digest_key(key: t.Iterable) -> str:
+    """primary key of a catalog row as used in the digest"""
+    return json.dumps([str(v) for v in key])
+
+
+def to_datemark(last_modified_at: datetime) -> str:
+    if last_modified_at.tzinfo is None:
+        last_modified_at = last_modified_at.replace(tzinfo=timezone.utc)
+    return last_modified_at.astimezone(timezone.utc).strftime(defaults.DATEMARK_FORMAT)
+
+
+def digest_bucket(entity: str, key: str) -> int:
+    """bucket of a row. Depends only on the primary key, so a row never changes its bucket"""
+    h = hashlib.sha256(f"{entity}\0{key}".encode()).digest()
+    return int.from_bytes(h[:4], 'big') % defaults.CATALOG_DIGEST_BUCKETS
+
+
+def row_digest(entity: str, key: str, last_modified_at: datetime) -> int:
+    h = hashlib.sha256(f"{entity}\0{key}\0{to_datemark(last_modified_at)}".encode()).digest()
+    return int.from_bytes(h[:8], 'big', signed=True)
+
+
+def digested_entities() -> t.List[t.Tuple[str, t.Any]]:
+    """distributed entities hashed into the digest. Hard-deleted rows leave no trace to propagate, so a digest
+    including them would never converge and repair would bring them back"""
+    from dimensigon.utils.helpers import get_distributed_entities
+    return [(name, entity) for name, entity in get_distributed_entities() if not entity.hard_delete]
+
+
+# leaf changes flushed in the current thread and not committed yet
+_pending = threading.local()
+
+
+def record_change(entity: str, key: t.Iterable, old: t.Optional[datetime], new: t.Optional[datetime]):
+    """records a row going from last_modified_at old to new. None means the row does not exist"""
+    dkey = digest_key(key)
+    value = (row_digest(entity, dkey, old) if old else 0) ^ (row_digest(entity, dkey, new) if new else 0)
+    if value:
+        if not hasattr(_pending, 'changes'):
+            _pending.changes = {}
+        leaf = (entity, digest_bucket(entity, dkey))
+        _pending.changes[leaf] = _pending.changes.get(leaf, 0) ^ value
+
+
+def pending_changes() -> bool:
+    return bool(getattr(_pending, 'changes', None))
+
+
+def discard_changes():
+    _pending.changes = {}
+
+
+class CatalogDigest(db.Model):
+    """Hash tree of the catalog rows of every digested entity.
+
+    Rows are hashed into CATALOG_DIGEST_BUCKETS leaves by their primary key. A leaf is the XOR of the digests of its
+    rows (primary key and last_modified_at), so it is updated incrementally when a row is inserted or modified without
+    reading the other rows. Leaves with no rows are not stored. The root of an entity hashes its leaves, and the
+    catalog digest hashes the roots. Nodes with the same catalog digest have the same rows.
+    """
+    __tablename__ = 'L_catalog_digest'
+    entity = db.Column(db.String(40), primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True)
+    digest = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__}({self.entity}, {self.bucket}, {self.digest})>'
+
+    @classmethod
+    def apply(cls, session):
+        """XORs the changes recorded in the current thread into the leaves"""
+        changes = {leaf: value for leaf, value in getattr(_pending, 'changes', {}).items() if value}
+        discard_changes()
+        if not changes:
+            return
+        existing = set(session.query(cls.entity, cls.bucket).filter(
+            cls.entity.in_({entity for entity, _ in changes})))
+        update = [dict(entity=e, bucket=b, value=v) for (e, b), v in changes.items() if (e, b) in existing]
+        if update:
+            # XOR done in the database as leaves may be updated from different processes
+            session.execute(text(f"UPDATE {cls.__tablename__} SET digest = (digest | :value) & ~(digest & :value) "
+                                 f"WHERE entity = :entity AND bucket = :bucket"), update)
+        session.bulk_insert_mappings(cls, [dict(entity=e, bucket=b, digest=v) for (e, b), v in changes.items()
+                                           if (e, b) not in existing])
+        cls._store_digest(session)
+
+    @staticmethod
+    def entity_rows(entity, session=None, buckets: t.Container[int] = None) \
+            -> t.Dict[str, t.Tuple[int, datetime, t.Tuple]]:
+        """returns bucket, last_modified_at and primary key of every row of the entity (deleted ones included) by
+        digest key. If buckets specified, only rows hashed into them are returned"""
+        session = session or db.session
+        pk = inspect(entity).primary_key
+        rows = {}
+        for *key, last_modified_at in session.query(*pk, entity.last_modified_at):
+            dkey = digest_key(key)
+            bucket = digest_bucket(entity.__name__, dkey)
+            if buckets is None or bucket in buckets:
+                rows[dkey] = (bucket, last_modified_at, tuple(key))
+        return rows
+
+    @classmethod
+    def rebuild(cls, session=None):
+        """computes the leaves of every digested entity from its rows"""
+        session = session or db.session
+        session.flush()
+        # rows flushed so far are already counted
+        discard_changes()
+        session.query(cls).delete()
+        for name, entity in digested_entities():
+            leaves = {}
+            for dkey, (bucket, last_modified_at, _) in cls.entity_rows(entity, session).items():
+                leaves[bucket] = leaves.get(bucket, 0) ^ row_digest(name, dkey, last_modified_at)
+            session.add_all([cls(entity=name, bucket=b, digest=d) for b, d in leaves.items() if d])
+        session.flush()
+        cls._store_digest(session)
+
+    @classmethod
+    def set_initial(cls, session=None):
+        # rebuilt on start to drop any drift from changes not recorded (e.g. a process killed while committing)
+        cls.rebuild(session)
+
+    @classmethod
+    def leaves(cls, entity: str, session=None) -> t.List[int]:
+        session = session or db.session
+        leaves = [0] * defaults.CATALOG_DIGEST_BUCKETS
+        for bucket, digest in session.query(cls.bucket, cls.digest).filter_by(entity=entity):
+            leaves[bucket] = digest
+        return leaves
+
+    @classmethod
+    def roots(cls, session=None) -> t.Dict[str, str]:
+        """returns the root hash of every entity with rows"""
+        session = session or db.session
+        leaves = {}
+        for entity, bucket, digest in session.query(cls.entity, cls.bucket, cls.digest).order_by(cls.entity,
+                                                                                                    cls.bucket):
+            if digest:
+                leaves.setdefault(entity, []).append(f"{bucket}:{digest}")
+        return {entity: hashlib.sha256(','.join(l).encode()).hexdigest() for entity, l in leaves.items()}
+
+    @classmethod
+    def _compute_digest(cls, session=None) -> str:
+        roots = cls.roots(session)
+        return hashlib.sha256(','.join(f"{e}:{r}" for e, r in sorted(roots.items())).encode()).hexdigest()
+
+    @classmethod
+    def _store_digest(cls, session):
+        # stored in the same transaction as the leaves, so every process reads it up to date
+        p = session.query(Parameter).get('catalog_digest')
+        if p is None:
+            p = Parameter('catalog_digest')
+            session.add(p)
+        p.value = cls._compute_digest(session)
+
+    @classmethod
+    def catalog_digest(cls, session=None) -> str:
+        """returns the digest stored when the leaves last changed instead of hashing them on every call"""
+        session = session or db.session
+        p = session.query(Parameter).get('catalog_digest')
+        return p.value if p and p.value else cls._compute_digest(session)
@@ -26,6 +26,7 @@ Destination_Servers = t.List[t.Union[t.Tuple[Server, str], t.Tuple[Id, str], Ser
 class FileServerAssociation(DistributedEntityMixin, SoftDeleteMixin, db.Model):
     __tablename__ = 'D_file_server_association'
     order = 30
+    hard_delete = True
 
     file_id = db.Column(typos.UUID, db.ForeignKey('D_file.id'), nullable=False, primary_key=True)
     dst_server_id = db.Column(typos.UUID, db.ForeignKey('D_server.id'), nullable=False, primary_key=True)
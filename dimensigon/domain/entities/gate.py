@@ -2,6 +2,8 @@ import copy
 import ipaddress
 import typing as t
 
+from sqlalchemy.orm.exc import NoResultFound
+
 from dimensigon import defaults
 from dimensigon.domain.entities.base import UUIDistributedEntityMixin, SoftDeleteMixin
 from dimensigon.utils.typos import UUID, IP as IPType
@@ -57,7 +59,9 @@ class Gate(UUIDistributedEntityMixin, SoftDeleteMixin, db.Model):
             kwargs['server'] = server
         kwargs['ip'] = ipaddress.ip_address(kwargs.get('ip')) if isinstance(kwargs.get('ip'), str) else kwargs.get('ip')
         if 'server_id' in kwargs and kwargs['server_id'] is not None:
-            # through db.session to allow load from removed entities
-            kwargs['server'] = db.session.query(Server).filter_by(id=kwargs.get('server_id')).one()
-            kwargs.pop('server_id')
+            # through db.session to allow load from removed entities. get() avoids the query when server is already
+            # in the session
+            kwargs['server'] = db.session.query(Server).get(kwargs.pop('server_id'))
+            if kwargs['server'] is None:
+                raise NoResultFound('No row was found for one()')
         return super().from_json(kwargs)
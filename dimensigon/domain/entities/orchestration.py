@@ -134,7 +134,7 @@ class Orchestration(UUIDistributedEntityMixin, db.Model):
             steps = step
 
         for step in steps:
-            if not (step in self._graph.nodes and step.orchestration is self):
+            if not (step in self._graph and step.orchestration is self):
                 raise ValueError(f'{step} is NOT from this orchestration')
 
     def _check_dependencies(self, step, parents=None, children=None):
@@ -2,20 +2,26 @@ import copy
 import datetime as dt
 import ipaddress
 import logging
-import socket
 import typing as t
+import weakref
 
-from flask import current_app, url_for, g
-from sqlalchemy import or_
+from flask import current_app, g
+from sqlalchemy import or_, event
 
+from dimensigon.network.resolver import resolver
 from dimensigon.utils.typos import ScalarListType, Gate as TGate, UtcDateTime, Id
 from dimensigon.web import db, errors
+from dimensigon.web.url_builder import url_path
 from .base import UUIDistributedEntityMixin, SoftDeleteMixin
 from .gate import Gate
 from .route import Route, RouteContainer
 from ... import defaults
 from ...utils.helpers import get_ips, get_now, is_iterable_not_string
 
+# id of the current server on every database (engine). Ids are checked against the session before being used, so
+# a stale entry (i.e. database recreated) falls back to querying. Each process keeps its own copy.
+_current_ids: t.MutableMapping[t.Any, Id] = weakref.WeakKeyDictionary()
+
 
 class Server(UUIDistributedEntityMixin, SoftDeleteMixin, db.Model):
     __tablename__ = 'D_server'
@@ -76,19 +82,8 @@ class Server(UUIDistributedEntityMixin, SoftDeleteMixin, db.Model):
     def external_gates(self):
         e_g = []
         for g in self.gates:
-            if not g.ip:
-                try:
-                    ip = ipaddress.ip_address(
-                        socket.getaddrinfo(g.dns, 0, family=socket.AF_INET, proto=socket.IPPROTO_TCP)[0][4][0])
-                except socket.gaierror:
-                    e_g.append(g)
-                    continue
-                except KeyError:
-                    e_g.append(g)
-                    continue
-            else:
-                ip = g.ip
-            if not ip.is_loopback:
+            ip = g.ip or resolver.resolve(g.dns)
+            if ip is None or not ip.is_loopback:
                 e_g.append(g)
         return e_g
 
@@ -96,17 +91,8 @@ class Server(UUIDistributedEntityMixin, SoftDeleteMixin, db.Model):
     def localhost_gates(self):
         l_g = []
         for g in self.gates:
-            if not g.ip:
-                try:
-                    ip = ipaddress.ip_address(
-                        socket.getaddrinfo(g.dns, 0, family=socket.AF_INET, proto=socket.IPPROTO_TCP)[0][4][0])
-                except socket.gaierror:
-                    continue
-                except KeyError:
-                    continue
-            else:
-                ip = g.ip
-            if ip.is_loopback:
+            ip = g.ip or resolver.resolve(g.dns)
+            if ip is not None and ip.is_loopback:
                 l_g.append(g)
         return l_g
 
@@ -132,7 +118,7 @@ class Server(UUIDistributedEntityMixin, SoftDeleteMixin, db.Model):
 
     def url(self, view: str = None, **values) -> str:
         """
-        generates the full url to access the server. Uses url_for to generate the full_path.
+        generates the full url to access the server. Uses url_path to generate the full_path.
 
         Parameters
         ----------
@@ -172,8 +158,7 @@ class Server(UUIDistributedEntityMixin, SoftDeleteMixin, db.Model):
         if view is None:
             return root_path
         else:
-            with current_app.test_request_context():
-                return root_path + url_for(view, **values)
+            return root_path + url_path(view, **values)
 
     @classmethod
     def get_neighbours(cls, exclude: t.Union[t.Union[Id, 'Server'], t.List[t.Union[Id, 'Server']]] = None,
@@ -274,7 +259,16 @@ class Server(UUIDistributedEntityMixin, SoftDeleteMixin, db.Model):
     def get_current(cls, session=None) -> 'Server':
         if session is None:
             session = db.session
-        return session.query(cls).filter_by(_me=True).filter_by(deleted=False).one()
+        bind = session.get_bind(mapper=cls.__mapper__)
+        server_id = _current_ids.get(bind)
+        if server_id is not None:
+            # no SQL is emitted if server is already in the session
+            server = session.query(cls).get(server_id)
+            if server is not None and server._me and not server.deleted:
+                return server
+        server = session.query(cls).filter_by(_me=True).filter_by(deleted=False).one()
+        _current_ids[bind] = server.id
+        return server
 
     @staticmethod
     def set_initial(session=None, gates=None) -> Id:
@@ -332,3 +326,10 @@ class Server(UUIDistributedEntityMixin, SoftDeleteMixin, db.Model):
             fsa.delete()
         for f in self.files:
             f.delete()
+
+
+@event.listens_for(Server, 'after_update')
+@event.listens_for(Server, 'after_delete')
+def _receive_current_changed(mapper, connection, target):
+    if _current_ids.get(connection.engine) == target.id:
+        _current_ids.pop(connection.engine, None)
@@ -27,6 +27,7 @@ step_step = db.Table('D_step_step',
 class Step(UUIDistributedEntityMixin, db.Model):
     __tablename__ = "D_step"
     order = 30
+    hard_delete = True
     orchestration_id = db.Column(UUID, db.ForeignKey('D_orchestration.id'), nullable=False)
     action_template_id = db.Column(UUID, db.ForeignKey('D_action_template.id'))
     undo = db.Column(db.Boolean, nullable=False)
@@ -35,11 +35,14 @@ class Transfer(UUIDEntityMixin, EntityReprMixin, db.Model):
     _filename = db.Column("filename", db.String(256))
     _size = db.Column("size", db.Integer)
     _checksum = db.Column("checksum", db.Text())
+    chunk_size = db.Column(db.Integer)
+    chunk_checksums = db.Column(db.JSON)  # chunks written in place with their verified md5 (None if not verified)
+    chunks_bitmap = db.Column(db.LargeBinary)  # bit n set when chunk n has been received
 
     software = db.relationship("Software", uselist=False)
 
     def __init__(self, software: t.Union[Software, str], dest_path: str, num_chunks: int, status: Status = None,
-                 size: int = None, checksum: str = None, created_on=None,
+                 size: int = None, checksum: str = None, created_on=None, chunk_size: int = None,
                  **kwargs):
         super().__init__(**kwargs)
         if isinstance(software, Software):
@@ -54,6 +57,7 @@ class Transfer(UUIDEntityMixin, EntityReprMixin, db.Model):
             self._checksum = checksum
         self.dest_path = dest_path
         self.num_chunks = num_chunks
+        self.chunk_size = chunk_size
         self.status = status or Status.WAITING_CHUNKS
         self.created_on = created_on or get_now()
 
@@ -68,6 +72,8 @@ class Transfer(UUIDEntityMixin, EntityReprMixin, db.Model):
         else:
             json.update(size=self._size, checksum=self._checksum)
 
+        if self.chunk_size:
+            json.update(chunk_size=self.chunk_size)
         if self.started_on:
             json.update(started_on=self.started_on.strftime(dimensigon.defaults.DATETIME_FORMAT))
         if self.ended_on:
@@ -95,6 +101,33 @@ class Transfer(UUIDEntityMixin, EntityReprMixin, db.Model):
         else:
             return self._checksum
 
+    def set_chunk_received(self, chunk: int):
+        bitmap = bytearray(self.chunks_bitmap or bytes((self.num_chunks + 7) // 8))
+        bitmap[chunk // 8] |= 1 << (chunk % 8)
+        self.chunks_bitmap = bytes(bitmap)
+
+    def is_chunk_received(self, chunk: int) -> bool:
+        return bool(self.chunks_bitmap and self.chunks_bitmap[chunk // 8] & (1 << (chunk % 8)))
+
+    @property
+    def received_chunks(self) -> int:
+        return sum(bin(b).count('1') for b in self.chunks_bitmap or b'')
+
+    def missing_ranges(self) -> t.List[t.Tuple[int, int]]:
+        """returns the chunks not received yet as a list of [start, end) ranges"""
+        ranges = []
+        start = None
+        for chunk in range(self.num_chunks):
+            if self.is_chunk_received(chunk):
+                if start is not None:
+                    ranges.append((start, chunk))
+                    start = None
+            elif start is None:
+                start = chunk
+        if start is not None:
+            ranges.append((start, self.num_chunks))
+        return ranges
+
     def wait_transfer(self, timeout=None, refresh_interval: float = 0.02) -> Status:
         timeout = timeout or 300
         refresh_interval = refresh_interval
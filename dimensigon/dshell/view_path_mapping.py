@@ -2,9 +2,11 @@ view_path_map = {'api_1_0.actiontemplatelist': '/api/v1.0/action_templates',
                  'api_1_0.actiontemplateresource': '/api/v1.0/action_templates/<action_template_id>',
                  'api_1_0.catalog': '/api/v1.0/catalog/<string:data_mark>',
                  'api_1_0.catalog_update': '/api/v1.0/catalog',
+                 'api_1_0.catalog_digest': '/api/v1.0/catalog/digest',
                  'api_1_0.cluster': '/api/v1.0/cluster',
                  'api_1_0.cluster_in': '/api/v1.0/cluster/in/<server_id>',
                  'api_1_0.cluster_out': '/api/v1.0/cluster/out/<server_id>',
+                 'api_1_0.cluster_probe': '/api/v1.0/cluster/probe/<server_id>',
                  'api_1_0.events': '/api/v1.0/events/<event_id>',
                  'api_1_0.file_sync': '/api/v1.0/file/<file_id>/sync',
                  'api_1_0.filelist': '/api/v1.0/file',
@@ -49,6 +51,8 @@ view_path_map = {'api_1_0.actiontemplatelist': '/api/v1.0/action_templates',
                  'api_1_0.stepresource': '/api/v1.0/steps/<step_id>',
                  'api_1_0.transferlist': '/api/v1.0/transfers',
                  'api_1_0.transferresource': '/api/v1.0/transfers/<transfer_id>',
+                 'api_1_0.transferchunklist': '/api/v1.0/transfers/<transfer_id>/chunks',
+                 'api_1_0.transferchunkresource': '/api/v1.0/transfers/<transfer_id>/chunks/<chunk>',
                  'api_1_0.userlist': '/api/v1.0/users',
                  'api_1_0.userresource': '/api/v1.0/users/<user_id>',
                  'api_1_0.vaultlist': '/api/v1.0/vault',
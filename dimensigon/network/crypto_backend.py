@@ -0,0 +1,176 @@
+"""
+Asymmetric primitives used by the securizer.
+
+Keys are stored and exchanged in `rsa` (PKCS#1) format. :class:`CryptographyBackend` converts them into the
+C-accelerated `cryptography` objects once and keeps them cached, while :class:`RsaBackend` keeps using the pure-Python
+implementation. Both backends use PKCS#1 v1.5 padding so signatures and encrypted keys are interchangeable between
+nodes running different backends.
+"""
+import threading
+import time
+import typing as t
+from abc import ABC, abstractmethod
+
+import rsa
+from rsa.pkcs1 import VerificationError, DecryptionError
+
+from dimensigon import defaults
+
+HASH_METHOD = 'SHA-512'
+
+
+class CryptoBackend(ABC):
+    name: str = None
+
+    @abstractmethod
+    def sign(self, message: bytes, priv_key: rsa.PrivateKey) -> bytes:
+        """signs message"""
+
+    @abstractmethod
+    def verify(self, message: bytes, signature: bytes, pub_key: rsa.PublicKey):
+        """verifies signature. Raises rsa.pkcs1.VerificationError if signature is not valid"""
+
+    @abstractmethod
+    def encrypt(self, message: bytes, pub_key: rsa.PublicKey) -> bytes:
+        """encrypts message"""
+
+    @abstractmethod
+    def decrypt(self, crypto: bytes, priv_key: rsa.PrivateKey) -> bytes:
+        """decrypts crypto. Raises rsa.pkcs1.DecryptionError if padding is not valid.
+
+        OpenSSL 3.2 and later use implicit rejection for PKCS#1 v1.5: decrypting with the wrong key returns random
+        bytes instead of failing. Callers must validate the format of the plain text.
+        """
+
+    @abstractmethod
+    def newkeys(self, nbits: int) -> t.Tuple[rsa.PublicKey, rsa.PrivateKey]:
+        """generates a new key pair"""
+
+
+class RsaBackend(CryptoBackend):
+    name = 'rsa'
+
+    def sign(self, message, priv_key):
+        return rsa.sign(message, priv_key, HASH_METHOD)
+
+    def verify(self, message, signature, pub_key):
+        rsa.verify(message, signature, pub_key)
+
+    def encrypt(self, message, pub_key):
+        return rsa.encrypt(message, pub_key)
+
+    def decrypt(self, crypto, priv_key):
+        return rsa.decrypt(crypto, priv_key)
+
+    def newkeys(self, nbits):
+        return rsa.newkeys(nbits)
+
+
+class CryptographyBackend(CryptoBackend):
+    name = 'cryptography'
+
+    def __init__(self):
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding, rsa as c_rsa
+
+        self._InvalidSignature = InvalidSignature
+        self._backend = default_backend()
+        self._hash = hashes.SHA512
+        self._padding = padding.PKCS1v15
+        self._c_rsa = c_rsa
+        self._lock = threading.Lock()
+        self._private_keys = {}
+        self._public_keys = {}
+
+    def _private_key(self, priv_key: rsa.PrivateKey):
+        key = self._private_keys.get(priv_key.n)
+        if key is None:
+            c_rsa = self._c_rsa
+            public_numbers = c_rsa.RSAPublicNumbers(priv_key.e, priv_key.n)
+            key = c_rsa.RSAPrivateNumbers(p=priv_key.p, q=priv_key.q, d=priv_key.d, dmp1=priv_key.exp1,
+                                          dmq1=priv_key.exp2, iqmp=priv_key.coef,
+                                          public_numbers=public_numbers).private_key(self._backend)
+            with self._lock:
+                self._private_keys[priv_key.n] = key
+        return key
+
+    def _public_key(self, pub_key: rsa.PublicKey):
+        key = self._public_keys.get(pub_key.n)
+        if key is None:
+            key = self._c_rsa.RSAPublicNumbers(pub_key.e, pub_key.n).public_key(self._backend)
+            with self._lock:
+                self._public_keys[pub_key.n] = key
+        return key
+
+    def sign(self, message, priv_key):
+        return self._private_key(priv_key).sign(message, self._padding(), self._hash())
+
+    def verify(self, message, signature, pub_key):
+        try:
+            self._public_key(pub_key).verify(signature, message, self._padding(), self._hash())
+        except self._InvalidSignature:
+            raise VerificationError('Verification failed')
+
+    def encrypt(self, message, pub_key):
+        return self._public_key(pub_key).encrypt(message, self._padding())
+
+    def decrypt(self, crypto, priv_key):
+        try:
+            return self._private_key(priv_key).decrypt(crypto, self._padding())
+        except ValueError:
+            raise DecryptionError('Decryption failed')
+
+    def newkeys(self, nbits):
+        key = self._c_rsa.generate_private_key(public_exponent=65537, key_size=nbits, backend=self._backend)
+        n = key.private_numbers()
+        priv_key = rsa.PrivateKey(n.public_numbers.n, n.public_numbers.e, n.d, n.p, n.q)
+        return rsa.PublicKey(priv_key.n, priv_key.e), priv_key
+
+
+BACKENDS = {RsaBackend.name: RsaBackend, CryptographyBackend.name: CryptographyBackend}
+
+
+def get_backend(name: str = None) -> CryptoBackend:
+    """returns an instance of the backend. Falls back to the pure-Python backend if cryptography is not available"""
+    name = name or defaults.CRYPTO_BACKEND
+    try:
+        return BACKENDS[name]()
+    except ImportError:
+        return RsaBackend()
+
+
+backend = get_backend()
+
+
+def set_backend(name: str):
+    global backend
+    backend = get_backend(name)
+
+
+def benchmark(nbits: int = 4096, rounds: int = 20) -> t.Dict[str, t.Dict[str, float]]:
+    """measures average seconds per operation of every backend"""
+    message = b'x' * 1024
+    pub_key, priv_key = CryptographyBackend().newkeys(nbits)
+    result = {}
+    for name, backend_class in BACKENDS.items():
+        b = backend_class()
+        signature = b.sign(message, priv_key)
+        crypto = b.encrypt(message[:32], pub_key)
+        ops = dict(sign=lambda: b.sign(message, priv_key),
+                   verify=lambda: b.verify(message, signature, pub_key),
+                   encrypt=lambda: b.encrypt(message[:32], pub_key),
+                   decrypt=lambda: b.decrypt(crypto, priv_key))
+        result[name] = {}
+        for op, func in ops.items():
+            start = time.perf_counter()
+            for _ in range(rounds):
+                func()
+            result[name][op] = (time.perf_counter() - start) / rounds
+    return result
+
+
+if __name__ == '__main__':
+    for name, ops in benchmark().items():
+        print(f"{name:>12}: " + ', '.join(f"{op} {elapsed * 1000:.3f} ms" for op, elapsed in ops.items()))
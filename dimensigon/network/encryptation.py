@@ -1,13 +1,21 @@
 import base64
 import copy
+import hashlib
 import json
 import pickle
+import re
+import threading
+import time
 import typing as t
+from collections import OrderedDict
 
 import rsa
+from rsa.pkcs1 import DecryptionError
 
+from dimensigon import defaults
 from dimensigon.domain.entities import Server
-from dimensigon.utils.helpers import encrypt, decrypt
+from dimensigon.utils.helpers import encrypt, decrypt, generate_symmetric_key
+from . import crypto_backend
 from .exceptions import NotValidMessage
 
 if t.TYPE_CHECKING:
@@ -28,6 +36,77 @@ Create dict like servers
 """
 
 
+# urlsafe base64 of a 32 bytes Fernet key
+_SYMMETRIC_KEY_PATTERN = re.compile(rb'[A-Za-z0-9_-]{43}=')
+
+
+def _check_symmetric_key(key: bytes) -> bytes:
+    # PKCS#1 v1.5 implicit rejection (OpenSSL >= 3.2) returns random bytes when key was not encrypted for priv_key
+    if not _SYMMETRIC_KEY_PATTERN.fullmatch(key):
+        raise DecryptionError('Decryption failed')
+    return key
+
+
+class SessionKeyCache:
+    """
+    Cache of symmetric session keys.
+
+    Keys sent to a peer are generated and RSA encrypted once per rotation window (`ttl` seconds) instead of once per
+    message. Received cipher keys are RSA decrypted once and looked up by their digest afterwards. Every message still
+    carries its encrypted key, so a peer that lost its cache (or does not have one) is always able to unpack it.
+    """
+
+    def __init__(self, ttl: float = defaults.SESSION_KEY_TTL, maxsize: int = defaults.SESSION_KEY_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._peers: t.Dict[t.Tuple[str, int], t.Tuple[bytes, bytes, float]] = OrderedDict()
+        self._known: t.Dict[t.Tuple[bytes, int], t.Tuple[bytes, float]] = OrderedDict()
+
+    @staticmethod
+    def _bounded_set(cache: OrderedDict, key, value, maxsize):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > maxsize:
+            cache.popitem(last=False)
+
+    def get(self, peer: str, pub_key: rsa.PublicKey) -> t.Tuple[bytes, bytes]:
+        """returns the symmetric key and its encrypted form used to send messages to peer. Rotates it if expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._peers.get((peer, pub_key.n))
+        if entry is None or entry[2] < now:
+            symmetric_key = generate_symmetric_key()
+            cipher_key = crypto_backend.backend.encrypt(symmetric_key, pub_key)
+            entry = (symmetric_key, cipher_key, now + self.ttl)
+            with self._lock:
+                self._bounded_set(self._peers, (peer, pub_key.n), entry, self.maxsize)
+                # answers from peer may come with the same cipher key
+                self._bounded_set(self._known, (hashlib.sha256(cipher_key).digest(), pub_key.n),
+                                  (symmetric_key, entry[2]), self.maxsize)
+        return entry[0], entry[1]
+
+    def resolve(self, cipher_key: bytes, priv_key: rsa.PrivateKey) -> bytes:
+        """returns the symmetric key from cipher_key. RSA decryption only runs when cipher_key is not cached"""
+        now = time.monotonic()
+        key = (hashlib.sha256(cipher_key).digest(), priv_key.n)
+        with self._lock:
+            entry = self._known.get(key)
+        if entry is None or entry[1] < now:
+            entry = (_check_symmetric_key(crypto_backend.backend.decrypt(cipher_key, priv_key)), now + self.ttl)
+            with self._lock:
+                self._bounded_set(self._known, key, entry, self.maxsize)
+        return entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._peers.clear()
+            self._known.clear()
+
+
+session_keys = SessionKeyCache()
+
+
 def pack_msg(data,
              destination: t.Union[Server, str] = None,
              source: t.Union[Server, str] = None,
@@ -35,7 +114,8 @@ def pack_msg(data,
              priv_key: rsa.PrivateKey = None,
              cipher_key: bytes = None,
              symmetric_key: bytes = None,
-             add_key=False) -> t.Dict[str, t.Any]:
+             add_key=False,
+             peer: str = None) -> t.Dict[str, t.Any]:
     """
     formats data in a well known encrypted structure. See Return.
 
@@ -54,6 +134,11 @@ def pack_msg(data,
         symmetric key to be used for data encryption. If None, randomly generated from cryptography.fernet.Fernet.generate_key()
     data:
         data to encrypt. Data is pickled and then encoded
+    add_key:
+        adds the encrypted symmetric key even if symmetric_key or cipher_key given
+    peer:
+        identifier of the receiver. If set and no symmetric_key or cipher_key given, the session key cached for the
+        peer is used instead of generating a new one. Encrypted key is always added to the structure
 
     Returns
     -------
@@ -78,7 +163,10 @@ def pack_msg(data,
         if not priv_key:
             raise ValueError('priv_key must be provided to decrypt cipher_key')
         else:
-            symmetric_key = rsa.decrypt(cipher_key, priv_key=priv_key)
+            symmetric_key = session_keys.resolve(cipher_key, priv_key)
+    elif peer and pub_key and not symmetric_key:
+        symmetric_key, cipher_key = session_keys.get(peer, pub_key)
+        add_key = True
 
     # encrypt data
     if pub_key or symmetric_key:
@@ -97,9 +185,11 @@ def pack_msg(data,
     if source:
         msg.update(source=str(source.id) if isinstance(source, Server) else source)
     if pub_key and (new_symmetric_key or add_key):
-        msg.update(key=base64.b64encode(rsa.encrypt(new_symmetric_key or symmetric_key, pub_key)).decode('ascii'))
+        if not (cipher_key and add_key):
+            cipher_key = crypto_backend.backend.encrypt(new_symmetric_key or symmetric_key, pub_key)
+        msg.update(key=base64.b64encode(cipher_key).decode('ascii'))
     if priv_key:
-        signature = rsa.sign(json.dumps(msg, sort_keys=True).encode('ascii'), priv_key, 'SHA-512')
+        signature = crypto_backend.backend.sign(json.dumps(msg, sort_keys=True).encode('ascii'), priv_key)
         msg.update(signature=base64.b64encode(signature).decode('ascii'))
     return msg
 
@@ -138,14 +228,14 @@ def unpack_msg(msg, pub_key: rsa.PublicKey = None, priv_key: rsa.PrivateKey = No
         signature = base64.b64decode(msg.get('signature').encode('ascii'))
         msg_to_validate = copy.deepcopy(msg)
         msg_to_validate.pop('signature')
-        rsa.verify(json.dumps(msg_to_validate, sort_keys=True).encode('ascii'), signature, pub_key)
+        crypto_backend.backend.verify(json.dumps(msg_to_validate, sort_keys=True).encode('ascii'), signature, pub_key)
 
     cipher_key = base64.b64decode(msg.get('key', '').encode('ascii')) or cipher_key
     if cipher_key:
         if not priv_key:
             raise ValueError('No private key specified to decrpyt cipher_key')
         else:
-            symmetric_key = rsa.decrypt(cipher_key, priv_key)
+            symmetric_key = session_keys.resolve(cipher_key, priv_key)
 
     enveloped_data = msg.get('enveloped_data')
 
@@ -1,8 +1,12 @@
+import threading
 import time
+import typing as t
 
 import aiohttp
 import requests
 
+from dimensigon import defaults
+from dimensigon.network.pool import pool
 from dimensigon.utils import asyncio
 
 
@@ -27,18 +31,52 @@ from dimensigon.utils import asyncio
 #         return False
 
 
+class ProbeCache:
+    """Results of the last gate probes. A result is reused for `ttl` seconds"""
+
+    def __init__(self, ttl: float = defaults.PROBE_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._results: t.Dict[t.Tuple[str, int], t.Tuple[float, bool]] = {}
+
+    def get(self, host: str, port: int) -> t.Optional[bool]:
+        entry = self._results.get((host, port))
+        if entry and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+
+    def set(self, host: str, port: int, up: bool):
+        with self._lock:
+            self._results[(host, port)] = (time.monotonic(), up)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+probe_cache = ProbeCache()
+
+
+def _probe_urls(host: str, port: int, ssl: bool) -> t.Tuple[str, str]:
+    base = f"{'https' if ssl else 'http'}://{host}:{port}"
+    # nodes prior to the liveness endpoint only answer the home page
+    return base + defaults.LIVENESS_PATH, base + '/'
+
+
 def is_open2(host: str, port: int, timeout: float = 5.0, ssl=True):
-    url = f"{'https' if ssl else 'http'}://{host}:{port}/"
-    try:
-        resp = requests.get(url, verify=False, timeout=timeout)
-    except (requests.ConnectionError, requests.Timeout):
-        return False
-    else:
-        return resp.ok
+    for url in _probe_urls(host, port, ssl):
+        try:
+            resp = pool.session(url).get(url, verify=False, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            return False
+        if resp.status_code != 404:
+            return resp.ok
+    return False
 
 
 def check_host(host: str, port: int, retry=3, delay=2, timeout=5.0):
-    ipup = False
+    ipup = probe_cache.get(host, port)
+    if ipup is not None:
+        return ipup
     for i in range(retry):
         if is_open2(host, port, timeout):
             ipup = True
@@ -47,6 +85,9 @@ def check_host(host: str, port: int, retry=3, delay=2, timeout=5.0):
         #     ipup = True
         #     break
         time.sleep(delay)
+    else:
+        ipup = False
+    probe_cache.set(host, port, ipup)
     return ipup
 
 
@@ -72,24 +113,31 @@ def check_host(host: str, port: int, retry=3, delay=2, timeout=5.0):
 
 
 async def async_is_open2(host: str, port: int, timeout: float = 5.0, ssl=True):
-    url = f"{'https' if ssl else 'http'}://{host}:{port}/"
+    session = pool.async_session()
+    close = session is None
+    if close:
+        session = aiohttp.ClientSession()
     try:
-        async with aiohttp.ClientSession() as session:
+        for url in _probe_urls(host, port, ssl):
             async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout), verify_ssl=False) as response:
-                if 200 <= response.status < 300:
-                    return True
-                else:
-                    return False
+                if response.status != 404:
+                    return 200 <= response.status < 300
+        return False
     except (aiohttp.ClientResponseError,
             aiohttp.ClientOSError,
             aiohttp.ServerDisconnectedError,
             aiohttp.ServerTimeoutError,
             asyncio.TimeoutError) as e:
         return False
+    finally:
+        if close:
+            await session.close()
 
 
 async def async_check_host(host: str, port: int, retry=3, delay=2, timeout=5.0):
-    ipup = False
+    ipup = probe_cache.get(host, port)
+    if ipup is not None:
+        return ipup
     for i in range(retry):
         if await async_is_open2(host, port, timeout):
             ipup = True
@@ -98,4 +146,7 @@ async def async_check_host(host: str, port: int, retry=3, delay=2, timeout=5.0):
         #     ipup = True
         #     break
         await asyncio.sleep(delay)
+    else:
+        ipup = False
+    probe_cache.set(host, port, ipup)
     return ipup
@@ -0,0 +1,143 @@
+import asyncio
+import http.cookiejar
+import os
+import threading
+import time
+import typing as t
+import weakref
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from dimensigon import defaults
+
+
+class _PooledSession:
+    __slots__ = ('session', 'last_used')
+
+    def __init__(self, session: requests.Session):
+        self.session = session
+        self.last_used = time.monotonic()
+
+
+class SessionPool:
+    """Process wide pool of keep-alive HTTP sessions.
+
+    Synchronous requests get one :class:`requests.Session` per destination (scheme, host and port). Each session
+    keeps up to `maxsize` open connections to its destination. The number of destinations is bounded by
+    `max_destinations` (least recently used destination is evicted first) and sessions not used for
+    `idle_timeout` seconds are closed.
+
+    Asynchronous requests get one :class:`aiohttp.ClientSession` per event loop. Only long lived loops registered
+    through :meth:`register_loop` (or created with :meth:`new_event_loop`) get a pooled session, as a session cannot
+    outlive the loop it was created on.
+
+    Pool is fork-safe: a child process never reuses the connections inherited from its parent.
+    """
+
+    def __init__(self, max_destinations: int = defaults.POOL_MAX_DESTINATIONS, maxsize: int = defaults.POOL_MAXSIZE,
+                 idle_timeout: float = defaults.POOL_IDLE_TIMEOUT):
+        self.max_destinations = max_destinations
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._sessions: t.Dict[str, _PooledSession] = OrderedDict()
+        self._loops: t.MutableMapping[asyncio.AbstractEventLoop, t.Optional[aiohttp.ClientSession]] = \
+            weakref.WeakKeyDictionary()
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            # forked process. Drop references to parent connections without closing them
+            self._reset()
+
+    @staticmethod
+    def destination(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        # sessions are shared between callers. Do not keep cookies from one request to another
+        session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _evict_idle(self, now):
+        for dest in [d for d, ps in self._sessions.items() if now - ps.last_used > self.idle_timeout]:
+            self._sessions.pop(dest).session.close()
+
+    def session(self, url: str) -> requests.Session:
+        """returns a keep-alive session for the destination of the url"""
+        self._check_pid()
+        dest = self.destination(url)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            ps = self._sessions.get(dest)
+            if ps is None:
+                ps = self._sessions[dest] = _PooledSession(self._new_session())
+                while len(self._sessions) > self.max_destinations:
+                    _, evicted = self._sessions.popitem(last=False)
+                    evicted.session.close()
+            else:
+                self._sessions.move_to_end(dest)
+            ps.last_used = now
+            return ps.session
+
+    def register_loop(self, loop: asyncio.AbstractEventLoop):
+        """registers a long lived loop. Requests made from the loop will reuse connections"""
+        self._check_pid()
+        with self._lock:
+            if loop not in self._loops:
+                self._loops[loop] = None
+
+    def new_event_loop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.new_event_loop()
+        self.register_loop(loop)
+        return loop
+
+    def async_session(self) -> t.Optional[aiohttp.ClientSession]:
+        """returns the pooled session for the running loop or None if loop is not registered"""
+        self._check_pid()
+        loop = asyncio.get_event_loop()
+        with self._lock:
+            if loop not in self._loops:
+                return None
+            session = self._loops[loop]
+            if session is None or session.closed:
+                connector = aiohttp.TCPConnector(limit=self.max_destinations * self.maxsize,
+                                                 limit_per_host=self.maxsize, keepalive_timeout=self.idle_timeout,
+                                                 ssl=False)
+                session = self._loops[loop] = aiohttp.ClientSession(connector=connector)
+            return session
+
+    async def async_close(self):
+        """closes the pooled session of the running loop"""
+        loop = asyncio.get_event_loop()
+        with self._lock:
+            session = self._loops.pop(loop, None)
+        if session:
+            await session.close()
+
+    def close(self):
+        """closes all synchronous sessions"""
+        self._check_pid()
+        with self._lock:
+            while self._sessions:
+                _, ps = self._sessions.popitem()
+                ps.session.close()
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+pool = SessionPool()
@@ -0,0 +1,118 @@
+import ipaddress
+import os
+import socket
+import threading
+import time
+import typing as t
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from dimensigon import defaults
+
+IP = t.Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+
+def getaddrinfo(name: str) -> t.Optional[str]:
+    """returns the first IPv4 address of name. Raises socket.gaierror if name can not be resolved"""
+    infos = socket.getaddrinfo(name, 0, family=socket.AF_INET, proto=socket.IPPROTO_TCP)
+    return infos[0][4][0] if infos else None
+
+
+class _Entry:
+    __slots__ = ('ip', 'expires')
+
+    def __init__(self, ip: t.Optional[IP], expires: float):
+        self.ip = ip
+        self.expires = expires
+
+
+class Resolver:
+    """Process wide cache of name resolutions.
+
+    Resolved names are kept for `ttl` seconds and names that do not resolve for `negative_ttl` seconds. Only a name
+    never seen before is resolved while the caller waits. An expired entry is still returned and refreshed in the
+    background, so hot paths never block on name resolution once names are warmed up with :meth:`warm`. At most
+    `max_entries` names are kept (least recently used name is evicted first).
+
+    `resolve` is the function doing the actual lookup. It receives a name and returns an ip address, None or raises
+    an OSError. It defaults to :func:`getaddrinfo` and may be replaced by a fake resolver on tests.
+
+    Resolver is fork-safe: a child process starts with an empty cache.
+    """
+
+    def __init__(self, ttl: float = defaults.DNS_CACHE_TTL, negative_ttl: float = defaults.DNS_NEGATIVE_TTL,
+                 max_entries: int = defaults.DNS_CACHE_SIZE,
+                 resolve: t.Callable[[str], t.Optional[t.Union[str, IP]]] = None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.resolve_func = resolve or getaddrinfo
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._entries: t.Dict[str, _Entry] = OrderedDict()
+        self._refreshing: t.Set[str] = set()
+        self._executor = None
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            # forked process. Parent executor threads do not exist anymore
+            self._reset()
+
+    def _lookup(self, name: str) -> _Entry:
+        try:
+            ip = self.resolve_func(name)
+            ip = ipaddress.ip_address(ip) if ip is not None else None
+        except (OSError, ValueError):
+            ip = None
+        entry = _Entry(ip, time.monotonic() + (self.ttl if ip is not None else self.negative_ttl))
+        with self._lock:
+            self._entries[name] = entry
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._refreshing.discard(name)
+        return entry
+
+    def _refresh(self, name: str):
+        """resolves name in background. Must be called with the lock held"""
+        if name not in self._refreshing:
+            self._refreshing.add(name)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=defaults.DNS_WORKERS, thread_name_prefix='Resolver')
+            self._executor.submit(self._lookup, name)
+
+    def resolve(self, name: str) -> t.Optional[IP]:
+        """returns the ip address of name or None if name does not resolve"""
+        self._check_pid()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                self._entries.move_to_end(name)
+                if entry.expires < time.monotonic():
+                    self._refresh(name)
+                return entry.ip
+        return self._lookup(name).ip
+
+    def warm(self, names: t.Iterable[str]):
+        """resolves in background the names not cached or expired"""
+        self._check_pid()
+        now = time.monotonic()
+        with self._lock:
+            for name in set(names):
+                entry = self._entries.get(name)
+                if entry is None or entry.expires < now:
+                    self._refresh(name)
+
+    def clear(self):
+        self._check_pid()
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+resolver = Resolver()
@@ -1,16 +1,20 @@
 import datetime as dt
 import json
 import multiprocessing as mp
+import random
 import time
 import typing as t
 
 from pkg_resources import parse_version
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import and_, or_, inspect
+from sqlalchemy.orm import sessionmaker, interfaces, exc as orm_exc
 from sqlalchemy.orm.attributes import flag_modified
 
 from dimensigon import __version__
 from dimensigon import defaults
-from dimensigon.domain.entities import bypass_datamark_update, Scope, Server, Catalog
+from dimensigon.domain.entities import bypass_datamark_update, Scope, Server, Catalog, CatalogDigest
+from dimensigon.domain.entities.catalog import to_datemark, digested_entities
+from dimensigon.network.pool import pool
 from dimensigon.use_cases import mptools as mpt
 from dimensigon.use_cases.lock import lock_scope
 from dimensigon.use_cases.mptools import TerminateInterrupt
@@ -18,6 +22,7 @@ from dimensigon.utils import asyncio
 from dimensigon.utils.helpers import get_distributed_entities, get_now
 from dimensigon.web import errors, db, get_root_auth
 from dimensigon.web import network as ntwrk
+from dimensigon.web.helpers import absent_identities
 
 if t.TYPE_CHECKING:
     from dimensigon.core import Dimensigon
@@ -65,7 +70,52 @@ class CatalogMismatch(errors.BaseError):
         return "List entities do not match"
 
 
-def update_db_catalog(catalog, check_mismatch=True, logger=None):
+def _identity(mapper, columns, dto) -> t.Optional[t.Tuple]:
+    try:
+        values = tuple(dto[mapper.get_property_by_column(c).key] for c in columns)
+    except (KeyError, orm_exc.UnmappedColumnError):
+        return None
+    return None if None in values else values
+
+
+def _prefetch(cls, columns, identities: t.Iterable[t.Tuple], chunk=500) -> t.List:
+    """loads the entities of cls with the given identities using one query for every chunk"""
+    identities = list(identities)
+    entities = []
+    for i in range(0, len(identities), chunk):
+        if len(columns) == 1:
+            cond = columns[0].in_([ident[0] for ident in identities[i:i + chunk]])
+        else:
+            cond = or_(*[and_(*[c == v for c, v in zip(columns, ident)]) for ident in identities[i:i + chunk]])
+        entities.extend(db.session.query(cls).filter(cond).all())
+    return entities
+
+
+def _prefetch_catalog(cls, dtos) -> t.Tuple[t.List, t.Set[t.Tuple]]:
+    """loads the entities of cls present in dtos and the entities they reference.
+
+    Returns the entities loaded, which must be referenced while used as the session only keeps weak references to
+    them, and the identities of dtos not found in the database
+    """
+    mapper = inspect(cls)
+    pk = mapper.primary_key
+    identities = {ident for ident in (_identity(mapper, pk, dto) for dto in dtos) if ident}
+    loaded = _prefetch(cls, pk, identities)
+    absent = identities - {tuple(mapper.primary_key_from_instance(e)) for e in loaded}
+
+    for rel in mapper.relationships:
+        remote = rel.mapper
+        local_columns = [l for l, r in rel.local_remote_pairs if r in remote.primary_key]
+        if rel.direction is interfaces.MANYTOONE and len(local_columns) == len(remote.primary_key) \
+                and remote.class_ is not cls:
+            refs = {ident for ident in (_identity(mapper, local_columns, dto) for dto in dtos) if ident}
+            loaded.extend(_prefetch(remote.class_, remote.primary_key, refs))
+    return loaded, absent
+
+
+def update_db_catalog(catalog, check_mismatch=True, logger=None, commit=True):
+    """adds or modifies the catalog entities. When commit is False, entities are only flushed so a catalog received in
+    pages is applied in a single transaction"""
     de = get_distributed_entities()
 
     if check_mismatch:
@@ -85,13 +135,23 @@ def update_db_catalog(catalog, check_mismatch=True, logger=None):
                 if len(catalog[name]) > 0:
                     logger.log(1, f"Adding/Modifying new '{name}' entities: \n"
                                   f"{json.dumps(catalog[name], indent=2, sort_keys=True)}") if logger else None
-                for dto in catalog[name]:
-                    o = cls.from_json(dict(dto))
-                    # force modification to update catalog last_modified_at
-                    flag_modified(o, 'last_modified_at')
-                    db.session.add(o)
-
-        db.session.commit()
+                # existing entities and their references are loaded in bulk, so from_json finds them in the session
+                loaded, absent = _prefetch_catalog(cls, catalog[name])
+                mapper = inspect(cls)
+                with absent_identities(cls, absent):
+                    for dto in catalog[name]:
+                        o = cls.from_json(dict(dto))
+                        # force modification to update catalog last_modified_at
+                        flag_modified(o, 'last_modified_at')
+                        db.session.add(o)
+                        # entity may be referenced by the next ones
+                        absent.discard(_identity(mapper, mapper.primary_key, dto))
+                # entities are written with one statement for every batch of rows
+                db.session.flush()
+                del loaded
+
+        if commit:
+            db.session.commit()
 
 
 class CatalogManager(mpt.TimerWorker):
@@ -107,6 +167,12 @@ class CatalogManager(mpt.TimerWorker):
         self._updating = mp.Event()
         self._update_lock = mp.Lock()
         self._server = None
+        self._loop = None
+
+    def shutdown(self):
+        if self._loop:
+            self._run(pool.async_close())
+            self._loop.close()
 
     def main_func(self):
         with self._update_lock:
@@ -158,7 +224,7 @@ class CatalogManager(mpt.TimerWorker):
         # cluster information
         cluster_hearthbeat_id = get_now().strftime(defaults.DATETIME_FORMAT)
         # check version update before catalog update to match database revision
-        data = asyncio.run(self._async_get_neighbour_healthcheck(cluster_hearthbeat_id))
+        data = self._run(self._async_get_neighbour_healthcheck(cluster_hearthbeat_id))
         if data:
             self.check_new_version(data)
             self.catalog_update(data)
@@ -205,6 +271,11 @@ class CatalogManager(mpt.TimerWorker):
                 self.logger.warning(f"Unable to get Healthcheck from server {server.name}: {resp}")
         return server_responses
 
+    def _run(self, aw):
+        if self._loop is None:
+            self._loop = pool.new_event_loop()
+        return self._loop.run_until_complete(aw)
+
     def check_new_version(self, data: t.Dict[Server, dict]):
         mayor_version, mayor_server = None, None
         for server, hc in data.items():
@@ -228,19 +299,80 @@ class CatalogManager(mpt.TimerWorker):
                 self.logger.info(f"New catalog found from server {reference_server.name}: {self.catalog_ver}")
                 self._update_catalog_from_server(reference_server)
             else:
-                raise NoServerFound()
+                digest = CatalogDigest.catalog_digest()
+                # same catalog version but different rows. Nodes not sending digests are skipped
+                servers = [server for server, hc_msg in data.items() if
+                           hc_msg.get('catalog_digest', digest) != digest]
+                if servers:
+                    server = random.choice(servers)
+                    self.logger.info(f"Catalog digest differs from server {server.name}")
+                    self._repair_catalog_from_server(server)
+                else:
+                    raise NoServerFound()
 
     def _update_catalog_from_server(self, server):
         with lock_scope(Scope.UPGRADE, [self.server]):
-            resp = ntwrk.get(server, 'api_1_0.catalog',
-                             view_data=dict(data_mark=self.catalog_ver.strftime(defaults.DATEMARK_FORMAT)),
-                             auth=get_root_auth())
+            data_mark = self.catalog_ver.strftime(defaults.DATEMARK_FORMAT)
+            params = dict(limit=defaults.CATALOG_PAGE_SIZE)
+            try:
+                while True:
+                    resp = ntwrk.get(server, 'api_1_0.catalog', view_data=dict(data_mark=data_mark), params=params,
+                                     auth=get_root_auth())
+
+                    if resp.code and 199 < resp.code < 300:
+                        if 'catalog' in resp.msg:
+                            delta_catalog, cursor = resp.msg['catalog'], resp.msg.get('cursor')
+                        else:
+                            # server does not send pages
+                            delta_catalog, cursor = resp.msg, None
+                        # pages are applied in the same transaction. Catalog version only changes once all the
+                        # pages are received
+                        self.db_update_catalog(delta_catalog, commit=cursor is None)
+                        if cursor is None:
+                            break
+                        params.update(cursor=cursor)
+                    else:
+                        raise CatalogFetchError(resp)
+            except BaseException:
+                db.session.rollback()
+                raise
+
+    def _repair_catalog_from_server(self, server):
+        """transfers only the rows that differ from server. Entity roots are compared first, then the leaves of the
+        entities that differ and finally the rows of the leaves that differ"""
+        auth = get_root_auth()
 
-            if resp.code and 199 < resp.code < 300:
-                delta_catalog = resp.msg
-                self.db_update_catalog(delta_catalog)
-            else:
+        def get_digest(**params):
+            resp = ntwrk.get(server, 'api_1_0.catalog_digest', params=params, auth=auth)
+            if not resp.ok:
                 raise CatalogFetchError(resp)
+            return resp.msg
 
-    def db_update_catalog(self, catalog, check_mismatch=True):
-        update_db_catalog(catalog, check_mismatch=check_mismatch, logger=self.logger)
+        with lock_scope(Scope.UPGRADE, [self.server]):
+            roots = CatalogDigest.roots()
+            remote_roots = get_digest()['roots']
+            delta = {}
+            for name, cls in digested_entities():
+                if name not in remote_roots or remote_roots[name] == roots.get(name):
+                    # rows only present here are not sent to server. It will pull them on its turn
+                    continue
+                leaves = CatalogDigest.leaves(name)
+                remote_leaves = get_digest(entity=name)['leaves']
+                buckets = {b for b, (l, r) in enumerate(zip(leaves, remote_leaves)) if l != r}
+                rows = {dkey: to_datemark(last_modified_at) for dkey, (_, last_modified_at, _) in
+                        CatalogDigest.entity_rows(cls, buckets=buckets).items()}
+                resp = ntwrk.post(server, 'api_1_0.catalog_digest',
+                                  json={'entity': name, 'buckets': sorted(buckets), 'rows': rows}, auth=auth)
+                if not resp.ok:
+                    raise CatalogFetchError(resp)
+                delta.update(resp.msg)
+            self.logger.debug(f"Rows received from {server.name}: "
+                              f"{', '.join(f'{name}: {len(rows)}' for name, rows in delta.items())}")
+            try:
+                self.db_update_catalog(delta, check_mismatch=False)
+            except BaseException:
+                db.session.rollback()
+                raise
+
+    def db_update_catalog(self, catalog, check_mismatch=True, commit=True):
+        update_db_catalog(catalog, check_mismatch=check_mismatch, logger=self.logger, commit=commit)
@@ -1,8 +1,14 @@
+import concurrent.futures
 import datetime as dt
+import functools
 import json
 import logging
+import math
+import mmap
 import random
+import struct
 import threading
+import time
 import typing as t
 
 from dataclasses import dataclass
@@ -11,11 +17,13 @@ from sqlalchemy.orm import sessionmaker
 
 from dimensigon import defaults
 from dimensigon.domain.entities import Server, Route
+from dimensigon.network.pool import pool
 from dimensigon.use_cases.mptools import Worker, MPQueue
 from dimensigon.use_cases.mptools_events import BaseEvent
 from dimensigon.use_cases.routing import InitialRouteSet
 from dimensigon.utils import asyncio
 from dimensigon.utils.helpers import format_exception, get_now
+from dimensigon.utils.timer_wheel import timer_wheel, Timer
 from dimensigon.utils.typos import Id
 from dimensigon.web import network as ntwrk, get_root_auth
 
@@ -118,35 +126,172 @@ class _Entry:
     death: bool = False
     zombie: bool = False
 
+
 Input = t.Tuple[Id, dt.datetime, bool, bool]
 Item = t.Union[Input, t.List[Input]]
 
+_EPOCH = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+_MICROSECOND = dt.timedelta(microseconds=1)
+
+
+@functools.lru_cache(maxsize=None)
+def _decode_id(raw: bytes) -> Id:
+    return json.loads(raw.rstrip(b'\0'))
+
+
+class ClusterTable:
+    """Cluster registry kept in an anonymous shared memory map.
+
+    The table must be created before forking, so every process maps the same memory. Only the ClusterManager process
+    writes into it. Readers copy the table without any IPC and use a sequence lock to detect a write in progress:
+    the writer makes the sequence odd while updating a slot and even again when done, and a reader retries if the
+    sequence was odd or changed while copying.
+
+    Every process caches the last rows read together with their sequence, so reading an unchanged table only costs
+    unpacking the header. Entries are never removed, so the table holds at most `size` different nodes.
+    """
+    _HEADER = struct.Struct('<QI')  # sequence, number of entries
+    _SLOT = struct.Struct('<64sq??')  # JSON encoded id, keepalive in microseconds since epoch, death, zombie
+
+    def __init__(self, size: int = defaults.CLUSTER_TABLE_SIZE):
+        self.size = size
+        self._mm = mmap.mmap(-1, self._HEADER.size + size * self._SLOT.size)
+        self._slots: t.Dict[Id, int] = {}  # only filled in the writer process
+        self._cache: t.Tuple[int, t.List[t.Tuple[Id, int, bool, bool]]] = (-1, [])
+
+    def _offset(self, slot: int) -> int:
+        return self._HEADER.size + slot * self._SLOT.size
+
+    @staticmethod
+    def _to_entry(ident, keepalive, death, zombie) -> _Entry:
+        return _Entry(ident, _EPOCH + keepalive * _MICROSECOND, death, zombie)
+
+    def rows(self) -> t.List[t.Tuple[Id, int, bool, bool]]:
+        """returns id, keepalive in microseconds since epoch, death and zombie of every node.
+
+        Returned list is shared until the table changes and must not be modified
+        """
+        cache = self._cache
+        if self._HEADER.unpack_from(self._mm, 0)[0] == cache[0]:
+            return cache[1]
+        while True:
+            seq, count = self._HEADER.unpack_from(self._mm, 0)
+            if seq % 2 == 0:
+                data = self._mm[self._HEADER.size:self._offset(count)]
+                if self._HEADER.unpack_from(self._mm, 0)[0] == seq:
+                    break
+            time.sleep(0)
+        rows = [(_decode_id(raw_id), keepalive, death, zombie)
+                for raw_id, keepalive, death, zombie in self._SLOT.iter_unpack(data)]
+        self._cache = (seq, rows)
+        return rows
+
+    def values(self) -> t.List[_Entry]:
+        return [self._to_entry(*row) for row in self.rows()]
+
+    def get(self, ident: Id, default: _Entry = None) -> t.Optional[_Entry]:
+        slot = self._slots.get(ident)
+        if slot is not None:
+            # writer process. No other process writes into the table
+            raw_id, *values = self._SLOT.unpack_from(self._mm, self._offset(slot))
+            return self._to_entry(ident, *values)
+        for row in self.rows():
+            if row[0] == ident:
+                return self._to_entry(*row)
+        return default
+
+    def __getitem__(self, ident: Id) -> _Entry:
+        entry = self.get(ident)
+        if entry is None:
+            raise KeyError(ident)
+        return entry
+
+    def __setitem__(self, ident: Id, entry: _Entry):
+        raw_id = json.dumps(ident).encode()
+        if len(raw_id) > 64:
+            raise ValueError(f"id {ident} too long to be stored in the cluster table")
+        keepalive = entry.keepalive if entry.keepalive.tzinfo else entry.keepalive.replace(tzinfo=dt.timezone.utc)
+        seq, count = self._HEADER.unpack_from(self._mm, 0)
+        slot = self._slots.get(ident, count)
+        if slot == self.size:
+            raise ValueError(f"cluster table full. Unable to add {ident}")
+        self._HEADER.pack_into(self._mm, 0, seq + 1, count)
+        self._SLOT.pack_into(self._mm, self._offset(slot), raw_id, (keepalive - _EPOCH) // _MICROSECOND,
+                             entry.death, entry.zombie)
+        self._HEADER.pack_into(self._mm, 0, seq + 2, max(count, slot + 1))
+        self._slots[ident] = slot
+
+    def __contains__(self, ident: Id):
+        return self.get(ident) is not None
+
+    def __len__(self):
+        return self._HEADER.unpack_from(self._mm, 0)[1]
+
+
+def _parse_healthcheck(resp: ntwrk.Response) -> t.Optional[dt.datetime]:
+    if resp.ok and isinstance(resp.msg, dict):
+        try:
+            return dt.datetime.strptime(resp.msg.get('now'), defaults.DATETIME_FORMAT)
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+def probe(server: Server, timeout: float = 10) -> t.Optional[dt.datetime]:
+    """checks if server is alive. Returns the current time of the server or None if it did not answer"""
+    return _parse_healthcheck(ntwrk.get(server, 'root.healthcheck', auth=get_root_auth(), timeout=timeout))
+
+
+async def async_probe(server: Server, timeout: float = 10) -> t.Optional[dt.datetime]:
+    return _parse_healthcheck(
+        await ntwrk.async_get(server, 'root.healthcheck', auth=get_root_auth(), timeout=timeout))
+
 
 class ClusterManager(Worker):
+    """Keeps the cluster membership.
+
+    Changes are disseminated gossip style: every round, changes are sent to `gossip_fanout` random neighbours and a
+    change is retransmitted `retransmit_mult` * log2(cluster size) times. Nodes receiving a new change gossip it
+    again, so the number of messages sent by a node does not depend on the size of the cluster. When there are no
+    more neighbours than `gossip_fanout`, or `gossip_fanout` is 0, changes are sent once to every neighbour.
+
+    A node is considered a zombie when no keepalive is received in `zombie_threshold` seconds and neither a direct
+    probe nor the `probe_peers` peers asked to probe it get an answer from it.
+    """
+
     ###########################
     # START Class Inheritance #
     def init_args(self, dimensigon: 'Dimensigon', maxsize=None, zombie_threshold=defaults.ZOMBIE_NODE,
-                  send_interval=defaults.CLUSTER_SEND_PERIOD):
+                  send_interval=defaults.CLUSTER_SEND_PERIOD, gossip_fanout=defaults.CLUSTER_GOSSIP_FANOUT,
+                  retransmit_mult=defaults.CLUSTER_RETRANSMIT_MULT, probe_peers=defaults.CLUSTER_PROBE_PEERS):
         self.dm = dimensigon
         self.Session = sessionmaker(bind=self.dm.engine)
         self.queue = MPQueue(maxsize=maxsize or 10000)
-        self._registry: t.Dict[Id, _Entry] = self.dm.manager.dict()
-        # self._registry: t.Dict[Id, _Entry] = dict()
+        self._registry = ClusterTable()
 
-        self._timer_registry: t.Dict[Id, threading.Timer] = dict()
+        self._timer_registry: t.Dict[Id, Timer] = dict()  # zombie deadlines, all handled by the timer wheel thread
         self.zombie_threshold = dt.timedelta(seconds=zombie_threshold)
 
         self._buffer: t.Dict[Id, _Entry] = {}  # data to be sent
+        self._transmissions: t.Dict[Id, int] = {}  # times an entry from the buffer has been gossiped
         self.send_interval = send_interval  # delay in seconds between data change and sending data to other nodes
-        self._lock = threading.Lock()  # lock used for consistency with Timer threads
+        self.gossip_fanout = gossip_fanout
+        self.retransmit_mult = retransmit_mult
+        self.probe_peers = probe_peers
+        self._lock = threading.Lock()  # lock used for consistency with timer functions
         self._change_buffer_lock = threading.RLock()
+        self._loop_lock = threading.Lock()  # loop is shared between timer threads and shutdown
+        self._loop = None
+        self._probe_lock = threading.Lock()
+        self._probe_loop = None  # probes run concurrently in their own loop so they do not hold _loop_lock
+        self._probe_thread = None
         self._timer = None
 
     def startup(self):
         self._route_initiated = threading.Event()
         self.dispatcher.listen(InitialRouteSet, lambda x: self._route_initiated.set())
         self.dispatcher.listen('Listening', lambda x: self._notify_cluster_in())
-        self._loop = asyncio.new_event_loop()
+        self._loop = pool.new_event_loop()
         asyncio.set_event_loop(self._loop)
 
     def shutdown(self):
@@ -157,6 +302,8 @@ class ClusterManager(Worker):
             t.cancel()
         if self._timer:
             self._timer.cancel()
+        self._run(pool.async_close())
+        self._stop_probes()
 
     def main_func(self, *args, **kwargs):
         item = self.queue.safe_get()
@@ -175,10 +322,11 @@ class ClusterManager(Worker):
         self.queue.put((ident, keepalive, death), block=block, timeout=timeout)
 
     def get_alive(self) -> t.List[Id]:
-        return [e.id for e in self._registry.values() if not e.zombie and not e.death] + [self.dm.server_id]
+        return [ident for ident, _, death, zombie in self._registry.rows() if not zombie and not death] + [
+            self.dm.server_id]
 
     def get_zombies(self) -> t.List[Id]:
-        return [e.id for e in self._registry.values() if e.zombie and not e.death]
+        return [ident for ident, _, death, zombie in self._registry.rows() if zombie and not death]
 
     def get_cluster(self, str_format=None):
         return [(e.id, e.keepalive if str_format is None else e.keepalive.strftime(str_format), e.death) for e in
@@ -200,9 +348,9 @@ class ClusterManager(Worker):
     def _add2buffer(self, entry: _Entry):
         with self._change_buffer_lock:
             self._buffer.update({entry.id: entry})
+            self._transmissions.pop(entry.id, None)
             if self._timer is None:
-                self._timer = threading.Timer(interval=self.send_interval, function=self._send_data)
-                self._timer.start()
+                self._timer = timer_wheel.schedule(self.send_interval, self._send_data)
 
     def _cancel_timer(self, ident):
         if ident in self._timer_registry:
@@ -211,11 +359,53 @@ class ClusterManager(Worker):
 
     def _set_timer(self, ident, keepalive):
         self._cancel_timer(ident)
-        th = self._timer_registry[ident] = threading.Timer(interval=self.zombie_threshold.seconds,
-                                                           function=self.queue.put,
-                                                           args=((ident, keepalive, None, True),),
-                                                           kwargs=dict(block=True))
-        th.start()
+        self._timer_registry[ident] = timer_wheel.schedule(self.zombie_threshold.total_seconds(), self._suspect,
+                                                           args=(ident, keepalive))
+
+    def _suspect(self, ident: Id, keepalive: dt.datetime):
+        """no keepalive received from the node. Probes it before considering it a zombie. Returns without waiting for
+        the probe, so timer threads are not held while a zombie does not answer"""
+        if self.probe_peers:
+            self._probe(self._async_probe(ident)).add_done_callback(
+                functools.partial(self._probed, ident, keepalive))
+        else:
+            self.queue.put((ident, keepalive, None, True), block=True)
+
+    def _probed(self, ident: Id, keepalive: dt.datetime, future: concurrent.futures.Future):
+        alive = None
+        try:
+            alive = future.result()
+        except Exception as e:
+            self.logger.warning(f"Unable to probe {ident}: {format_exception(e)}")
+        if alive and alive > keepalive:
+            self.queue.put((ident, alive, False), block=True)
+        else:
+            self.queue.put((ident, keepalive, None, True), block=True)
+
+    async def _async_probe(self, ident: Id) -> t.Optional[dt.datetime]:
+        """probes the node directly and, if it does not answer, through some alive peers"""
+        session = self.Session()
+        try:
+            with self.dm.flask_app.app_context():
+                server = session.query(Server).get(ident)
+                if server is None:
+                    return None
+                alive = await async_probe(server)
+                if alive:
+                    return alive
+                peers = [s for s in Server.get_neighbours(session=session) if s.id != ident and s.id in self]
+                peers = random.sample(peers, min(self.probe_peers, len(peers)))
+                if peers:
+                    self.logger.debug(f"Asking {', '.join([s.name for s in peers])} to probe {server}")
+                responses = await asyncio.gather(
+                    *[ntwrk.async_get(p, 'api_1_0.cluster_probe', view_data=dict(server_id=ident),
+                                      auth=get_root_auth(), timeout=20) for p in peers])
+                for r in responses:
+                    if r.ok and r.msg.get('keepalive'):
+                        return dt.datetime.strptime(r.msg['keepalive'], defaults.DATEMARK_FORMAT)
+        finally:
+            session.close()
+        return None
 
     def _process_one(self, item: Input):
         item = _Entry(*item)
@@ -259,9 +449,41 @@ class ClusterManager(Worker):
                             pass
                             # event = KeepAliveEvent(item.id, item.keepalive)
                         self._add2buffer(current)
-                self._registry[item.id] = current
+                try:
+                    self._registry[item.id] = current
+                except ValueError as e:
+                    self.logger.error(str(e))
+                    return
                 self.publish_q.safe_put(event) if event else None
 
+    def _run(self, aw):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = pool.new_event_loop()
+            return self._loop.run_until_complete(aw)
+
+    def _probe(self, aw) -> concurrent.futures.Future:
+        """runs aw in the probe loop, started on first use. Probes of different nodes run concurrently"""
+        with self._probe_lock:
+            if self._probe_loop is None:
+                self._probe_loop = pool.new_event_loop()
+                self._probe_thread = threading.Thread(target=self._probe_loop.run_forever, name='ClusterProbe',
+                                                      daemon=True)
+                self._probe_thread.start()
+            return asyncio.run_coroutine_threadsafe(aw, self._probe_loop)
+
+    def _stop_probes(self):
+        with self._probe_lock:
+            loop, self._probe_loop = self._probe_loop, None
+        if loop:
+            try:
+                asyncio.run_coroutine_threadsafe(pool.async_close(), loop).result(timeout=5)
+            except Exception as e:
+                self.logger.debug(f"Unable to close probe session: {format_exception(e)}")
+            loop.call_soon_threadsafe(loop.stop)
+            self._probe_thread.join()
+            loop.close()
+
     def _process_item(self, item: Item):
         if isinstance(item, list):
             [self._process_one(i) for i in item]
@@ -287,19 +509,23 @@ class ClusterManager(Worker):
         with self.dm.flask_app.app_context():
             neighbours = Server.get_neighbours(session=session)
             if neighbours:
+                gossip = 0 < self.gossip_fanout < len(neighbours)
+                peers = random.sample(neighbours, self.gossip_fanout) if gossip else neighbours
                 with self._change_buffer_lock:
                     temp_buffer = dict(self._buffer)
-                    self._buffer.clear()
+                    if not gossip:
+                        # every neighbour receives the data
+                        self._buffer.clear()
 
                 self.logger.debug(
-                    f"Sending cluster information to the following nodes: {', '.join([s.name for s in neighbours])}"
+                    f"Sending cluster information to the following nodes: {', '.join([s.name for s in peers])}"
                 )
                 self.logger.log(1, f"{json.dumps(log_data(temp_buffer.values()), indent=2)}")
 
                 auth = get_root_auth()
                 try:
-                    responses = asyncio.run(
-                        ntwrk.parallel_requests(neighbours, 'POST', view_or_url='api_1_0.cluster',
+                    responses = self._run(
+                        ntwrk.parallel_requests(peers, 'POST', view_or_url='api_1_0.cluster',
                                                 json=[{'id': e.id,
                                                        'keepalive': e.keepalive.strftime(defaults.DATEMARK_FORMAT),
                                                        'death': e.death} for e in
@@ -308,19 +534,22 @@ class ClusterManager(Worker):
                     self.logger.error(f"Unable to send cluster information to neighbours: {format_exception(e)}")
                     # restore data with new data arrived
                     with self._change_buffer_lock:
-                        temp_buffer.update(**self._buffer)
+                        temp_buffer.update(self._buffer)
                         self._buffer.clear()
                         self._buffer.update(temp_buffer)
                 else:
                     for r in responses:
                         if not r.ok:
                             self.logger.warning(f"Unable to send data to {r.server}: {r}")
+                    if gossip:
+                        self._count_transmissions(temp_buffer)
 
                 # check if new data arrived during timer execution
                 with self._change_buffer_lock:
                     if self._buffer:
-                        self._timer = threading.Timer(interval=1, function=self._send_data)
-                        self._timer.start()
+                        # new data is sent as soon as possible. Data already gossiped waits for the next round
+                        new_data = any(ident not in self._transmissions for ident in self._buffer)
+                        self._timer = timer_wheel.schedule(1 if new_data else self.send_interval, self._send_data)
                     else:
                         self._timer = None
             else:
@@ -329,6 +558,20 @@ class ClusterManager(Worker):
                     self._timer = None
         session.close()
 
+    def _count_transmissions(self, sent: t.Dict[Id, _Entry]):
+        """removes from the buffer the entries gossiped enough times to reach the whole cluster"""
+        limit = self.retransmit_mult * max(math.ceil(math.log2(len(self._registry) + 1)), 1)
+        with self._change_buffer_lock:
+            for ident, entry in sent.items():
+                # entry may be replaced by a newer one while sending
+                if self._buffer.get(ident) is entry:
+                    count = self._transmissions.get(ident, 0) + 1
+                    if count >= limit:
+                        del self._buffer[ident]
+                        self._transmissions.pop(ident, None)
+                    else:
+                        self._transmissions[ident] = count
+
     def _notify_cluster_in(self):
         from dimensigon.domain.entities import Server
         import dimensigon.web.network as ntwrk
@@ -402,7 +645,7 @@ class ClusterManager(Worker):
             else:
                 self.logger.debug("No server to send shutdown information")
             if servers:
-                responses = asyncio.run(
+                responses = self._run(
                     ntwrk.parallel_requests(servers, 'post',
                                             view_or_url='api_1_0.cluster_out',
                                             view_data=dict(server_id=str(Server.get_current().id)),
@@ -6,13 +6,14 @@ import functools
 import json
 import logging
 import pickle
+import queue
 import re
 import threading
 import time
 import typing as t
 import uuid
 from abc import ABC, abstractmethod
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from concurrent.futures.process import ProcessPoolExecutor
 from concurrent.futures.thread import ThreadPoolExecutor
 from contextlib import contextmanager
@@ -28,7 +29,7 @@ from dimensigon.domain.entities import Server, Orchestration, Step, StepExecutio
 from dimensigon.network.auth import HTTPBearerAuth
 from dimensigon.use_cases import lock as lock
 from dimensigon.use_cases.lock import locker_scope_enabled
-from dimensigon.use_cases.operations import CompletedProcess, IOperationEncapsulation, create_operation
+from dimensigon.use_cases.operations import CompletedProcess, IOperationEncapsulation, create_operation, compile_code
 from dimensigon.utils.dag import DAG
 from dimensigon.utils.event_handler import Event
 from dimensigon.utils.helpers import get_now, format_exception
@@ -53,7 +54,7 @@ def exec_safe(code, locals=None):
     #                  '_write_': full_write_guard,
     #                  '_getiter_': default_guarded_getiter},
     #      locals)
-    exec(code, {}, locals)
+    exec(compile_code(code), {}, locals)
 
 
 class ICommand(ABC):
@@ -407,7 +408,7 @@ class CompositeCommand(ICommand):
     def __init__(self, dict_tree: t.Dict[ICommand, t.List[ICommand]],
                  stop_on_error: bool, stop_undo_on_error: bool = None,
                  id_=None, executor: concurrent.futures.Executor = None,
-                 register: 'RegisterStepExecution' = None, var_context: Context = None):
+                 register: 'RegisterStepExecution' = None, var_context: Context = None, max_workers: int = None):
         """
 
         Parameters
@@ -424,13 +425,19 @@ class CompositeCommand(ICommand):
         id_:
             command identifier
         executor:
-            async call executor. defaults to concurrent.futures.process.ProcessPoolExecutor
+            async call executor. defaults to a ThreadPoolExecutor with max_workers threads
+        max_workers:
+            max commands running at the same time. Unlimited if an executor is given and max_workers not set
         """
         self._id = id_
         self._dag = DAG().from_dict_of_lists(dict_tree)
         self.stop_on_error = stop_on_error
         self.stop_undo_on_error = stop_undo_on_error
-        self.executor = executor or ThreadPoolExecutor(max_workers=4)
+        if executor is None:
+            max_workers = max_workers or defaults.COMMAND_MAX_WORKERS
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.executor = executor
+        self.max_workers = max_workers
         self.register = register
         self.var_context = var_context
 
@@ -444,59 +451,76 @@ class CompositeCommand(ICommand):
         else:
             return False
 
-    def invoke(self, timeout=None) -> bool:
-        # logging.basicConfig(format='%(threadName)s %(levelname)-8s %(message)s')
-        # logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
+    def _stop_flag(self, cmd: ICommand, attr: str) -> t.Optional[bool]:
+        value = getattr(cmd, attr, None)
+        return value if value is not None else getattr(self, attr)
+
+    def _run(self, cmd: ICommand, method: str, timeout) -> t.Optional[bool]:
+        try:
+            return getattr(cmd, method)(timeout=timeout)
+        except Exception:
+            logger.exception(f"Error while executing step {cmd.id}")
+            return False
+
+    def _schedule(self, method: str, timeout=None, reverse=False) -> t.List[bool]:
+        """Runs `method` on every command as soon as all the commands it depends on have finished
+
+        A command depends on its parents (on its children when reverse is True), regardless of their result. Commands
+        ready at the same time run in the executor and completions are notified through a queue. When a command
+        fails and its stop flag is set, no more commands are launched but the ones running are awaited.
+
+        Returns
+        -------
+        list:
+            results of the commands that run, excluding those returning None
+        """
+        attr = 'stop_undo_on_error' if method == 'undo' else 'stop_on_error'
+        depends_on, followers = (self._dag.succ, self._dag.pred) if reverse else (self._dag.pred, self._dag.succ)
+        pending = {n: len(depends_on[n]) for n in self._dag.nodes}
+        ready = deque(n for n in self._dag.nodes if pending[n] == 0)
+        completed = queue.Queue()
+        running = 0
         res = []
         stop = False
-        level = 1
         start = time.time()
-        while level <= self._dag.depth:
-            commands = self._dag.get_nodes_at_level(level)
-            duration = time.time() - start
-            left = max(timeout - duration, 0) if timeout else None
-            if len(commands) == 1:
-                r = commands[0].invoke(timeout=left)
+
+        def finish(cmd, r):
+            nonlocal stop
+            if r is not None:
                 res.append(r)
-                stop_on_error = commands[0].stop_on_error if commands[0].stop_on_error is not None \
-                    else self.stop_on_error
-                if r is False and stop_on_error is True:
-                    break
-            else:
-                futures = {}
-
-                for command in commands:
-                    futures.update(
-                        {command.id: self.executor.submit(command.invoke, timeout=left)})
-
-                stop = None
-                while len(futures) > 0 and (left is None or (time.time() - start) < left) and stop is not True:
-                    for cmd_id, future in dict(futures).items():
-                        r = None
-                        try:
-                            r = future.result(timeout=0.5)
-                        except concurrent.futures.TimeoutError:
-                            pass
-                        except Exception as e:
-                            logger.exception(f"Error while executing step {cmd_id}")
-                            del futures[cmd_id]
-                            r = False
-                        else:
-                            del futures[cmd_id]
-                        if r is not None:
-                            res.append(r)
-                            cmd = list(filter(lambda c: c.id == cmd_id, commands))[0]
-                            stop_on_error = cmd.stop_on_error if cmd.stop_on_error is not None else self.stop_on_error
-                            if r is False and stop_on_error is True:
-                                stop = True
-
-                    duration = time.time() - start
-                    left = max(timeout - duration, 0) if timeout else None
-                # if self.var_context:
-                #     self.var_context.merge_common_variables()
-                if stop is True or (timeout is not None and (time.time() - start) > timeout):
-                    break
-            level += 1
+            if r is False and self._stop_flag(cmd, attr) is True:
+                stop = True
+            for f in followers[cmd]:
+                pending[f] -= 1
+                if pending[f] == 0:
+                    ready.append(f)
+
+        while True:
+            left = max(timeout - (time.time() - start), 0) if timeout else None
+            if left == 0:
+                break
+            while ready and not stop and (self.max_workers is None or running < self.max_workers):
+                cmd = ready.popleft()
+                if running == 0 and not ready:
+                    # nothing to run in parallel. Avoid the executor round trip
+                    finish(cmd, self._run(cmd, method, left))
+                    left = max(timeout - (time.time() - start), 0) if timeout else None
+                else:
+                    future = self.executor.submit(self._run, cmd, method, left)
+                    future.add_done_callback(partial(lambda c, f: completed.put((c, f)), cmd))
+                    running += 1
+            if running == 0 or left == 0:
+                break
+            try:
+                cmd, future = completed.get(timeout=left)
+            except queue.Empty:
+                break
+            running -= 1
+            finish(cmd, future.result())
+        return res
+
+    def invoke(self, timeout=None) -> bool:
+        res = self._schedule('invoke', timeout)
         return all(res) if len(res) > 0 else None
 
     def undo(self, timeout=None) -> t.Optional[bool]:
@@ -512,57 +536,7 @@ class CompositeCommand(ICommand):
         """
         if self.stop_undo_on_error is None:
             raise RuntimeError(f'stop_undo_on_error not set for command {self.id}')
-        res = []
-        level = self._dag.depth
-        start = time.time()
-        duration = time.time() - start
-        left = max(timeout - duration, 0) if timeout else None
-        while level > 0 and (left is None or (time.time() - start) < left):
-            commands = self._dag.get_nodes_at_level(level)
-            duration = time.time() - start
-            left = max(timeout - duration, 0) if timeout else None
-            if len(commands) == 1:
-                r = commands[0].undo(timeout=left)
-                if r is not None:
-                    res.append(r)
-                stop_undo_on_error = commands[0].stop_undo_on_error if commands[0].stop_undo_on_error is not None \
-                    else self.stop_undo_on_error
-                if r is False and stop_undo_on_error is True:
-                    break
-            else:
-                futures = {}
-
-                for command in commands:
-                    futures.update(
-                        {command.id: self.executor.submit(command.undo, timeout=left)})
-
-                stop = None
-                while len(futures) > 0 and (left is None or (time.time() - start) < left):
-                    for cmd_id, future in dict(futures).items():
-                        r = None
-                        try:
-                            r = future.result(timeout=0.5)
-                        except concurrent.futures.TimeoutError:
-                            pass
-                        except Exception as e:
-                            logger.exception(f"Error while executing step {cmd_id}")
-                            del futures[cmd_id]
-                            r = False
-                        else:
-                            del futures[cmd_id]
-                        if r is not None:
-                            res.append(r)
-                            cmd = list(filter(lambda c: c.id == cmd_id, commands))[0]
-                            stop_undo_on_error = cmd.stop_undo_on_error if cmd.stop_undo_on_error is not None \
-                                else self.stop_undo_on_error
-                            if r is False and cmd.stop_undo_on_error is True:
-                                stop = True
-                    duration = time.time() - start
-                    left = max(timeout - duration, 0) if timeout else None
-
-                if stop is True or (timeout is not None and (time.time() - start) > timeout):
-                    break
-            level -= 1
+        res = self._schedule('undo', timeout, reverse=True)
         return all(res) if len(res) > 0 else None
 
     @property
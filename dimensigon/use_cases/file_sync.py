@@ -2,6 +2,8 @@ import base64
 import logging
 import os
 import queue
+import re
+import threading
 import time
 import typing as t
 import zlib
@@ -11,18 +13,20 @@ from concurrent.futures.thread import ThreadPoolExecutor
 from dataclasses import dataclass
 from sqlalchemy import orm
 from sqlalchemy.orm import sessionmaker
-from watchdog.events import FileSystemEvent, PatternMatchingEventHandler
+from watchdog.events import FileSystemEvent, FileSystemEventHandler, PatternMatchingEventHandler, \
+    EVENT_TYPE_CREATED, EVENT_TYPE_MOVED
 from watchdog.observers import Observer
 from watchdog.observers.api import ObservedWatch
 
 from dimensigon import defaults
 from dimensigon.domain.entities import File, Server, Log, FileServerAssociation
 from dimensigon.domain.entities.log import Mode
+from dimensigon.network.pool import pool
 from dimensigon.use_cases.cluster import NewEvent, AliveEvent
-from dimensigon.use_cases.mptools import MPQueue, TimerWorker
+from dimensigon.use_cases.mptools import MPQueue, TimerWorker, _sleep_secs
 from dimensigon.utils import asyncio
 from dimensigon.utils.helpers import remove_root
-from dimensigon.utils.pygtail import Pygtail
+from dimensigon.utils.pygtail import BlockTail
 from dimensigon.utils.typos import Id
 from dimensigon.web import network as ntwrk, get_root_auth
 
@@ -32,31 +36,12 @@ if t.TYPE_CHECKING:
 _logger = logging.getLogger('dm.FileSync')
 _log_logger = logging.getLogger('dm.logfed')
 
-MAX_LINES = 10000  # max lines readed from a log
 # period of time process checks for new files added to the database. must be equal or bigger than defaults.
 FILE_WATCHES_REFRESH_PERIOD = 30
 MAX_ALLOWED_ERRORS = 2  # max allowed errors to consider a node blacklisted
 RETRY_BLACKLIST = 300  # retry blacklisted servers after RETRY_BLACKLIST seconds
 
 
-class _PygtailBuffer(Pygtail):
-
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._buffer = None
-
-    def fetch(self):
-        if self._buffer:
-            return self._buffer
-        else:
-            self._buffer = ''.join(self.readlines(max_lines=MAX_LINES))
-        return self._buffer
-
-    def update_offset_file(self):
-        self._buffer = None
-        super().update_offset_file()
-
-
 FileWatchId = t.Tuple[Id, str]
 
 
@@ -75,6 +60,45 @@ class WatchdogEventHandler(PatternMatchingEventHandler):
             self.fs.add(self.fw_id)
 
 
+def _log_filters(log: Log) -> t.Tuple[t.Pattern, t.Pattern]:
+    return re.compile(log.include or ''), re.compile(log.exclude or '^$')
+
+
+def _is_offset_file(filename: str) -> bool:
+    # offset files of folder logs are kept in the same folder
+    return filename.startswith('.') and filename.endswith(('.offset', '.offset.tmp'))
+
+
+class LogEventHandler(FileSystemEventHandler):
+    """Notifies FileSync when a file from a log is written. Runs on the observer thread, so it does not use the log
+    entity"""
+
+    def __init__(self, log: Log, fs: 'FileSync'):
+        super().__init__()
+        self.log_id = log.id
+        self.target = log.target
+        self.fs = fs
+        self.include, self.exclude = _log_filters(log)
+
+    def _match(self, path):
+        if path is None:
+            return False
+        if path == self.target:
+            return True
+        if os.path.dirname(path) == os.path.dirname(self.target) or _is_offset_file(os.path.basename(path)):
+            # other files in the folder of a single file log
+            return False
+        for name in os.path.relpath(path, self.target).split(os.sep):
+            if not self.include.search(name) or self.exclude.search(name):
+                return False
+        return True
+
+    def on_any_event(self, event: FileSystemEvent):
+        if self._match(event.src_path) or self._match(getattr(event, 'dest_path', None)):
+            # new files and folders are only found walking the log folder again
+            self.fs.log_changed(self.log_id, rescan=event.event_type in (EVENT_TYPE_CREATED, EVENT_TYPE_MOVED))
+
+
 @dataclass
 class BlacklistEntry:
     retries: int = 0
@@ -82,6 +106,7 @@ class BlacklistEntry:
 
 
 class FileSync(TimerWorker):
+    MAX_WAIT_SECS = 1  # max time without checking the shutdown event
     ###########################
     # START Class Inheritance #
     def init_args(self, dimensigon: 'Dimensigon', file_sync_period=defaults.FILE_SYNC_PERIOD,
@@ -110,7 +135,14 @@ class FileSync(TimerWorker):
         self._loop = None
 
         # log variables
-        self._mapper: t.Dict[Id, t.List[_PygtailBuffer]] = {}
+        self._mapper: t.Dict[Id, t.List[BlockTail]] = {}
+        self._log2watch: t.Dict[Id, t.Tuple[ObservedWatch, LogEventHandler]] = {}
+        self._log_lock = threading.Lock()
+        self._log_event = threading.Event()  # wakes the worker when a log changes
+        self._changed_logs: t.Set[Id] = set()
+        self._rescan_logs: t.Set[Id] = set()
+        self._log_batch_start = None  # time first change of the current batch arrived
+        self._last_log_refresh = None
 
     def startup(self):
         self._executor = ThreadPoolExecutor(max_workers=max(os.cpu_count(), 4),
@@ -120,15 +152,37 @@ class FileSync(TimerWorker):
         self._observer.start()
 
         self._set_initial_modifications()
-        self._loop = asyncio.new_event_loop()
+        self._loop = pool.new_event_loop()
         asyncio.set_event_loop(self._loop)
         self.dispatcher.listen([NewEvent, AliveEvent], lambda x: self.add(None, x.args[0]))
 
     def shutdown(self):
+        self._loop.run_until_complete(pool.async_close())
+        for tails in self._mapper.values():
+            for tail in tails:
+                tail.close()
         self.session.close()
         self._observer.stop()
         self._executor.shutdown()
 
+    def _main_loop(self):
+        # same as TimerWorker but log changes wake the worker instead of polling
+        self.next_time = time.time() + self.INTERVAL_SECS
+        while not self.shutdown_event.is_set():
+            deadline = self.next_time
+            if self._log_batch_start is not None:
+                deadline = min(deadline, self._log_batch_start + defaults.LOG_BATCH_DELAY)
+            # shutdown_event can not be waited together with the log event
+            self._log_event.wait(_sleep_secs(self.MAX_WAIT_SECS, deadline))
+            self._log_event.clear()
+            if self.next_time and time.time() > self.next_time:
+                self.logger.log(1, f"Calling main_func")
+                self.main_func()
+                self.next_time = time.time() + self.INTERVAL_SECS
+            elif self._log_batch_start is not None and \
+                    time.time() >= self._log_batch_start + defaults.LOG_BATCH_DELAY:
+                self._send_new_data(*self._take_changed_logs())
+
     def main_func(self):
         # collect new File events
         while True:
@@ -140,8 +194,14 @@ class FileSync(TimerWorker):
         self._set_watchers()
         self._sync_files()
 
-        # send log data
-        self._send_new_data()
+        # send log data. Every log is read on refresh in case a change was not notified
+        changed, rescan = self._take_changed_logs()
+        if self._last_log_refresh is None or time.time() - self._last_log_refresh > self.file_watches_refresh_period:
+            self._last_log_refresh = time.time()
+            self._send_new_data()
+        else:
+            # retry logs not sent
+            self._send_new_data(changed | set(self._blacklist_log.keys()), rescan)
 
     # END Class Inheritance #
     #########################
@@ -162,6 +222,19 @@ class FileSync(TimerWorker):
         except queue.Full:
             self.logger.warning("Queue is full. Try increasing its size")
 
+    def log_changed(self, log_id: Id, rescan=False, wait=True):
+        """schedules sending the new data of the log. Unless wait is False, data is sent after LOG_BATCH_DELAY seconds
+        to gather the next writes in the same request"""
+        with self._log_lock:
+            self._changed_logs.add(log_id)
+            if rescan:
+                self._rescan_logs.add(log_id)
+            if not wait:
+                self._log_batch_start = time.time() - defaults.LOG_BATCH_DELAY
+            elif self._log_batch_start is None:
+                self._log_batch_start = time.time()
+        self._log_event.set()
+
     # END Interface functions  #
     ############################
 
@@ -367,22 +440,58 @@ class FileSync(TimerWorker):
                     # add for sending file for first time
                     self._add(file_id, None)
 
+    def _take_changed_logs(self) -> t.Tuple[t.Set[Id], t.Set[Id]]:
+        with self._log_lock:
+            changed, rescan = self._changed_logs, self._rescan_logs
+            self._changed_logs, self._rescan_logs = set(), set()
+            self._log_batch_start = None
+        return changed, rescan
+
+    def _watch_log(self, log: Log):
+        handler = LogEventHandler(log, self)
+        try:
+            if os.path.isdir(log.target):
+                watch = self._observer.schedule(handler, log.target, recursive=log.recursive)
+            else:
+                watch = self._observer.schedule(handler, os.path.dirname(log.target), recursive=False)
+        except (FileNotFoundError, OSError) as e:
+            _log_logger.warning(f"Unable to watch log {log.target}: {e}. Log sent every "
+                                f"{self.file_watches_refresh_period} seconds")
+        else:
+            self._log2watch[log.id] = (watch, handler)
+
+    def _unwatch_log(self, log_id: Id):
+        if log_id in self._log2watch:
+            watch, handler = self._log2watch.pop(log_id)
+            # watch may be shared with other logs or files in the same folder
+            try:
+                self._observer.remove_handler_for_watch(handler, watch)
+            except KeyError:
+                pass
+
     @property
     def my_logs(self):
         return self.session.query(Log).filter_by(source_server=Server.get_current(session=self.session)).all()
 
-    def update_mapper(self):
+    def update_mapper(self, rescan: t.Container[Id] = None):
+        """updates the tailers from the logs in the database. Log folders are walked for new files only for the logs
+        in rescan or for every log if rescan is None"""
         logs = self.my_logs
         id2log = {log.id: log for log in logs}
         # remove logs
         for log_id in list(self._mapper.keys()):
             if log_id not in id2log:
-                del self._mapper[log_id]
+                for tail in self._mapper.pop(log_id):
+                    tail.close()
+                self._unwatch_log(log_id)
 
         # add new logs
         for log in logs:
             if log.id not in self._mapper:
                 self._mapper[log.id] = []
+                self._watch_log(log)
+            elif rescan is not None and log.id not in rescan:
+                continue
             self.update_pytail_objects(log, self._mapper[log.id])
 
     def update_pytail_objects(self, log: Log, pytail_list: t.List):
@@ -394,34 +503,35 @@ class FileSync(TimerWorker):
                 if not os.path.exists(offset_file):
                     _log_logger.debug(f"creating offset file {offset_file}")
                     os.makedirs(os.path.dirname(offset_file), exist_ok=True)
-                pytail_list.append(
-                    _PygtailBuffer(file=log.target, offset_mode='manual', offset_file=offset_file))
+                pytail_list.append(BlockTail(file=log.target, offset_file=offset_file))
         else:
+            include, exclude = _log_filters(log)
             for folder, dirnames, filenames in os.walk(log.target):
                 for filename in filenames:
-                    if log._re_include.search(filename) and not log._re_exclude.search(filename):
+                    if include.search(filename) and not exclude.search(filename) and not _is_offset_file(filename):
                         file = os.path.join(folder, filename)
                         offset_file = os.path.join(folder, '.' + filename + '.offset')
                         if not any(map(lambda p: p.file == file, pytail_list)):
-                            pytail_list.append(
-                                _PygtailBuffer(file=file, offset_mode='manual', offset_file=offset_file))
+                            pytail_list.append(BlockTail(file=file, offset_file=offset_file))
                 if not log.recursive:
                     break
                 new_dirnames = []
                 for dirname in dirnames:
-                    if log._re_include.search(dirname) and not log._re_exclude.search(dirname):
+                    if include.search(dirname) and not exclude.search(dirname):
                         new_dirnames.append(dirname)
                 dirnames[:] = new_dirnames
 
-    def _send_new_data(self):
-        self.update_mapper()
+    def _send_new_data(self, log_ids: t.Container[Id] = None, rescan: t.Container[Id] = None):
+        """sends the new data of the logs in log_ids or of every log if None"""
+        self.update_mapper(rescan if log_ids is not None else None)
         tasks = OrderedDict()
 
         for log_id, pb in self._mapper.items():
+            if log_ids is not None and log_id not in log_ids:
+                continue
             log = self.session.query(Log).get(log_id)
             for pytail in pb:
                 data = pytail.fetch()
-                data = data.encode() if isinstance(data, str) else data
                 if data and log.destination_server.id in self.dm.cluster_manager.get_alive():
                     if log.mode == Mode.MIRROR:
                         file = pytail.file
@@ -458,13 +568,16 @@ class FileSync(TimerWorker):
 
         if tasks:
             with self.dm.flask_app.app_context():
-                responses = asyncio.run(asyncio.gather(*list(tasks.keys())))
+                responses = self._loop.run_until_complete(asyncio.gather(*list(tasks.keys())))
 
             for task, resp in zip(tasks.keys(), responses):
                 pytail, log = tasks[task]
                 if resp.ok:
-                    pytail.update_offset_file()
+                    pytail.commit()
                     _log_logger.debug(f"Updated offset from '{pytail.file}'")
+                    if pytail.pending:
+                        # file has more data than a batch. Send it without waiting
+                        self.log_changed(log.id, wait=False)
                     if log.id not in self._blacklist:
                         self._blacklist_log.pop(log.id, None)
                 else:
@@ -9,6 +9,7 @@ import sqlite3
 import sys
 import tempfile
 import time
+import types
 import typing as t
 from abc import ABC, abstractmethod
 
@@ -31,6 +32,26 @@ from dimensigon.web import network as ntwrk
 from dimensigon.web.helpers import normalize_hosts
 
 
+# steps of an orchestration run the same code on every target. Code is compiled once per process and reused while
+# it stays among the COMPILE_CACHE_SIZE most recently used
+_jinja_env = jinja2.Environment()
+
+
+@functools.lru_cache(maxsize=defaults.COMPILE_CACHE_SIZE)
+def compile_template(source: str) -> jinja2.Template:
+    return _jinja_env.from_string(source)
+
+
+@functools.lru_cache(maxsize=defaults.COMPILE_CACHE_SIZE)
+def compile_pattern(pattern: str) -> t.Pattern:
+    return re.compile(pattern)
+
+
+@functools.lru_cache(maxsize=defaults.COMPILE_CACHE_SIZE)
+def compile_code(source: str) -> types.CodeType:
+    return compile(source, '<string>', 'exec')
+
+
 @dataclass
 class CompletedProcess:
     success: bool = None
@@ -121,15 +142,14 @@ class IOperationEncapsulation(ABC):
                                     end_time=get_now())
 
     def rpl_params(self, **context):
-        template = jinja2.Template(self.code)
-        return template.render(**context)
+        return compile_template(self.code).render(**context)
 
     def evaluate_result(self, cp: CompletedProcess, context=None):
         if cp.success is None:
             res = []
             if self.expected_stdout is not None:
                 if isinstance(cp.stdout, str):
-                    match = re.search(self.expected_stdout, cp.stdout)
+                    match = compile_pattern(self.expected_stdout).search(cp.stdout)
                     if match:
                         res.append(True)
                         if context:
@@ -139,7 +159,7 @@ class IOperationEncapsulation(ABC):
                         res.append(False)
             if self.expected_stderr is not None:
                 if isinstance(cp.stderr, str):
-                    match = re.search(self.expected_stderr, cp.stderr)
+                    match = compile_pattern(self.expected_stderr).search(cp.stderr)
                     if match:
                         res.append(True)
                         if context:
@@ -8,13 +8,15 @@ import time
 import typing as t
 import uuid
 
-from sqlalchemy import orm
+from sqlalchemy import orm, bindparam
 from sqlalchemy.orm import sessionmaker
 
 from dimensigon import defaults
 from dimensigon.domain.entities import Server, Route, Gate, Parameter
 from dimensigon.domain.entities.route import RouteContainer
 from dimensigon.network.low_level import check_host, async_check_host
+from dimensigon.network.pool import pool
+from dimensigon.network.resolver import resolver
 from dimensigon.use_cases.mptools import Worker, MPQueue
 from dimensigon.use_cases.mptools_events import BaseEvent
 from dimensigon.utils.helpers import convert, is_iterable_not_string, format_exception, get_now
@@ -143,6 +145,80 @@ async def _async_discover_new_neighbours(servers: t.List[Server] = None,
     return new_neighbours
 
 
+_MISSING = object()
+
+
+class RoutingGraph:
+    """In-memory view of the routes advertised by the neighbours.
+
+    Keeps the cost to reach every destination through every neighbour, so a new route table or a route delta only
+    re-evaluates the destinations whose advertised costs changed instead of rebuilding the whole table.
+    """
+
+    def __init__(self):
+        # neighbour id -> destination id -> cost through the neighbour (None if neighbour does not reach it)
+        self._adv: t.Dict[Id, t.Dict[Id, t.Optional[int]]] = {}
+        self._dirty: t.Set[Id] = set()
+
+    @property
+    def neighbours(self) -> t.List[Id]:
+        return list(self._adv)
+
+    def update(self, neighbour: Id, routes: t.Dict[Id, t.Optional[int]], removed: t.Iterable[Id] = (),
+               replace=False) -> t.Set[Id]:
+        """applies the costs advertised by a neighbour. Returns the destinations whose cost changed
+
+        Args:
+            neighbour: neighbour that advertises the routes
+            routes: cost to reach every destination through the neighbour
+            removed: destinations not reachable through the neighbour anymore
+            replace: routes are the whole table of the neighbour
+        """
+        old = self._adv.get(neighbour, {})
+        new = dict(routes) if replace else {**old, **routes}
+        for d in removed:
+            new.pop(d, None)
+        self._adv[neighbour] = new
+        return {d for d in old.keys() | new.keys() if old.get(d, _MISSING) != new.get(d, _MISSING)}
+
+    def forget(self, neighbour: Id) -> t.Set[Id]:
+        """removes the routes advertised by a neighbour. Returns the destinations it advertised"""
+        return set(self._adv.pop(neighbour, {}))
+
+    def invalidate(self, *destinations: Id):
+        """forces destinations to be re-evaluated on the next merge"""
+        self._dirty.update(destinations)
+
+    def pop_invalidated(self) -> t.Set[Id]:
+        dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def reorder(self, neighbours: t.Iterable[Id]):
+        """neighbours are checked in the given order. First neighbour wins when costs are equal"""
+        adv = {n: self._adv[n] for n in neighbours if n in self._adv}
+        adv.update(self._adv)
+        self._adv = adv
+
+    def clear(self):
+        self._adv.clear()
+
+    def advertises(self, neighbour: Id, destination: Id) -> bool:
+        """tells if the neighbour sent its cost to reach the destination"""
+        return destination in self._adv.get(neighbour, {})
+
+    def best(self, destination: Id) -> t.Optional[t.Tuple[t.Optional[Id], t.Optional[int]]]:
+        """returns the (proxy server id, cost) with the lowest cost to reach the destination or None if no neighbour
+        advertises the destination"""
+        best = None
+        for neighbour, routes in self._adv.items():
+            cost = routes.get(destination, _MISSING)
+            if cost is not _MISSING and (best is None or (cost or MAX_COST) < (best[1] or MAX_COST)):
+                best = (neighbour, cost)
+        if best and best[1] is None:
+            return None, None
+        return best
+
+
 class RouteManager(Worker):
     ###########################
     # START Class Inheritance #
@@ -155,6 +231,7 @@ class RouteManager(Worker):
         self.refresh_interval = refresh_interval
         self.send_interval = send_interval
         self._loop = asyncio.new_event_loop()
+        self._graph = RoutingGraph()
 
     def startup(self):
         def refresh():
@@ -162,6 +239,7 @@ class RouteManager(Worker):
             self._timer = threading.Timer(interval=self.refresh_interval, function=refresh)
             self._timer.start()
 
+        pool.register_loop(self._loop)
         self.session = self._create_session()
         self._timer = threading.Timer(interval=self.refresh_interval, function=refresh)
         self._timer.start()
@@ -174,6 +252,7 @@ class RouteManager(Worker):
         if self._timer:
             self._timer.cancel()
             self._timer.join()
+        self._loop.run_until_complete(pool.async_close())
 
     def _main_loop(self):
         with self.dm.flask_app.app_context():
@@ -264,58 +343,86 @@ class RouteManager(Worker):
     def gate_query(self):
         return self.session.query(Gate).filter_by(deleted=0) if self.session else None
 
+    def _load_servers(self, ids: t.Iterable[Id]) -> t.Dict[Id, Server]:
+        """loads servers with their routes using one query for every chunk of ids"""
+        ids = [i for i in set(ids) if i]
+        servers = {}
+        for i in range(0, len(ids), 500):
+            servers.update({s.id: s for s in self.session.query(Server).options(orm.joinedload(Server.route)).filter(
+                Server.id.in_(ids[i:i + 500]))})
+        return servers
+
+    def _advertised(self, route_list: t.List[t.Dict]) -> t.Tuple[t.Dict[Id, t.Optional[int]], t.Set[Id]]:
+        """returns the cost to reach every destination through the neighbour that sent the route list and the
+        destinations the neighbour reaches through me"""
+        me = self.server.id
+        my_gates = {g.id for g in self.server.gates}
+        routes, through_me = {}, set()
+        for route_json in route_list:
+            destination_id = route_json.get('destination_id')
+            if destination_id == me:
+                continue
+            if route_json.get('proxy_server_id') == me or route_json.get('gate_id') in my_gates:
+                through_me.add(destination_id)
+            else:
+                cost = route_json.get('cost')
+                routes[destination_id] = cost + 1 if cost is not None else None
+        return routes, through_me
+
+    def _write_routes(self, routes: t.Dict[Server, RouteContainer]):
+        """validates the new routes and writes them with one statement"""
+        params = []
+        for server, rc in routes.items():
+            if server.route is None:
+                # server may be created without route (backward compatibility)
+                server.route = Route(destination=server)
+            server.route.validate_route(rc)
+            params.append(dict(b_destination_id=server.id, proxy_server_id=getattr(rc.proxy_server, 'id', None),
+                               gate_id=getattr(rc.gate, 'id', None), cost=rc.cost))
+        if params:
+            self.session.flush()
+            table = Route.__table__
+            self.session.execute(table.update().where(table.c.destination_id == bindparam('b_destination_id')),
+                                 params)
+            for server in routes:
+                self.session.expire(server.route)
+
     def _route_table_merge(self, data: t.Dict[Server, ntwrk.Response]):
         changed_routes: t.Dict[Server, RouteContainer] = {}
-        temp_table_routes: t.Dict[uuid.UUID, t.List[RouteContainer]] = {}
+        affected = self._graph.pop_invalidated()
+        responded = []
         for s, resp in data.items():
             if resp.code == 200:
                 server_id = resp.msg.get('server_id', None) or resp.msg.get('server').get('id')
-                likely_proxy_server_entity = self.session.query(Server).get(server_id)
-                for route_json in resp.msg['route_list']:
-                    route_json = convert(route_json)
-                    if route_json.destination_id != self.server.id \
-                            and route_json.proxy_server_id != self.server.id \
-                            and route_json.gate_id not in [g.id for g in self.server.gates]:
-                        if route_json.destination_id not in temp_table_routes:
-                            temp_table_routes.update({route_json.destination_id: []})
-                        if route_json.cost is not None:
-                            route_json.cost += 1
-                            route_json.proxy_server_id = likely_proxy_server_entity.id
-                            route_json.gate_id = None
-                            temp_table_routes[route_json.destination_id].append(
-                                RouteContainer(likely_proxy_server_entity.id, None, route_json.cost))
-                        elif route_json.cost is None:
-                            # remove a routing if gateway cannot reach the destination
-                            temp_table_routes[route_json.destination_id].append(
-                                RouteContainer(route_json.proxy_server_id, None, None))
+                routes, _ = self._advertised(resp.msg['route_list'])
+                affected.update(self._graph.update(server_id, routes, replace=True))
+                responded.append(server_id)
             else:
                 self.logger.error(f"Error while connecting with {s}. Error: {resp}")
 
-        # Select new routes based on neighbour routes
-        neighbour_ids = [s.id for s in Server.get_neighbours(session=self.session)]
-        for destination_id in filter(lambda s: s not in neighbour_ids, temp_table_routes.keys()):
-            route = self.session.query(Route).filter_by(destination_id=destination_id).one_or_none()
-            if not route:
-                server = self.session.query(Server).get(destination_id)
-                if not server:
-                    continue
-                else:
-                    route = Route(destination=server)
-            temp_table_routes[destination_id].sort(key=lambda x: x.cost or MAX_COST)
-            if len(temp_table_routes[destination_id]) > 0:
-                min_route = temp_table_routes[destination_id][0]
-                proxy_server: Server = self.session.query(Server).get(min_route.proxy_server)
-                cost = min_route.cost
-                if route.proxy_server != proxy_server or route.cost != cost:
-                    rc = RouteContainer(proxy_server, None, cost)
-                    route.set_route(rc)
-                    changed_routes[route.destination] = rc
-                    self.session.add(route)
-
-        data = {}
-        for server, temp_route in changed_routes.items():
-            data.update({str(server): {'proxy_server': str(temp_route.proxy_server), 'gate': str(temp_route.gate),
-                                       'cost': str(temp_route.cost)}})
+        # routes from neighbours that did not send their table are not taken into account
+        for neighbour_id in set(self._graph.neighbours).difference(responded):
+            affected.update(self._graph.forget(neighbour_id))
+        self._graph.reorder(responded)
+
+        # Select new routes based on neighbour routes. Only destinations whose routes changed are evaluated
+        neighbour_ids = {s.id for s in Server.get_neighbours(session=self.session)}
+        destinations = affected - neighbour_ids
+        servers = self._load_servers(destinations.union(self._graph.neighbours))
+        for destination_id in destinations:
+            server = servers.get(destination_id)
+            best = self._graph.best(destination_id)
+            if not server or best is None:
+                continue
+            proxy_id, cost = best
+            proxy_server = servers.get(proxy_id)
+            if proxy_id and not proxy_server:
+                continue
+            route = server.route
+            if route is None or route.proxy_server_id != proxy_id or route.gate_id is not None or route.cost != cost:
+                changed_routes[server] = RouteContainer(proxy_server, None, cost)
+        self._write_routes(changed_routes)
+
         return changed_routes
 
     async def _async_refresh_route_table(self, discover_new_neighbours=False, check_current_neighbours=False,
@@ -338,6 +445,8 @@ class RouteManager(Worker):
         """
 
         self.logger.debug('Refresh Route Table')
+        # gate names are resolved in background so that route checks and gate lookups do not wait on DNS
+        resolver.warm([dns for dns, in self.gate_query.filter(Gate.dns != None).with_entities(Gate.dns)])
         neighbours = Server.get_neighbours(session=self.session)
         not_neighbours = Server.get_not_neighbours(session=self.session)
 
@@ -375,6 +484,8 @@ class RouteManager(Worker):
                 self.logger.info(
                     f"Lost direct connection to the following nodes: " + ', '.join(
                         [str(s) for s in not_neighbours_anymore]))
+                # former neighbours are reached through other neighbours from now on
+                self._graph.invalidate(*[s.id for s in not_neighbours_anymore])
         if discover_new_neighbours and not_neighbours[:max_num_discovery]:
             new_neighbours = res.pop(0)
             if new_neighbours:
@@ -385,10 +496,10 @@ class RouteManager(Worker):
         # remove routes whose proxy_server is a node that is not a neighbour
         query = self.session.query(Route).filter(
             Route.proxy_server_id.in_([s.id for s in list(set(not_neighbours).union(set(not_neighbours_anymore)))]))
-        rc = RouteContainer(None, None, None)
-        for route in query.all():
-            route.set_route(rc)
-            changed_routes[route.destination] = rc
+        lost_routes = {route.destination: RouteContainer(None, None, None) for route in query.all()}
+        self._write_routes(lost_routes)
+        changed_routes.update(lost_routes)
+        self._graph.invalidate(*[s.id for s in lost_routes])
         self.session.commit()
 
         # update neighbour lis
@@ -406,142 +517,131 @@ class RouteManager(Worker):
         return changed_routes
 
     def _update_route_table_from_data(self, new_routes: t.Dict, auth=None) -> t.Dict[Server, RouteContainer]:
+        """applies the routes sent by a server. Only the destinations whose advertised cost changed are evaluated"""
         changed_routes = {}
         routes = new_routes.get('route_list', [])
-        routes.sort(key=lambda x: x.get('cost') or MAX_COST, reverse=True)
+        likely_proxy_server_id = new_routes.get('server_id')
+        servers, affected = {}, set()
         try:
-            likely_proxy_server = self.session.query(Server).get(new_routes.get('server_id'))
+            advertised, through_me = self._advertised(routes)
+            servers = self._load_servers([likely_proxy_server_id] + [r.get(k) for r in routes for k in
+                                                                     ('destination_id', 'proxy_server_id')])
+            likely_proxy_server = servers.get(likely_proxy_server_id)
             if not likely_proxy_server:
-                self.logger.warning(f"Server id still '{new_routes.get('server_id')}' not created.")
+                self.logger.warning(f"Server id still '{likely_proxy_server_id}' not created.")
                 return changed_routes
-            debug_new_routes = []
-            for new_route in routes:
-                target_server = self.session.query(Server).get(new_route.get('destination_id'))
-                proxy_server = self.session.query(Server).get(new_route.get('proxy_server_id'))
-                gate = self.session.query(Gate).get(new_route.get('gate_id'))
-                dest_name = getattr(target_server, 'name', new_route.get('destination_id'))
-                proxy_name = getattr(proxy_server, 'name', new_route.get('proxy_server_id'))
-                gate_str = str(gate) if gate else new_route.get('gate_id')
-                cost = new_route.get('cost')
-                if gate_str and proxy_name:
-                    gate_str = gate_str + '*' + proxy_name
-                debug_new_routes.append(f'{dest_name} -> {gate_str or proxy_name} / {cost}')
+            affected = self._graph.update(likely_proxy_server.id, advertised, removed=through_me)
+            affected.update(self._graph.pop_invalidated())
+            servers.update(self._load_servers(affected.union(self._graph.neighbours).difference(servers)))
+
+            # check if server has detected me as a neighbour
+            if any(r.get('destination_id') == self.server.id and r.get('cost') == 0 for r in routes):
+                # check if I do not have it as a neighbour yet
+                if likely_proxy_server.route and likely_proxy_server.route.cost != 0:
+                    # check if I have a gate to contact with it
+                    route = check_gates(likely_proxy_server)
+                    if isinstance(route, RouteContainer):
+                        changed_routes[likely_proxy_server] = route
+
+            for destination_id in affected:
+                target_server = servers.get(destination_id)
                 if target_server is None:
-                    self.logger.warning(f"Destination server unknown {new_route.get('destination_id')}")
+                    self.logger.warning(f"Destination server unknown {destination_id}")
                     continue
-                if target_server.id == self.server.id:
-                    # check if server has detected me as a neighbour
-                    if new_route.get('cost') == 0:
-                        # check if I do not have it as a neighbour yet
-                        if likely_proxy_server.route and likely_proxy_server.route.cost != 0:
-                            # check if I have a gate to contact with it
-                            route = check_gates(likely_proxy_server)
-                            if isinstance(route, RouteContainer):
-                                changed_routes[likely_proxy_server] = route
-                                likely_proxy_server.set_route(route)
-                else:
-                    # server may be created without route (backward compatibility)
-                    if target_server.route is None:
-                        target_server.set_route(Route(destination=target_server))
-                    # process routes whose proxy_server is not me
-                    if self.server.id != new_route.get('proxy_server_id'):
-                        # check If I reach destination
-                        if target_server.route.cost is not None:
-                            if new_route.get('cost') is None:
-                                #  likely proxy does not reach but I reach it. It might be shutdown unexpectedly?
-                                if target_server.route.cost == 0:
-                                    # check if I still have it as a neighbour
-                                    route = check_gates(target_server)
-                                else:
-                                    if target_server.route.proxy_server == likely_proxy_server:
-                                        route = RouteContainer(None, None, None)
-                                    else:
-                                        # check if I still have access through my proxy
-                                        cost, time = ntwrk.ping(target_server, retries=1, timeout=20,
-                                                                session=self.session)
-                                        if cost == target_server.route.cost:
-                                            # still a valid route
-                                            route = target_server.route
-                                        elif cost is None:
-                                            route = RouteContainer(None, None, None)
-                                        else:
-                                            route = RouteContainer(target_server.route.proxy_server, None, cost)
-
-                                if isinstance(route, RouteContainer):
-                                    # gate changed
-                                    changed_routes[target_server] = route
-                                    target_server.set_route(route)
-                                elif route is None:
-                                    # no route to host. I've lost contact too
-                                    changed_routes[target_server] = RouteContainer(None, None, None)
-                                    target_server.set_route(changed_routes[target_server])
-                                else:
-                                    # still a valid route. Send route to likely_proxy_server to tell it I have access
-                                    resp = ntwrk.patch(likely_proxy_server, 'api_1_0.routes',
-                                                           json=dict(server_id=str(self.server.id),
-                                                                     route_list=[target_server.route.to_json()]),
-                                                           auth=get_root_auth(), timeout=5)
-                                    if not resp.ok:
-                                        self.logger.info(f'Unable to send route to {likely_proxy_server}: {resp}')
-                            elif target_server.route.proxy_server is not None and \
-                                    target_server.route.proxy_server == likely_proxy_server:
-                                # my proxy is telling me the route has changed
-                                rc = RouteContainer(likely_proxy_server, None, new_route.get('cost') + 1)
-                                target_server.set_route(rc)
-                                changed_routes.update({target_server: rc})
-                            elif new_route.get('cost') + 1 < target_server.route.cost:
-                                # if new route has less cost than actual route, take it as my new route
-                                rc = RouteContainer(likely_proxy_server, None, new_route.get('cost') + 1)
-                                target_server.set_route(rc)
-                                changed_routes.update({target_server: rc})
+                if target_server in changed_routes:
+                    continue
+                route = target_server.route
+                lost = destination_id in advertised and advertised[destination_id] is None
+                if route and route.cost == 0:
+                    if lost:
+                        #  likely proxy does not reach but I reach it. It might be shutdown unexpectedly?
+                        # check if I still have it as a neighbour
+                        rc = check_gates(target_server)
+                        if rc is None:
+                            # no route to host. I've lost contact too
+                            changed_routes[target_server] = RouteContainer(None, None, None)
+                        elif isinstance(rc, RouteContainer):
+                            # gate changed
+                            changed_routes[target_server] = rc
                         else:
-                            # me does not reaches target_server
-                            # if new route reaches the destination take it as a new one
-                            if (new_route.get('cost') == 0 and new_route.get('gate_id') is not None) or (
-                                    new_route.get('cost') is not None and proxy_server is not None):
-                                rc = RouteContainer(likely_proxy_server, None, new_route.get('cost') + 1)
-                            else:
-                                # neither my route and the new route has access to the destination
-                                rc = RouteContainer(None, None, None)
-                            if target_server.route and (
-                                    rc.proxy_server != target_server.route.proxy_server or
-                                    rc.gate != target_server.route.gate or
-                                    rc.cost != target_server.route.cost):
-                                target_server.set_route(rc)
-                                changed_routes.update({target_server: rc})
-                    else:
-                        # target_server reached through me as a proxy from likely_proxy
-                        pass
-
-            query = self.session.query(Route).filter(
-                Route.proxy_server_id.in_([s.id for s, r in changed_routes.items() if r.cost is None]))
-            rc = RouteContainer(None, None, None)
-            for route in query.all():
-                route.set_route(rc)
-                changed_routes[route.destination] = rc
-
-            self.logger.debug(
-                f"New routes processed from {likely_proxy_server.name}: {json.dumps(debug_new_routes, indent=2)}")
+                            self._send_route(likely_proxy_server, route)
+                    continue
+
+                best = self._graph.best(destination_id)
+                if route and route.cost is not None and not self._graph.advertises(route.proxy_server_id,
+                                                                                  destination_id):
+                    # routing table of my proxy is unknown. Keep the route unless a neighbour advertises a better one
+                    if best is None or best[1] is None or route.cost <= best[1]:
+                        if not lost:
+                            continue
+                        # check if I still have access through my proxy
+                        cost, _ = ntwrk.ping(target_server, retries=1, timeout=20, session=self.session)
+                        if cost == route.cost:
+                            # still a valid route. Send route to likely_proxy_server to tell it I have access
+                            self._send_route(likely_proxy_server, route)
+                            continue
+                        elif cost is not None:
+                            best = (route.proxy_server_id, cost)
+                if best is None:
+                    # nobody else advertises the destination. It is reached through me from likely_proxy
+                    continue
+                proxy_id, cost = best
+                proxy_server = servers.get(proxy_id)
+                if proxy_id and not proxy_server:
+                    continue
+                if route is None or route.proxy_server_id != proxy_id or route.gate_id is not None \
+                        or route.cost != cost:
+                    changed_routes[target_server] = RouteContainer(proxy_server, None, cost)
+
+            # routes through servers I do not reach anymore are lost too
+            unreachable = [s.id for s, r in changed_routes.items() if r.cost is None]
+            for server, rc in changed_routes.items():
+                if getattr(rc.proxy_server, 'id', None) in unreachable:
+                    changed_routes[server] = RouteContainer(None, None, None)
+            for route in self.session.query(Route).filter(Route.proxy_server_id.in_(unreachable)):
+                if route.destination not in changed_routes:
+                    changed_routes[route.destination] = RouteContainer(None, None, None)
+            # what lost servers advertised is not valid anymore
+            for server in [s for s, r in changed_routes.items() if r.cost is None]:
+                self._graph.invalidate(server.id, *self._graph.forget(server.id))
+
+            self._write_routes(changed_routes)
+
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"New routes processed from {likely_proxy_server.name}: "
+                                  f"{json.dumps(self._debug_routes(routes, servers), indent=2)}")
             # if changed_routes:
             #     Parameter.set('routing_last_refresh', get_now())
         except errors.InvalidRoute as e:
-            debug_new_routes = []
-            routes.sort(key=lambda x: x.get('cost') or MAX_COST, reverse=True)
-            for new_route in routes:
-                target_server = self.session.query(Server).get(new_route.get('destination_id'))
-                proxy_server = self.session.query(Server).get(new_route.get('proxy_server_id'))
-                gate = self.session.query(Gate).get(new_route.get('gate_id'))
-                dest_name = getattr(target_server, 'name', new_route.get('destination_id'))
-                proxy_name = getattr(proxy_server, 'name', new_route.get('proxy_server_id'))
-                gate_str = str(gate) if gate else new_route.get('gate_id')
-                cost = new_route.get('cost')
-                if gate_str and proxy_name:
-                    gate_str = gate_str + '*' + proxy_name
-                debug_new_routes.append(f'{dest_name} -> {gate_str or proxy_name} / {cost}')
             self.logger.exception(
-                "Error setting routes from following data: " + json.dumps(debug_new_routes, indent=4))
+                "Error setting routes from following data: " + json.dumps(self._debug_routes(routes, servers),
+                                                                          indent=4))
+            # nothing was written. Destinations are evaluated again on the next merge
+            self._graph.invalidate(*affected)
+            changed_routes = {}
         return changed_routes
 
+    def _send_route(self, server: Server, route: Route):
+        resp = ntwrk.patch(server, 'api_1_0.routes', json=dict(server_id=str(self.server.id),
+                                                                route_list=[route.to_json()]),
+                           auth=get_root_auth(), timeout=5)
+        if not resp.ok:
+            self.logger.info(f'Unable to send route to {server}: {resp}')
+
+    def _debug_routes(self, routes: t.List[t.Dict], servers: t.Dict[Id, Server]) -> t.List[str]:
+        gates = {g.id: g for g in self.session.query(Gate).filter(
+            Gate.id.in_([r.get('gate_id') for r in routes if r.get('gate_id')]))}
+        debug_routes = []
+        for route in routes:
+            dest_name = getattr(servers.get(route.get('destination_id')), 'name', route.get('destination_id'))
+            proxy_name = getattr(servers.get(route.get('proxy_server_id')), 'name', route.get('proxy_server_id'))
+            gate = gates.get(route.get('gate_id'))
+            gate_str = str(gate) if gate else route.get('gate_id')
+            if gate_str and proxy_name:
+                gate_str = gate_str + '*' + proxy_name
+            debug_routes.append(f"{dest_name} -> {gate_str or proxy_name} / {route.get('cost')}")
+        return debug_routes
+
     def _new_node_in_cluster(self, server_id, routes):
         changed_routes = {}
         server = self.session.query(Server).get(server_id)
@@ -566,6 +666,7 @@ class RouteManager(Worker):
 
         if server:
             server.set_route(RouteContainer(None, None, None))
+            self._graph.invalidate(server.id, *self._graph.forget(server.id))
             lost_routes = self.session.query(Route).filter_by(proxy_server_id=server.id).options(
                 orm.lazyload(Route.destination), orm.lazyload(Route.gate), orm.lazyload(Route.proxy_server)).count()
             if lost_routes:
@@ -1,5 +1,6 @@
 # business functions related with business logic
 import base64
+import hashlib
 import logging
 import math
 import os
@@ -43,19 +44,31 @@ def get_software(server: Server, auth) -> t.Tuple[str, str]:
 
 async def async_send_file(dest_server: Server, transfer_id: Id, file,
                           chunk_size: int = None, chunks: int = None, max_senders: int = None,
-                          identity=None, retries: int = 3):
+                          identity=None, retries: int = 3, binary: bool = True):
     async def send_chunk(server: Server, view: str, _chunk, _chunk_size, sem, _session):
         async with sem:
-            json_msg = dict(chunk=_chunk)
-
             with open(file, 'rb') as fd:
                 fd.seek(_chunk * _chunk_size)
-                chunk_content = base64.b64encode(fd.read(_chunk_size)).decode('ascii')
-            json_msg.update(content=chunk_content)
+                raw = fd.read(_chunk_size)
+
+            if binary:
+                return await ntwrk.async_post(server, view_or_url='api_1_0.transferchunkresource',
+                                              view_data=dict(transfer_id=str(transfer_id), chunk=_chunk), data=raw,
+                                              headers={'Content-Type': 'application/octet-stream',
+                                                       'D-Checksum': hashlib.md5(raw).hexdigest()},
+                                              session=_session, identity=identity)
+            else:
+                json_msg = dict(chunk=_chunk, content=base64.b64encode(raw).decode('ascii'))
+                return await ntwrk.async_post(server, view_or_url=view,
+                                              view_data=dict(transfer_id=str(transfer_id)), json=json_msg,
+                                              session=_session, identity=identity)
 
-            return await ntwrk.async_post(server, view_or_url=view,
-                                          view_data=dict(transfer_id=str(transfer_id)), json=json_msg,
-                                          session=_session, identity=identity)
+    async def missing_chunks(_session) -> t.Optional[t.Set[int]]:
+        # chunks the destination has not received yet. None if destination is unable to tell it
+        resp = await ntwrk.async_get(dest_server, 'api_1_0.transferchunklist',
+                                     view_data={'transfer_id': str(transfer_id)}, session=_session, identity=identity)
+        if resp.code == 200:
+            return {c for start, end in resp.msg['missing'] for c in range(start, end)}
 
     chunk_size = chunk_size or defaults.CHUNK_SIZE
     max_senders = max_senders or defaults.MAX_SENDERS
@@ -67,6 +80,9 @@ async def async_send_file(dest_server: Server, transfer_id: Id, file,
         while retries > 0:
             responses = {}
             retry_chunks = []
+            missing = await missing_chunks(session)
+            if missing is not None:
+                l_chunks = [c for c in l_chunks if c in missing]
             for chunk in l_chunks:
                 task = asyncio.create_task(
                     send_chunk(dest_server, 'api_1_0.transferresource', chunk, chunk_size, sem, session))
@@ -90,6 +106,8 @@ async def async_send_file(dest_server: Server, transfer_id: Id, file,
                         f"{resp}")
             l_chunks = retry_chunks
             retries -= 1
+            if not l_chunks:
+                break
     if l_chunks:
         data = {c: responses[c].result() for c in l_chunks}
         resp = await ntwrk.async_patch(dest_server, 'api_1_0.transferresource',
@@ -4,6 +4,7 @@ Utility function and classes for dimensigon
 """
 import copy
 import typing as t
+from collections import deque
 
 
 class DAGError(Exception):
@@ -66,6 +67,7 @@ class DAG(t.Generic[T]):
         self._nodes = []
         self._pred = {}
         self._succ = {}
+        self._topology_cache = None
         if edges_for_adding:
             self.add_edges_from(edges_for_adding)
 
@@ -75,10 +77,7 @@ class DAG(t.Generic[T]):
 
     @property
     def ordered_nodes(self) -> t.List[T]:
-        nodes = []
-        for l in range(1, self.depth + 1):
-            nodes.extend(self.get_nodes_at_level(l))
-        return nodes
+        return [n for nodes in self._topology()[1] for n in nodes]
 
     @property
     def pred(self) -> t.Dict[T, t.List[T]]:
@@ -117,7 +116,7 @@ class DAG(t.Generic[T]):
         True
         """
         try:
-            return n in self._nodes
+            return n in self._succ
         except TypeError:
             return False
 
@@ -174,10 +173,11 @@ class DAG(t.Generic[T]):
         >>> G.nodes
         [1]
         """
-        if node_for_adding not in self._nodes:
+        if node_for_adding not in self._succ:
             self._succ[node_for_adding] = []
             self._pred[node_for_adding] = []
             self._nodes.append(node_for_adding)
+            self._topology_cache = None
 
     def add_nodes_from(self, nodes_for_adding: t.List[T]):
         for n in nodes_for_adding:
@@ -219,6 +219,7 @@ class DAG(t.Generic[T]):
         self._nodes.remove(n)
         del self._pred[n]
         del self._succ[n]
+        self._topology_cache = None
 
     def remove_nodes_from(self, nodes: t.Iterable[T]):
         """Remove multiple nodes.
@@ -281,17 +282,12 @@ class DAG(t.Generic[T]):
 
         u, v = u_of_edge, v_of_edge
         # add nodes
-        if not u in self._nodes:
-            self._nodes.append(u)
-            self._succ[u] = []
-            self._pred[u] = []
-        if not v in self._nodes:
-            self._nodes.append(v)
-            self._succ[v] = []
-            self._pred[v] = []
+        self.add_node(u)
+        self.add_node(v)
         if v not in self._succ[u]:
             self._succ[u].append(v)
             self._pred[v].append(u)
+            self._topology_cache = None
 
     def add_edges_from(self, ebunch_to_add):
         """Add all the edges in ebunch_to_add.
@@ -356,6 +352,7 @@ class DAG(t.Generic[T]):
             self._pred[v].remove(u)
         except KeyError:
             raise DAGError("The edge %s-%s not in graph." % (u, v))
+        self._topology_cache = None
 
     def remove_edges_from(self, ebunch):
         """Remove all edges specified in ebunch.
@@ -385,6 +382,7 @@ class DAG(t.Generic[T]):
             if u in self._succ and v in self._succ[u]:
                 self._succ[u].remove(v)
                 self._pred[v].remove(u)
+                self._topology_cache = None
 
     def level(self, node):
         """The level of a node is one greater than the level of its parent.
@@ -409,14 +407,36 @@ class DAG(t.Generic[T]):
         int:
             level of corresponding node
         """
-        if len(self._pred[node]) == 0:
-            return 1
-        else:
-            levels = [self.level(s) for s in self._pred[node]]
-            if levels:
-                return max(levels) + 1
-            else:
-                return 1
+        levels, _ = self._topology()
+        if node not in levels:
+            if node in self._succ:
+                raise DAGError("The node %s is part of a cycle." % (node,))
+            raise KeyError(node)
+        return levels[node]
+
+    def _topology(self) -> t.Tuple[t.Dict[T, int], t.List[t.List[T]]]:
+        """Levels of the nodes and nodes grouped by level, computed with Kahn's algorithm.
+
+        Result is cached until the graph is modified. Nodes that are part of a cycle (or depend on one) get no level.
+        """
+        if self._topology_cache is None:
+            pending = {n: len(self._pred[n]) for n in self._nodes}
+            levels = {n: 1 for n, c in pending.items() if c == 0}
+            queue = deque(levels)
+            while queue:
+                n = queue.popleft()
+                for s in self._succ[n]:
+                    levels[s] = max(levels.get(s, 0), levels[n] + 1)
+                    pending[s] -= 1
+                    if pending[s] == 0:
+                        queue.append(s)
+            levels = {n: l for n, l in levels.items() if pending[n] == 0}
+            by_level = [[] for _ in range(max(levels.values(), default=0))]
+            for n in self._nodes:
+                if n in levels:
+                    by_level[levels[n] - 1].append(n)
+            self._topology_cache = (levels, by_level)
+        return self._topology_cache
 
     # def get_nodes_at_level(self, level, step=None, nodes=None, visited_nodes=None):
     #     """Returns a list with a nodes at level
@@ -456,50 +476,6 @@ class DAG(t.Generic[T]):
     #                     self._get_steps_at_height(height, s, nodes, visited_nodes)
     #                     visited_nodes.append(s)
 
-    def _is_cyclic_util(self, v, visited, rec_stack):
-        """Depth First Traversal can be used to detect a cycle in a Graph.
-        DFS for a connected graph produces a tree. There is a cycle in a graph only if there is
-        a back edge present in the graph. A back edge is an edge that is from a node to
-        itself (self-loop) or one of its ancestor in the tree produced by DFS.
-
-        To detect a back edge, we can keep track of vertices currently in recursion stack of
-        function for DFS traversal. If we reach a vertex that is already in the recursion stack,
-        then there is a cycle in the tree. The edge that connects current vertex to the vertex in
-        the recursion stack is a back edge. We have used recStack[] array to keep track of vertices
-        in the recursion stack.
-
-        Parameters
-        ----------
-        v: vertex to make the DFS
-        visited: dict with all nodes. A nodes visited has true inside
-        rec_stack: to keep track of vertices in the recursion stack
-
-        Reference
-        ---------
-        https://www.geeksforgeeks.org/detect-cycle-in-a-graph/
-        """
-
-        # Mark current node as visited and
-        # adds to recursion stack
-        visited[v] = True
-        rec_stack[v] = True
-
-        # Recur for all neighbours
-        # if any neighbour is visited and in
-        # recStack then graph is cyclic
-        for neighbour in self._succ[v]:
-            if not visited[neighbour]:
-                if self._is_cyclic_util(neighbour, visited, rec_stack):
-                    return True
-            elif rec_stack[neighbour]:
-                return True
-
-        # The node needs to be poped from
-        # recursion stack before function ends
-        rec_stack[v] = False
-        return False
-
-    # Returns true if graph is cyclic else false
     def is_cyclic(self):
         """
         Given a directed graph, check whether the graph contains a cycle or not.
@@ -510,13 +486,7 @@ class DAG(t.Generic[T]):
         boolean
 
         """
-        visited = {n: False for n in self._nodes}
-        rec_stack = {n: False for n in self._nodes}
-        for node in self._nodes:
-            if visited[node] == False:
-                if self._is_cyclic_util(node, visited, rec_stack):
-                    return True
-        return False
+        return len(self._topology()[0]) < len(self._nodes)
 
     def to_dict_of_lists(self):
         """Converts the tree into a dict of lists containing every node and its successors
@@ -552,11 +522,14 @@ class DAG(t.Generic[T]):
         -------
 
         """
-        return [n for n in self if self.level(n) == level]
+        by_level = self._topology()[1]
+        return list(by_level[level - 1]) if 0 < level <= len(by_level) else []
 
     @property
     def depth(self):
-        return max([self.level(n) for n in self])
+        if self.is_cyclic():
+            raise DAGError("Graph contains a cycle.")
+        return len(self._topology()[1])
 
     def copy(self) -> 'DAG':
         """
@@ -25,14 +25,19 @@ from __future__ import print_function
 
 import glob
 import gzip
+import logging
 import os
 import sys
+import time
 import typing as t
 from os import fstat, stat
 from os.path import exists, getsize
 
+from dimensigon import defaults
 from dimensigon.utils.mixins import LoggerMixin
 
+_logger = logging.getLogger('dm.pygtail')
+
 PY3 = sys.version_info[0] == 3
 MAX_LINE_SIZE = 250 * 1024 * 1024
 
@@ -357,3 +362,164 @@ class Pygtail(LoggerMixin):
             raise StopIteration
         self._since_update += 1
         return line
+
+
+class BlockTail:
+    """
+    Binary tailer reading the file in blocks.
+
+    Data is read with os.read in blocks of up to block_size bytes and only up to the last new line, so lines are not
+    split between blocks unless a line is longer than block_size. fetch returns the same block until commit is called,
+    so a block can be sent again if it could not be delivered.
+
+    Inode and offset are kept in memory and written to offset_file (same format as Pygtail) every checkpoint_period
+    seconds, on checkpoint and on close. After a restart, data committed after the last checkpoint is read again.
+
+    Rotation: the tailed file is kept open, so when the file is renamed and recreated the rest of the old file is read
+    before continuing with the new one. When the offset file points to another inode (rotated while not running), the
+    rotated file is searched by inode in the folder of the log. A file smaller than the offset is considered truncated
+    (copytruncate) and is read from the beginning.
+
+    Parameters
+    ----------
+    offset_file:
+       File to which offset data is written (default: <logfile>.offset).
+    read_from_end:
+        starts reading the file from the end discarding initial content if there is no offset file
+    """
+
+    def __init__(self, file, offset_file=None, block_size: int = None, checkpoint_period: float = None,
+                 read_from_end=False, new_line=b'\n'):
+        self.file = file
+        self.block_size = block_size or defaults.LOG_BLOCK_SIZE
+        self.checkpoint_period = defaults.LOG_CHECKPOINT_PERIOD if checkpoint_period is None else checkpoint_period
+        self.new_line = new_line
+        self.pending = False  # data left in the file after the last block fetched
+        self._offset_file = offset_file or "%s.offset" % self.file
+        self._fd = None
+        self._inode = None
+        self._offset = 0
+        self._block = None
+        self._checkpointed = (None, None)
+        self._last_checkpoint = time.monotonic()
+
+        inode, offset = None, 0
+        if exists(self._offset_file) and getsize(self._offset_file):
+            with open(self._offset_file, "r") as offset_fh:
+                inode, offset = [int(line.strip()) for line in offset_fh]
+            self._checkpointed = (inode, offset)
+        if inode is not None and exists(self.file) and self._file_id(stat(self.file)) != inode:
+            rotated = self._find_inode(inode)
+            if rotated:
+                self._open(rotated, offset)
+            else:
+                _logger.warning(f"Unable to find rotated file of {self.file}. Reading from the beginning")
+        elif inode is not None:
+            self._open(self.file, offset)
+        elif read_from_end and exists(self.file):
+            self._open(self.file, getsize(self.file))
+
+    @staticmethod
+    def _file_id(data: os.stat_result):
+        return data.st_ino or data.st_ctime_ns
+
+    def _find_inode(self, inode) -> t.Optional[str]:
+        file_dir, rel_filename = os.path.split(self.file)
+        try:
+            with os.scandir(file_dir or '.') as it:
+                for entry in it:
+                    if entry.name.startswith(rel_filename) and entry.name != rel_filename and entry.is_file() \
+                            and self._file_id(entry.stat()) == inode:
+                        return entry.path
+        except FileNotFoundError:
+            pass
+        return None
+
+    def _open(self, file, offset=0):
+        self._close_fd()
+        try:
+            self._fd = os.open(file, os.O_RDONLY)
+        except FileNotFoundError:
+            self._fd, self._inode, self._offset = None, None, 0
+            return
+        self._inode = self._file_id(os.fstat(self._fd))
+        self._offset = offset
+
+    def _close_fd(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _rotated(self) -> bool:
+        """returns True if file has been replaced by a new one"""
+        try:
+            return self._file_id(stat(self.file)) != self._inode
+        except FileNotFoundError:
+            return False
+
+    def fetch(self) -> bytes:
+        """returns the next block of data. Returns the same block until commit is called"""
+        if self._block is not None:
+            return self._block[0]
+        if self._fd is None:
+            self._open(self.file)
+            if self._fd is None:
+                return b''
+
+        if os.fstat(self._fd).st_size < self._offset:
+            _logger.info(f"File {self.file} truncated. Reading from the beginning")
+            self._offset = 0
+        os.lseek(self._fd, self._offset, os.SEEK_SET)
+        data = os.read(self._fd, self.block_size)
+        rotated = len(data) < self.block_size and self._rotated()
+        if rotated and not data:
+            # old file already read
+            self._open(self.file)
+            return self.fetch()
+        end = len(data)
+        if not rotated and data and not data.endswith(self.new_line):
+            # keep the last partial line until it is complete
+            last = data.rfind(self.new_line)
+            if last != -1:
+                end = last + len(self.new_line)
+            elif len(data) < self.block_size:
+                end = 0
+        self.pending = len(data) == self.block_size or rotated
+        if end:
+            self._block = (data[:end], rotated)
+        return data[:end]
+
+    def commit(self):
+        """marks the last block fetched as read"""
+        if self._block is None:
+            return
+        data, rotated = self._block
+        self._block = None
+        if rotated:
+            # continue with the new file once the old one is fully read
+            self._open(self.file)
+        else:
+            self._offset += len(data)
+        if time.monotonic() - self._last_checkpoint >= self.checkpoint_period:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """writes the offset file"""
+        self._last_checkpoint = time.monotonic()
+        if self._inode is None or self._checkpointed == (self._inode, self._offset):
+            return
+        tmp = self._offset_file + '.tmp'
+        with open(tmp, "w") as fh:
+            fh.write("%s\n%s\n" % (self._inode, self._offset))
+        os.replace(tmp, self._offset_file)
+        self._checkpointed = (self._inode, self._offset)
+
+    def close(self):
+        self.checkpoint()
+        self._close_fd()
+
+    def __del__(self):
+        try:
+            self._close_fd()
+        except Exception:
+            pass
@@ -0,0 +1,151 @@
+import logging
+import math
+import os
+import threading
+import time
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+
+from dimensigon import defaults
+
+logger = logging.getLogger('dm.timer')
+
+
+class Timer:
+    """Handle of a function scheduled on a :class:`TimerWheel`. Same interface as :class:`threading.Timer`"""
+    __slots__ = ('function', 'args', 'kwargs', 'tick', '_wheel')
+
+    def __init__(self, wheel: 'TimerWheel', tick: int, function: t.Callable, args=None, kwargs=None):
+        self._wheel = wheel
+        self.tick = tick
+        self.function = function
+        self.args = args if args is not None else []
+        self.kwargs = kwargs if kwargs is not None else {}
+
+    def cancel(self):
+        """stops the timer if it has not fired yet"""
+        self._wheel.cancel(self)
+
+    def run(self):
+        try:
+            self.function(*self.args, **self.kwargs)
+        except Exception:
+            logger.exception(f"Error running timer function {getattr(self.function, '__name__', self.function)}")
+
+
+class TimerWheel:
+    """Process wide scheduler of deadlines.
+
+    Timers are hashed into `slots` buckets by the tick they expire in, so scheduling and cancelling a timer are O(1)
+    regardless of the number of pending timers. A single thread advances the wheel every `tick` seconds and only
+    visits the bucket of the current tick. Timers further than a full rotation stay in their bucket until their tick
+    comes. Expired functions run in a pool of up to `max_workers` threads, so a slow function does not delay other
+    deadlines. Timers fire with a resolution of `tick` seconds and never before their delay.
+
+    The thread is started on the first schedule and sleeps while there are no pending timers. Wheel is fork-safe: a
+    child process never fires the timers scheduled by its parent.
+    """
+
+    def __init__(self, tick: float = defaults.TIMER_WHEEL_TICK, slots: int = defaults.TIMER_WHEEL_SLOTS,
+                 max_workers: int = defaults.TIMER_WHEEL_WORKERS):
+        self.tick = tick
+        self.slots = slots
+        self.max_workers = max_workers
+        self._reset()
+
+    def _reset(self):
+        if getattr(self, '_stopped', None):
+            self._stopped.set()
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._buckets: t.List[t.Dict[Timer, None]] = [dict() for _ in range(self.slots)]
+        self._start = time.monotonic()
+        self._ticks = 0  # ticks already processed
+        self._count = 0  # pending timers
+        self._thread = None
+        self._stopped = None  # event stopping the current thread
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            # forked process. Parent thread and timers do not exist anymore
+            self._reset()
+
+    def schedule(self, delay: float, function: t.Callable, args=None, kwargs=None) -> Timer:
+        """runs function(*args, **kwargs) after delay seconds"""
+        self._check_pid()
+        with self._lock:
+            now = time.monotonic()
+            if self._count == 0:
+                # idle wheel. Skip the ticks elapsed while sleeping
+                self._ticks = max(self._ticks, int((now - self._start) / self.tick))
+            tick = max(self._ticks + 1, math.ceil((now + max(delay, 0) - self._start) / self.tick))
+            timer = Timer(self, tick, function, args, kwargs)
+            self._buckets[tick % self.slots][timer] = None
+            self._count += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = threading.Event()
+                executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='TimerWheel')
+                self._thread = threading.Thread(target=self._run, args=(self._stopped, executor), name='TimerWheel',
+                                                daemon=True)
+                self._thread.start()
+            elif self._count == 1:
+                self._wakeup.notify()
+        return timer
+
+    def cancel(self, timer: Timer):
+        self._check_pid()
+        with self._lock:
+            bucket = self._buckets[timer.tick % self.slots]
+            if timer in bucket:
+                del bucket[timer]
+                self._count -= 1
+
+    def stop(self):
+        """cancels pending timers and stops the thread. Wheel starts again on next schedule"""
+        with self._lock:
+            for bucket in self._buckets:
+                bucket.clear()
+            self._count = 0
+            if self._stopped:
+                self._stopped.set()
+            self._thread = None
+            self._wakeup.notify_all()
+
+    def __len__(self):
+        return self._count
+
+    def _next_expired(self, stopped: threading.Event) -> t.Optional[t.List[Timer]]:
+        wakeup = self._wakeup
+        with wakeup:
+            while True:
+                if stopped.is_set():
+                    return None
+                if self._count:
+                    wait = self._start + (self._ticks + 1) * self.tick - time.monotonic()
+                    if wait <= 0:
+                        break
+                    wakeup.wait(wait)
+                else:
+                    wakeup.wait()
+            self._ticks += 1
+            bucket = self._buckets[self._ticks % self.slots]
+            expired = [timer for timer in bucket if timer.tick <= self._ticks]
+            for timer in expired:
+                del bucket[timer]
+            self._count -= len(expired)
+            return expired
+
+    def _run(self, stopped: threading.Event, executor: ThreadPoolExecutor):
+        try:
+            while True:
+                expired = self._next_expired(stopped)
+                if expired is None:
+                    break
+                for timer in expired:
+                    executor.submit(timer.run)
+        finally:
+            executor.shutdown(wait=False)
+
+
+timer_wheel = TimerWheel()
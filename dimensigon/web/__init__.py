@@ -7,8 +7,9 @@ from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import MetaData
 from sqlalchemy.pool import StaticPool
 
+from dimensigon import defaults
 from dimensigon.utils.event_handler import EventHandler
-from dimensigon.web import errors, threading
+from dimensigon.web import errors, threading, url_builder
 from dimensigon.web.config import config_by_name
 from .extensions.flask_executor.executor import Executor
 from .helpers import BaseQueryJSON, run_in_background, get_root_auth
@@ -33,6 +34,20 @@ jwt = JWTManager()
 executor = Executor()
 
 
+class LivenessMiddleware:
+    """answers liveness probes without going through the application (routing, request hooks and database)"""
+
+    def __init__(self, wsgi_app, path: str = defaults.LIVENESS_PATH):
+        self.wsgi_app = wsgi_app
+        self.path = path
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO') == self.path and environ.get('REQUEST_METHOD') in ('GET', 'HEAD'):
+            start_response('200 OK', [('Content-Type', 'text/plain'), ('Content-Length', '2')])
+            return [b'OK']
+        return self.wsgi_app(environ, start_response)
+
+
 class DimensigonFlask(Flask):
     dm: t.ClassVar['Dimensigon'] = None
 
@@ -146,6 +161,7 @@ def _initialize_errorhandlers(app):
 
 def create_app(config_name):
     app = DimensigonFlask('dm')
+    app.wsgi_app = LivenessMiddleware(app.wsgi_app)
     if isinstance(config_name, t.Mapping):
         app.config.from_mapping(config_name)
     elif config_name in config_by_name:
@@ -181,6 +197,7 @@ def create_app(config_name):
     # app.before_first_request(app.file_sync.start)
     _initialize_blueprint(app)
     _initialize_errorhandlers(app)
+    url_builder.init_app(app)
 
     return app
 
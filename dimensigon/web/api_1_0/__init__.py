@@ -49,6 +49,8 @@ api.add_resource(StepExecutionResource, '/step_executions/<execution_id>')
 
 api.add_resource(TransferList, '/transfers')
 api.add_resource(TransferResource, '/transfers/<transfer_id>')
+api.add_resource(TransferChunkList, '/transfers/<transfer_id>/chunks')
+api.add_resource(TransferChunkResource, '/transfers/<transfer_id>/chunks/<int:chunk>')
 
 api.add_resource(UserList, '/users')
 api.add_resource(UserResource, '/users/<user_id>')
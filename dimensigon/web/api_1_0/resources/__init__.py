@@ -11,6 +11,6 @@ from .software import SoftwareList, SoftwareResource, SoftwareServersResource
 from .step import StepList, StepResource
 from .step_children import StepRelationshipChildren
 from .step_parents import StepRelationshipParents
-from .transfer import TransferList, TransferResource
+from .transfer import TransferList, TransferResource, TransferChunkResource, TransferChunkList
 from .user import UserList, UserResource
 from .vault import VaultList, VaultResource
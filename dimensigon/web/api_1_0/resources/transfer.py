@@ -1,6 +1,11 @@
 import base64
+import fcntl
+import hashlib
+import io
 import os
 import re
+import shutil
+from contextlib import contextmanager
 
 from flask import request, current_app
 from flask_jwt_extended import jwt_required
@@ -38,8 +43,12 @@ class TransferList(Resource):
         if 'software_id' in json_data:
             soft = Software.query.get_or_raise(json_data['software_id'])
             dest_path = json_data.get('dest_path', current_app.dm.config.path(defaults.SOFTWARE_REPO))
-            pending = Transfer.query.filter_by(software=soft,
-                                               dest_path=dest_path).filter(
+            query = Transfer.query.filter_by(software=soft, dest_path=dest_path)
+            if json_data.get('resume', False):
+                trans = _resumable(query, json_data, size=soft.size, checksum=soft.checksum)
+                if trans:
+                    return {'id': str(trans.id)}, 202
+            pending = query.filter(
                 or_(Transfer.status == TransferStatus.WAITING_CHUNKS,
                     Transfer.status == TransferStatus.IN_PROGRESS)).all()
 
@@ -51,8 +60,12 @@ class TransferList(Resource):
                     trans.ended_on = get_now()
         else:
             dest_path = json_data['dest_path']
-            pending = Transfer.query.filter_by(_filename=json_data['filename'],
-                                               dest_path=dest_path).filter(
+            query = Transfer.query.filter_by(_filename=json_data['filename'], dest_path=dest_path)
+            if json_data.get('resume', False):
+                trans = _resumable(query, json_data, size=json_data['size'], checksum=json_data['checksum'])
+                if trans:
+                    return {'id': str(trans.id)}, 202
+            pending = query.filter(
                 or_(Transfer.status == TransferStatus.WAITING_CHUNKS,
                     Transfer.status == TransferStatus.IN_PROGRESS)).all()
 
@@ -81,7 +94,7 @@ class TransferList(Resource):
         # remove chunk files if exist
         for dirpath, dirnames, filenames in os.walk(dest_path):
             for f in filenames:
-                if re.search(rf"^{os.path.basename(file)}_chunk\.(\d+)$", f):
+                if re.search(rf"^{re.escape(os.path.basename(file))}(_chunk\.(\d+)|\.part)$", f):
                     current_app.logger.debug(f'removing chunk file {os.path.join(dest_path, f)}')
                     try:
                         os.remove(os.path.join(dirpath, f))
@@ -91,22 +104,174 @@ class TransferList(Resource):
 
         if soft:
             t = Transfer(software=soft, dest_path=dest_path,
-                         num_chunks=json_data['num_chunks'])
+                         num_chunks=json_data['num_chunks'], chunk_size=json_data.get('chunk_size'))
         else:
             t = Transfer(software=json_data['filename'], dest_path=dest_path, num_chunks=json_data['num_chunks'],
-                         size=json_data['size'], checksum=json_data['checksum'])
+                         size=json_data['size'], checksum=json_data['checksum'],
+                         chunk_size=json_data.get('chunk_size'))
 
         try:
             os.makedirs(t.dest_path, exist_ok=True)
         except Exception as e:
             raise errors.FolderCreationError(t.dest_path, e)
 
+        if _in_place(t):
+            with open(_partial_file(t), 'wb') as fd:
+                _preallocate(fd, t.size)
+
         db.session.add(t)
         db.session.commit()
         return {'id': str(t.id)}, 202
 
 
-CHUNK_READ_BUFFER = d.CHUNK_SIZE
+def _resumable(query, json_data, size: int, checksum: str):
+    """returns a pending transfer of the same file with the same chunks, if any, ready to receive the missing ones"""
+    for trans in query.filter(Transfer.status.in_([TransferStatus.WAITING_CHUNKS, TransferStatus.IN_PROGRESS,
+                                                   TransferStatus.TRANSFER_ERROR])) \
+            .order_by(Transfer.created_on.desc()).all():
+        if trans.num_chunks != json_data['num_chunks'] or trans.chunk_size != json_data.get('chunk_size') \
+                or trans.size != size or trans.checksum != checksum:
+            continue
+        if _in_place(trans) and not os.path.exists(_partial_file(trans)):
+            continue
+        if trans.status == TransferStatus.TRANSFER_ERROR:
+            trans.status = TransferStatus.IN_PROGRESS
+            trans.ended_on = None
+            db.session.commit()
+        current_app.logger.debug(f"Resuming transfer {trans.id}. {trans.received_chunks} of {trans.num_chunks} "
+                                 f"chunks already received")
+        return trans
+
+
+CHUNK_READ_BUFFER = d.TRANSFER_BUFFER_SIZE
+
+
+@contextmanager
+def _chunks_lock(trans: Transfer):
+    """serializes the read-modify-write of the chunks received by a transfer.
+
+    Chunks of a transfer may reach different worker processes, so the lock is a flock on the destination folder.
+    Every call opens its own descriptor, so threads of the same process are serialized too.
+    """
+    fd = os.open(trans.dest_path, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # closing the descriptor releases the lock
+        os.close(fd)
+
+
+def _in_place(trans: Transfer) -> bool:
+    # chunks are written at their offset into a preallocated file instead of into separate chunk files
+    return trans.chunk_size is not None and trans.num_chunks > 1
+
+
+def _partial_file(trans: Transfer) -> str:
+    return os.path.join(trans.dest_path, f'{trans.filename}.part')
+
+
+def _preallocate(fd, size: int):
+    """reserves size bytes on disk for the file. Falls back to a sparse file if fallocate is not available"""
+    fd.truncate(size)
+    if size and hasattr(os, 'posix_fallocate') and isinstance(fd, io.BufferedIOBase):
+        try:
+            os.posix_fallocate(fd.fileno(), 0, size)
+        except OSError:
+            pass
+
+
+def _start_transfer(trans: Transfer):
+    if trans.status == TransferStatus.WAITING_CHUNKS:
+        trans.started_on = get_now()
+        trans.status = TransferStatus.IN_PROGRESS
+        db.session.commit()
+    elif trans.status != TransferStatus.IN_PROGRESS:
+        raise errors.TransferNotInValidState(str(trans.id), trans.status.name)
+
+
+def _chunk_file(trans: Transfer, chunk_id: int) -> str:
+    if trans.num_chunks == 1:
+        return os.path.join(trans.dest_path, f'{trans.filename}')
+    else:
+        return os.path.join(trans.dest_path, f'{trans.filename}_chunk.{chunk_id}')
+
+
+def _write_chunk(trans: Transfer, chunk_id: int, stream, checksum: str = None, length: int = None):
+    """writes the chunk read from stream into disk.
+
+    When the transfer is written in place, the chunk is written at its offset in the partial file and its md5 digest,
+    computed while writing, is compared against the checksum sent. Verified digests are kept in the transfer so the
+    final file does not need to be read again.
+    """
+    if _in_place(trans):
+        if chunk_id >= trans.num_chunks:
+            raise errors.TransferChunkError(str(trans.id), chunk_id, f"out of range. Transfer has {trans.num_chunks} "
+                                                                     f"chunks")
+        file = _partial_file(trans)
+        offset = chunk_id * trans.chunk_size
+        expected = min(trans.chunk_size, trans.size - offset)
+        mode = 'r+b'
+    else:
+        file = _chunk_file(trans, chunk_id)
+        offset = 0
+        expected = None
+        mode = 'wb'
+
+    h = hashlib.md5()
+    written = 0
+    with open(file, mode) as fd:
+        fd.seek(offset)
+        while True:
+            data = stream.read(CHUNK_READ_BUFFER)
+            if not data:
+                break
+            if expected is not None and written + len(data) > expected:
+                raise errors.TransferChunkError(str(trans.id), chunk_id, f"chunk bigger than {expected} bytes")
+            fd.write(data)
+            h.update(data)
+            written += len(data)
+
+    if length is not None and written != length:
+        reason = f"incomplete. Received {written} of {length} bytes"
+    elif expected is not None and written != expected:
+        reason = f"incomplete. Received {written} of {expected} bytes"
+    elif checksum and checksum != h.hexdigest():
+        reason = "checksum error"
+    else:
+        reason = None
+    if reason:
+        if expected is None:
+            os.remove(file)
+        raise errors.TransferChunkError(str(trans.id), chunk_id, reason)
+
+    with _chunks_lock(trans):
+        db.session.refresh(trans)
+        trans.set_chunk_received(chunk_id)
+        if _in_place(trans):
+            trans.chunk_checksums = dict(trans.chunk_checksums or {}, **{str(chunk_id): checksum or None})
+        db.session.commit()
+
+
+def _chunk_received(trans: Transfer, chunk_id: int):
+    if trans.num_chunks == 1:
+        msg = f"File {trans.filename} from transfer {trans.id} generated successfully"
+        trans.status = TransferStatus.COMPLETED
+        trans.ended_on = get_now()
+        db.session.commit()
+    else:
+        msg = f"Chunk {chunk_id} from transfer {trans.id} generated successfully"
+
+    current_app.logger.debug(msg)
+    return {'message': msg}, 201
+
+
+def _transfer_error(trans: Transfer, status: Status, msg: str):
+    trans.status = status
+    trans.ended_on = get_now()
+    db.session.commit()
+    current_app.logger.error(msg)
+    return {"error": msg}, 404
 
 
 class TransferResource(Resource):
@@ -136,32 +301,12 @@ class TransferResource(Resource):
         """Generates the chunk into disk"""
         data = request.get_json()
         trans: Transfer = Transfer.query.get_or_raise(transfer_id)
-        if trans.status == TransferStatus.WAITING_CHUNKS:
-            trans.started_on = get_now()
-            trans.status = TransferStatus.IN_PROGRESS
-            db.session.commit()
-        elif trans.status != TransferStatus.IN_PROGRESS:
-            raise errors.TransferNotInValidState(transfer_id, trans.status.name)
+        _start_transfer(trans)
 
-        chunk = data.get('content')
         chunk_id = data.get('chunk')
-        if trans.num_chunks == 1:
-            file = os.path.join(trans.dest_path, f'{trans.filename}')
-        else:
-            file = os.path.join(trans.dest_path, f'{trans.filename}_chunk.{chunk_id}')
-        with open(file, 'wb') as fd:
-            raw = base64.b64decode(chunk.encode('ascii'))
-            fd.write(raw)
-        if trans.num_chunks == 1:
-            msg = f"File {trans.filename} from transfer {transfer_id} generated successfully"
-            trans.status = TransferStatus.COMPLETED
-            trans.ended_on = get_now()
-            db.session.commit()
-        else:
-            msg = f"Chunk {chunk_id} from transfer {transfer_id} generated successfully"
-
-        current_app.logger.debug(msg)
-        return {'message': msg}, 201
+        raw = base64.b64decode(data.get('content').encode('ascii'))
+        _write_chunk(trans, chunk_id, io.BytesIO(raw), data.get('checksum'))
+        return _chunk_received(trans, chunk_id)
 
     @forward_or_dispatch()
     @jwt_required()
@@ -175,55 +320,61 @@ class TransferResource(Resource):
             return {'error': 'Transfer still waiting for chunks'}, 406
         current_app.logger.debug(
             f"Generating file {os.path.join(trans.dest_path, trans.filename)} from transfer {trans.id}")
-        chunk_pattern = re.compile(rf"^{trans.filename}_chunk\.(\d+)$")
         file = os.path.join(trans.dest_path, trans.filename)
 
-        try:
-            files, chunks_ids = zip(*sorted(
-                [(f, int(chunk_pattern.match(f).groups()[0])) for f in os.listdir(trans.dest_path) if
-                 os.path.isfile(os.path.join(trans.dest_path, f)) and chunk_pattern.match(f)],
-                key=lambda x: x[1]))
-        except:
-            files, chunks_ids = [], []
-
-        if len(files) != trans.num_chunks or sum(chunks_ids) != (trans.num_chunks - 1) * trans.num_chunks / 2:
-            if len(files) == 0:
-                msg = f"Any chunk found on {trans.dest_path}"
-            else:
-                msg = f"Not enough chunks to generate the file"
-            current_app.logger.error(msg)
-            return {"error": msg}, 404
-        with open(file, 'wb') as outfile:
-            for fname in files:
-                f = os.path.join(trans.dest_path, fname)
-                with open(f, 'rb') as infile:
-                    while True:
-                        c = infile.read(CHUNK_READ_BUFFER)
-                        if not c:
-                            break
-                        outfile.write(c)
-                try:
-                    os.remove(f)
-                except Exception as e:
-                    current_app.logger.warning(f"Unable to remove chunk file {f}. Exception: {e}")
-        # check final file length and checksum
-        if os.path.getsize(file) != trans.size:
-            trans.status = TransferStatus.SIZE_ERROR
-            trans.ended_on = get_now()
-            db.session.commit()
-            # os.remove(file)
-            msg = f"Error on transfer '{transfer_id}': Final file size does not match expected size"
-            current_app.logger.error(msg)
-            return {"error": msg}, 404
-
-        if md5(file) != trans.checksum:
-            trans.status = TransferStatus.CHECKSUM_ERROR
-            trans.ended_on = get_now()
-            db.session.commit()
-            # os.remove(file)
-            msg = f"Error on transfer '{transfer_id}': Checksum error"
-            current_app.logger.error(msg)
-            return {"error": msg}, 404
+        if _in_place(trans):
+            if trans.received_chunks != trans.num_chunks:
+                if trans.received_chunks == 0:
+                    msg = f"Any chunk found on {trans.dest_path}"
+                else:
+                    msg = f"Not enough chunks to generate the file"
+                current_app.logger.error(msg)
+                return {"error": msg}, 404
+            partial_file = _partial_file(trans)
+            if os.path.getsize(partial_file) != trans.size:
+                return _transfer_error(trans, TransferStatus.SIZE_ERROR,
+                                       f"Error on transfer '{transfer_id}': Final file size does not match expected "
+                                       f"size")
+            # every chunk checksum was verified while writing it. Check the whole file only if any was not sent
+            if not all((trans.chunk_checksums or {}).values()) and md5(partial_file) != trans.checksum:
+                return _transfer_error(trans, TransferStatus.CHECKSUM_ERROR,
+                                       f"Error on transfer '{transfer_id}': Checksum error")
+            os.replace(partial_file, file)
+        else:
+            chunk_pattern = re.compile(rf"^{re.escape(trans.filename)}_chunk\.(\d+)$")
+            try:
+                files, chunks_ids = zip(*sorted(
+                    [(f, int(chunk_pattern.match(f).groups()[0])) for f in os.listdir(trans.dest_path) if
+                     os.path.isfile(os.path.join(trans.dest_path, f)) and chunk_pattern.match(f)],
+                    key=lambda x: x[1]))
+            except:
+                files, chunks_ids = [], []
+
+            if len(files) != trans.num_chunks or sum(chunks_ids) != (trans.num_chunks - 1) * trans.num_chunks / 2:
+                if len(files) == 0:
+                    msg = f"Any chunk found on {trans.dest_path}"
+                else:
+                    msg = f"Not enough chunks to generate the file"
+                current_app.logger.error(msg)
+                return {"error": msg}, 404
+            with open(file, 'wb') as outfile:
+                for fname in files:
+                    f = os.path.join(trans.dest_path, fname)
+                    with open(f, 'rb') as infile:
+                        shutil.copyfileobj(infile, outfile, CHUNK_READ_BUFFER)
+                    try:
+                        os.remove(f)
+                    except Exception as e:
+                        current_app.logger.warning(f"Unable to remove chunk file {f}. Exception: {e}")
+            # check final file length and checksum
+            if os.path.getsize(file) != trans.size:
+                return _transfer_error(trans, TransferStatus.SIZE_ERROR,
+                                       f"Error on transfer '{transfer_id}': Final file size does not match expected "
+                                       f"size")
+
+            if md5(file) != trans.checksum:
+                return _transfer_error(trans, TransferStatus.CHECKSUM_ERROR,
+                                       f"Error on transfer '{transfer_id}': Checksum error")
 
         trans.status = TransferStatus.COMPLETED
         trans.ended_on = get_now()
@@ -231,3 +382,37 @@ class TransferResource(Resource):
         msg = f"File {os.path.join(trans.dest_path, trans.filename)} from transfer {trans.id} recived successfully"
         current_app.logger.debug(msg)
         return {"message": msg}, 201
+
+
+class TransferChunkResource(Resource):
+
+    @forward_or_dispatch()
+    @jwt_required()
+    def post(self, transfer_id, chunk):
+        """Streams a raw chunk into disk.
+
+        Body is the chunk content as application/octet-stream. It is not securized, as it travels on the already
+        authenticated and TLS protected connection, and it is written to disk while being read instead of decoded from
+        a JSON message. D-Checksum header may contain the md5 of the chunk.
+        """
+        if request.mimetype != 'application/octet-stream':
+            return {'error': 'Content Type must be application/octet-stream'}, 400
+        trans: Transfer = Transfer.query.get_or_raise(transfer_id)
+        if chunk >= trans.num_chunks:
+            raise errors.TransferChunkError(transfer_id, chunk, f"out of range. Transfer has {trans.num_chunks} chunks")
+        _start_transfer(trans)
+
+        _write_chunk(trans, chunk, request.stream, request.headers.get('D-Checksum'), request.content_length)
+        return _chunk_received(trans, chunk)
+
+
+class TransferChunkList(Resource):
+
+    @forward_or_dispatch()
+    @jwt_required()
+    @securizer
+    def get(self, transfer_id):
+        """returns the chunks received and the [start, end) ranges of the chunks still missing"""
+        trans: Transfer = Transfer.query.get_or_raise(transfer_id)
+        return {'num_chunks': trans.num_chunks, 'received': trans.received_chunks,
+                'missing': [list(r) for r in trans.missing_ranges()]}
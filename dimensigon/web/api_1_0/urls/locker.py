@@ -1,6 +1,5 @@
 import logging
 import multiprocessing as mp
-import threading
 from datetime import datetime
 
 from flask import request, current_app, g, jsonify
@@ -10,6 +9,7 @@ from sqlalchemy.exc import OperationalError
 from dimensigon import defaults
 from dimensigon.domain.entities import Catalog
 from dimensigon.domain.entities.locker import Scope, State, Locker
+from dimensigon.utils.timer_wheel import timer_wheel
 from dimensigon.web import db, errors
 from dimensigon.web.api_1_0 import api_bp
 from dimensigon.web.decorators import securizer, forward_or_dispatch, validate_schema
@@ -77,10 +77,8 @@ def locker_prevent():
             with transaction():
                 l.state = State.PREVENTING
                 l.applicant = json_data.get('applicant')
-            th = threading.Timer(defaults.TIMEOUT_PREVENTING_LOCK, revert_preventing,
+            timer_wheel.schedule(defaults.TIMEOUT_PREVENTING_LOCK, revert_preventing,
                                  (current_app._get_current_object(), l.scope, l.applicant))
-            th.daemon = True
-            th.start()
             return {json_data['scope']: 'PREVENTING'}, 200
         else:
             raise errors.PriorityLocker(l.scope)
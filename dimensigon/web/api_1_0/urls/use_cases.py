@@ -21,13 +21,16 @@ from collections import OrderedDict
 from flask import request, current_app, g
 from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token
 from pkg_resources import parse_version
+from sqlalchemy import and_, or_, inspect
 
 import dimensigon
 import dimensigon.use_cases.cluster
 import dimensigon.web.network as ntwrk
 from dimensigon import defaults as d, defaults
 from dimensigon.domain.entities import Software, Server, SoftwareServerAssociation, Catalog, Route, StepExecution, \
-    Orchestration, OrchExecution, User, ActionTemplate, ActionType, Vault
+    Orchestration, OrchExecution, User, ActionTemplate, ActionType, Vault, CatalogDigest
+from dimensigon.domain.entities.catalog import to_datemark, digested_entities
+from dimensigon.use_cases.catalog import _prefetch
 from dimensigon.use_cases.deployment import deploy_orchestration, validate_input_chain
 from dimensigon.use_cases.use_cases import async_send_file
 from dimensigon.utils import asyncio, subprocess
@@ -40,7 +43,7 @@ from dimensigon.web.api_1_0 import api_bp
 from dimensigon.web.decorators import securizer, forward_or_dispatch, validate_schema, lock_catalog, log_time
 from dimensigon.web.helpers import check_param_in_uri, normalize_hosts, search
 from dimensigon.web.json_schemas import launch_command_post, routes_post, routes_patch, \
-    launch_orchestration_post, send_post, orchestration_full, manager_server_ignore_lock_post
+    launch_orchestration_post, send_post, orchestration_full, manager_server_ignore_lock_post, catalog_digest_post
 
 if t.TYPE_CHECKING:
     from dimensigon.use_cases.operations import IOperationEncapsulation, CompletedProcess
@@ -253,16 +256,18 @@ def send():
     chunks = math.ceil(size / chunk_size)
 
     if 'software_id' in json_data:
-        json_msg = dict(software_id=str(software.id), num_chunks=chunks)
+        json_msg = dict(software_id=str(software.id), num_chunks=chunks, chunk_size=chunk_size)
         if 'dest_path' in json_data:
             json_msg['dest_path'] = json_data.get('dest_path')
     else:
         json_msg = dict(dest_path=json_data['dest_path'], filename=os.path.basename(json_data.get('file')), size=size,
-                        checksum=checksum, num_chunks=chunks)
+                        checksum=checksum, num_chunks=chunks, chunk_size=chunk_size)
     # if dest_path not set, file will be sent to
 
     if 'force' in json_data:
         json_msg['force'] = json_data['force']
+    if 'resume' in json_data:
+        json_msg['resume'] = json_data['resume']
 
     resp = ntwrk.post(dest_server, 'api_1_0.transferlist', json=json_msg)
     resp.raise_if_not_ok()
@@ -344,7 +349,31 @@ def catalog(data_mark):
         except Exception as e:
             return {'error': f'Invalid Data Mark: {e}'}, 400
 
-    return fetch_catalog(data_validated)
+    limit = request.args.get('limit', type=int)
+    if limit is None:
+        # nodes not requesting pages get the whole delta
+        return fetch_catalog(data_validated)
+    if limit < 1:
+        return {'error': 'limit must be greater than 0'}, 400
+    try:
+        cursor = CatalogCursor.decode(request.args['cursor']) if request.args.get('cursor') else None
+        data, cursor = fetch_catalog_page(data_validated, min(limit, defaults.CATALOG_MAX_PAGE_SIZE), cursor)
+    except ValueError as e:
+        return {'error': f'Invalid cursor: {e}'}, 400
+    return {'catalog': data, 'cursor': cursor.encode() if cursor else None}
+
+
+def _entity_to_json(name, e):
+    return e.to_json(password=True) if name == 'User' else e.to_json()
+
+
+def _catalog_query(obj, data_mark, now):
+    # db.session.query to bypass deleted objects to spread deleted changes
+    if data_mark:
+        query = obj.query.filter(obj.last_modified_at > data_mark)
+    else:
+        query = obj.query
+    return query.filter(obj.last_modified_at <= now)
 
 
 @log_time()
@@ -352,20 +381,104 @@ def fetch_catalog(data_mark=None):
     data = {}
     now = get_now()
     for name, obj in get_distributed_entities():
-        c = Catalog.query.get(name)
-        # db.session.query to bypass deleted objects to spread deleted changes
-        if data_mark:
-            query = obj.query.filter(obj.last_modified_at > data_mark)
-        else:
-            query = obj.query
-        repo_data = query.filter(obj.last_modified_at <= now).all()
-        if name == 'User':
-            data.update({name: [e.to_json(password=True) for e in repo_data]})
-        else:
-            data.update({name: [e.to_json() for e in repo_data]})
+        repo_data = _catalog_query(obj, data_mark, now).all()
+        data.update({name: [_entity_to_json(name, e) for e in repo_data]})
     return data
 
 
+class CatalogCursor(t.NamedTuple):
+    """position of the last entity sent in a catalog page"""
+    now: dt.datetime  # upper bound of the delta, fixed by the first page
+    entity: str
+    last_modified_at: dt.datetime
+    key: t.List  # primary key values
+
+    def encode(self) -> str:
+        data = [self.now.strftime(defaults.DATEMARK_FORMAT), self.entity,
+                self.last_modified_at.strftime(defaults.DATEMARK_FORMAT), list(self.key)]
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode('ascii')
+
+    @classmethod
+    def decode(cls, token: str) -> 'CatalogCursor':
+        try:
+            now, entity, last_modified_at, key = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+            return cls(dt.datetime.strptime(now, defaults.DATEMARK_FORMAT), entity,
+                       dt.datetime.strptime(last_modified_at, defaults.DATEMARK_FORMAT), key)
+        except (TypeError, ValueError, UnicodeError) as e:
+            raise ValueError(str(e) or 'malformed cursor') from e
+
+
+def _after(columns, values):
+    """condition selecting the rows sorted after values"""
+    if len(columns) == 1:
+        return columns[0] > values[0]
+    return or_(columns[0] > values[0], and_(columns[0] == values[0], _after(columns[1:], values[1:])))
+
+
+@log_time()
+def fetch_catalog_page(data_mark, limit: int, cursor: CatalogCursor = None) \
+        -> t.Tuple[t.Dict[str, t.List[dict]], t.Optional[CatalogCursor]]:
+    """returns up to limit entities changed after data_mark and the cursor to fetch the next page.
+
+    Entities are sent in (entity, last_modified_at, primary key) order. Every page contains all the entity names so
+    it can be applied as a catalog on its own. Cursor is None when there are no more entities.
+    """
+    entities = get_distributed_entities()
+    names = [name for name, _ in entities]
+    if cursor and cursor.entity not in names:
+        raise ValueError(f"unknown entity {cursor.entity}")
+    now = cursor.now if cursor else get_now()
+    data = {name: [] for name in names}
+    start = names.index(cursor.entity) if cursor else 0
+    remaining = limit
+    for name, obj in entities[start:]:
+        pk = list(inspect(obj).primary_key)
+        query = _catalog_query(obj, data_mark, now)
+        if cursor and name == cursor.entity:
+            if len(cursor.key) != len(pk):
+                raise ValueError(f"invalid key for entity {name}")
+            query = query.filter(_after([obj.last_modified_at] + pk, [cursor.last_modified_at] + cursor.key))
+        repo_data = query.order_by(obj.last_modified_at, *pk).limit(remaining).all()
+        data[name] = [_entity_to_json(name, e) for e in repo_data]
+        remaining -= len(repo_data)
+        if remaining == 0:
+            last = repo_data[-1]
+            return data, CatalogCursor(now, name, last.last_modified_at,
+                                       list(inspect(obj).primary_key_from_instance(last)))
+    return data, None
+
+
+@api_bp.route('/catalog/digest', methods=['GET', 'POST'])
+@forward_or_dispatch()
+@jwt_required()
+@securizer
+@validate_schema(POST=catalog_digest_post)
+def catalog_digest():
+    """compares the catalog hash tree with other node.
+
+    GET returns the root of every entity or, if entity specified, its leaves. POST receives the rows (digest key and
+    last_modified_at) of the requester in the buckets that differ and returns the rows missing or older on it
+    """
+    if request.method == 'GET':
+        entity = request.args.get('entity')
+        if entity:
+            return {'entity': entity, 'leaves': CatalogDigest.leaves(entity)}
+        return {'digest': CatalogDigest.catalog_digest(), 'roots': CatalogDigest.roots()}
+
+    data = request.get_json()
+    entities = dict(digested_entities())
+    if data['entity'] not in entities:
+        raise errors.EntityNotFound('Entity', data['entity'])
+    name, obj = data['entity'], entities[data['entity']]
+    keys = []
+    for dkey, (_, last_modified_at, key) in CatalogDigest.entity_rows(obj, buckets=set(data['buckets'])).items():
+        remote = data['rows'].get(dkey)
+        if remote is None or to_datemark(last_modified_at) > remote:
+            keys.append(key)
+    rows = _prefetch(obj, inspect(obj).primary_key, keys)
+    return {name: [_entity_to_json(name, e) for e in sorted(rows, key=lambda e: e.last_modified_at)]}
+
+
 _cluster_logger = logging.getLogger('dm.cluster')
 
 
@@ -442,6 +555,19 @@ def cluster_out(server_id):
         raise errors.UserForbiddenError
 
 
+@api_bp.route('/cluster/probe/<server_id>', methods=['GET'])
+@jwt_required()
+@securizer
+def cluster_probe(server_id):
+    user = User.get_current()
+    if user and user.name == 'root':
+        server = Server.query.get_or_raise(server_id)
+        keepalive = dimensigon.use_cases.cluster.probe(server)
+        return {'keepalive': keepalive.strftime(defaults.DATEMARK_FORMAT) if keepalive else None}, 200
+    else:
+        raise errors.UserForbiddenError
+
+
 # @api_bp.route('/routes/<server_id>', methods=['GET'])
 # @forward_or_dispatch()
 # @jwt_required()
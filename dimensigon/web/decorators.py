@@ -3,7 +3,6 @@ import functools
 import ipaddress
 import json
 import logging
-import socket
 import time
 import typing as t
 
@@ -16,6 +15,8 @@ from jsonschema import validate
 from dimensigon import defaults
 from dimensigon.domain.entities import Server, Scope, User, Locker, State, Gate
 from dimensigon.network.exceptions import NotValidMessage
+from dimensigon.network.pool import pool
+from dimensigon.network.resolver import resolver
 from dimensigon.use_cases.lock import lock_scope
 from dimensigon.utils.helpers import get_now
 from dimensigon.web import db, errors, network as ntwrk, executor, get_root_auth
@@ -36,16 +37,7 @@ def save_if_hidden_ip(remote_addr: str, server: Server):
     """
     ip = ipaddress.ip_address(remote_addr)
     if not ip.is_loopback:
-        def get_ip(dns: str):
-            if dns is None:
-                return
-            else:
-                try:
-                    return ipaddress.ip_address(socket.gethostbyname(dns))
-                except:
-                    return
-
-        gate = [gate for gate in server.gates if ip in (gate.ip, get_ip(gate.dns))]
+        gate = [gate for gate in server.gates if ip in (gate.ip, resolver.resolve(gate.dns) if gate.dns else None)]
         if not gate:
             try:
 
@@ -84,11 +76,50 @@ def save_if_hidden_ip(remote_addr: str, server: Server):
                 dm_logger.exception(f"Unable to save {remote_addr} from {server}")
 
 
+# hop-by-hop headers are not relayed. Host and Content-Length are set again for the next hop
+_HOP_HEADERS = frozenset(('connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'te', 'trailer',
+                          'transfer-encoding', 'upgrade', 'host', 'content-length'))
+
+
+class _BodyStream:
+    """Incoming body relayed to the next hop as it is read. Length is known so it is not sent chunked"""
+
+    def __init__(self, stream: t.IO[bytes], length: int):
+        self._stream = stream
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        return self._stream.read(size)
+
+    def __iter__(self):
+        return iter(lambda: self.read(defaults.PROXY_BUFFER_SIZE), b'')
+
+
+def _request_body(request: 'flask.Request') -> t.Union[bytes, _BodyStream, None]:
+    data = getattr(request, '_cached_data', None)
+    if data is not None:
+        # body already read (i.e. destination taken from content)
+        return data
+    if request.content_length:
+        return _BodyStream(request.stream, request.content_length)
+    return request.get_data() or None
+
+
 def _proxy_request(request: 'flask.Request', destination: Server, verify=False) -> requests.Response:
+    """sends the request to the next hop. Response is not read, body must be consumed with :func:`_relay_response`"""
     url = destination.url() + request.full_path
-    req_data = request.get_json()
+
+    headers = {key.lower(): value for key, value in request.headers.items() if key.lower() not in _HOP_HEADERS}
+    headers['d-source'] = headers.get('d-source', '') + ':' + str(g.server.id)
+    # response is relayed without decoding. Do not ask for an encoding the client did not accept
+    headers.setdefault('accept-encoding', 'identity')
 
     if request.path == '/ping':
+        # ping collects the servers it goes through
+        req_data = request.get_json()
         server_data = {'id': str(g.server.id), 'name': g.server.name,
                        'time': get_now().strftime(defaults.DATETIME_FORMAT)}
         if req_data:
@@ -97,26 +128,28 @@ def _proxy_request(request: 'flask.Request', destination: Server, verify=False)
             req_data['servers'].update({len(req_data['servers']) + 1: server_data})
         else:
             req_data = dict(servers={1: server_data})
-    kwargs = {
-        'json': req_data,
-        'allow_redirects': False
-    }
-
-    headers = {key.lower(): value for key, value in request.headers.items()}
+        body = json.dumps(req_data).encode()
+        headers['content-type'] = 'application/json'
+    else:
+        body = _request_body(request)
 
-    # Let requests reset the host for us.
-    if 'host' in headers:
-        del headers['host']
+    return pool.session(url).request(request.method, url, data=body, headers=headers, stream=True,
+                                     allow_redirects=False, verify=verify)
 
-    headers['d-source'] = headers.get('d-source', '') + ':' + str(g.server.id)
-
-    kwargs['headers'] = headers
 
-    cookies = request.cookies
+def _relay_response(resp: requests.Response) -> 'flask.Response':
+    """streams the response of the next hop back to the client as raw bytes"""
 
-    kwargs['cookies'] = cookies
+    def generate():
+        try:
+            yield from resp.raw.stream(defaults.PROXY_BUFFER_SIZE, decode_content=False)
+        finally:
+            resp.close()
 
-    return requests.request(request.method, url, verify=verify, **kwargs)
+    headers = [(key, value) for key, value in resp.raw.headers.iteritems()
+               if key.lower() == 'content-length' or key.lower() not in _HOP_HEADERS]
+    return current_app.response_class(generate(), status=resp.status_code, headers=headers,
+                                      direct_passthrough=True)
 
 
 def set_source():
@@ -179,7 +212,7 @@ def forward_or_dispatch(*methods):
                 except requests.exceptions.RequestException as e:
                     return errors.format_error_response(errors.ProxyForwardingError(destination, e))
                 else:
-                    return resp.content, resp.status_code, dict(resp.headers)
+                    return _relay_response(resp)
 
             else:
 
@@ -191,6 +224,15 @@ def forward_or_dispatch(*methods):
     return inner
 
 
+def _session_key_kwargs(cipher_key):
+    # answer with the same session key the peer used on its request
+    if cipher_key:
+        return dict(cipher_key=cipher_key, add_key=True)
+    else:
+        peer = request.headers.get('D-Source', '').split(':')[0]
+        return dict(peer=peer) if peer else {}
+
+
 def securizer(func):
     from flask import request
     @functools.wraps(func)
@@ -256,13 +298,13 @@ def securizer(func):
                 if securizer_method == 'plain' and current_app.config.get('SECURIZER_PLAIN', False):
                     pass
                 else:
-                    rv = ntwrk.pack_msg(data=rv)
+                    rv = ntwrk.pack_msg(data=rv, **_session_key_kwargs(cipher_key))
 
         if isinstance(rv, list):
             if securizer_method == 'plain' and current_app.config.get('SECURIZER_PLAIN', False):
                 pass
             else:
-                rv = ntwrk.pack_msg(data=rv)
+                rv = ntwrk.pack_msg(data=rv, **_session_key_kwargs(cipher_key))
 
         if rest:
             rv = (rv,) + rest
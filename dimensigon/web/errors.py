@@ -596,6 +596,18 @@ class TransferNotInValidState(TransferBase):
         return "Transfer not in a valid state"
 
 
+class TransferChunkError(TransferBase):
+    status_code = 400
+
+    def __init__(self, transfer_id: str, chunk: int, reason: str):
+        self.transfer_id = transfer_id
+        self.chunk = chunk
+        self.reason = reason
+
+    def _format_error_msg(self) -> str:
+        return f"Chunk {self.chunk} rejected: {self.reason}"
+
+
 #################
 # Common Errors #
 #################
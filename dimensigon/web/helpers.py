@@ -28,6 +28,22 @@ if t.TYPE_CHECKING:
     from dimensigon.domain.entities import Server, Scope
 
 
+_absent = threading.local()
+
+
+@contextmanager
+def absent_identities(entity, identities: t.Set[t.Tuple]):
+    """:meth:`BaseQueryJSON.get` returns None for the primary keys of entity in identities without querying the
+    database. Used by callers that already know those entities do not exist. Identities discarded from the set while
+    inside the context are queried again"""
+    previous = getattr(_absent, 'data', None)
+    _absent.data = (entity, identities)
+    try:
+        yield identities
+    finally:
+        _absent.data = previous
+
+
 class BaseQueryJSON(BaseQuery):
     """SQLAlchemy :class:`~sqlalchemy.orm.query.Query` subclass with convenience methods for querying in a web application.
 
@@ -35,6 +51,13 @@ class BaseQueryJSON(BaseQuery):
     Override the query class for an individual model by subclassing this and setting :attr:`~Model.query_class`.
     """
 
+    def get(self, ident):
+        absent = getattr(_absent, 'data', None)
+        if absent and absent[0] is self._mapper_zero().class_ \
+                and (tuple(ident) if isinstance(ident, (tuple, list)) else (ident,)) in absent[1]:
+            return None
+        return super().get(ident)
+
     def get_or_raise(self, ident, description=None):
         """Like :meth:`get` but aborts with 404 if not found instead of returning ``None``."""
 
@@ -78,6 +78,21 @@ manager_server_ignore_lock_post = {
     "additionalProperties": False
 }
 
+catalog_digest_post = {
+    "type": "object",
+    "properties": {
+        "entity": {"type": "string"},
+        "buckets": {"type": "array",
+                    "items": {"type": "integer", "minimum": 0},
+                    },
+        "rows": {"type": "object",
+                 "additionalProperties": {"type": "string"}
+                 },
+    },
+    "required": ["entity", "buckets", "rows"],
+    "additionalProperties": False
+}
+
 send_post = {
     "type": "object",
     "properties": {
@@ -95,6 +110,7 @@ send_post = {
                         "minimum": 1},
         "background": {"type": "boolean"},
         "force": {"type": "boolean"},
+        "resume": {"type": "boolean"},
         "include_transfer_data": {"type": "boolean"},
     },
     "oneOf": [{"required": ["software_id", "dest_server_id"]},
@@ -498,6 +514,9 @@ transfers_post = {
         "dest_path": {"type": "string"},  # if not specified DM_SOFTWARE_REPO is used
         "num_chunks": {"type": "integer",
                        "minimum": 0},
+        "chunk_size": {"type": "integer",
+                       "minimum": 1},  # chunks are written in place at chunk * chunk_size offset
+        "resume": {"type": "boolean"},  # continues a pending transfer of the same file sending only missing chunks
         "cancel_pending": {"type": "boolean"},  # cancels pending transfers from the same file in the same folder
         "force": {"type": "boolean"},  # forces to transfer file even if it exists in the destination
 
@@ -513,6 +532,7 @@ transfer_post = {
         "chunk": {"type": "integer",
                   "minimum": 0},
         "content": {"type": "string"},
+        "checksum": {"type": "string"},  # md5 of the chunk content
     },
     "required": ["chunk", "content"],
     "additionalProperties": False
@@ -8,17 +8,19 @@ import aiohttp
 import requests
 import rsa
 from aiohttp import ContentTypeError, ClientConnectorError
-from flask import current_app as __ca, current_app, url_for, json
+from flask import current_app as __ca, current_app, json
 from requests.exceptions import Timeout
 
 from dimensigon import defaults
 from dimensigon.domain.entities import Server, Dimension, Gate
 from dimensigon.network.encryptation import pack_msg as _pack_msg, unpack_msg as _unpack_msg
 from dimensigon.network.exceptions import NotValidMessage
+from dimensigon.network.pool import pool
 from dimensigon.utils.helpers import get_now
 from dimensigon.utils.typos import Kwargs, tJSON, Id
 from dimensigon.web import errors, db
 from dimensigon.web.helpers import generate_http_auth
+from dimensigon.web.url_builder import url_path
 
 requests.packages.urllib3.disable_warnings()
 
@@ -196,7 +198,7 @@ def _ping(dest: t.Union[Server, Gate], source: Server, retries=None, timeout=Non
             schema = current_app.config['PREFERRED_URL_SCHEME'] or 'https'
         except:
             schema = 'https'
-        url = f"{schema}://{dest}/{url_for('root.ping', _external=False)}"
+        url = f"{schema}://{dest}{url_path('root.ping')}"
     else:
         server = dest
         try:
@@ -206,11 +208,11 @@ def _ping(dest: t.Union[Server, Gate], source: Server, retries=None, timeout=Non
     while tries < retries:
         try:
             tries += 1
-            resp = requests.post(url,
-                                 json={'start_time': get_now().strftime(defaults.DATETIME_FORMAT)},
-                                 headers={'D-Source': str(source.id), 'D-Destination': str(server.id)},
-                                 verify=verify,
-                                 timeout=timeout)
+            resp = pool.session(url).post(url,
+                                          json={'start_time': get_now().strftime(defaults.DATETIME_FORMAT)},
+                                          headers={'D-Source': str(source.id), 'D-Destination': str(server.id)},
+                                          verify=verify,
+                                          timeout=timeout)
         except requests.exceptions.ReadTimeout as e:
             resp = None
             exc = e
@@ -242,7 +244,7 @@ def _prepare_url(server: t.Union[Server, str], view_or_url: str, view_data=None)
             url = root_path + view_or_url
         else:
             view_data = view_data or {}
-            url = root_path + url_for(view_or_url, **view_data)
+            url = root_path + url_path(view_or_url, **view_data)
     return url
 
 
@@ -276,7 +278,7 @@ def prepare_request(server: t.Union[Server, str], view_or_url, view_data, kwargs
                 pass
 
     if 'json' in kwargs and kwargs['json'] and securizer:
-        kwargs['json'] = pack_msg(kwargs['json'])
+        kwargs['json'] = pack_msg(kwargs['json'], peer=str(server.id) if isinstance(server, Server) else server)
 
     return url
 
@@ -289,11 +291,6 @@ def request(method: str, server: t.Union[Server, str], view_or_url: str, view_da
     json_data = None
     headers = None
 
-    if not session:
-        _session = requests.session()
-    else:
-        _session = session
-
     raise_on_error = kwargs.pop('raise_on_error', False)
 
     try:
@@ -303,6 +300,7 @@ def request(method: str, server: t.Union[Server, str], view_or_url: str, view_da
             raise
         return Response(exception=e, server=server)
 
+    _session = session or pool.session(url)
     func = getattr(_session, method.lower())
 
     if 'timeout' not in kwargs:
@@ -320,9 +318,6 @@ def request(method: str, server: t.Union[Server, str], view_or_url: str, view_da
                                  f"for {timeout} seconds")
     except Exception as e:
         exception = e
-    finally:
-        if not session:
-            _session.close()
     elapsed = time.time() - start
     if elapsed > log_requests_with_elapsed:
         logger.debug(f"{method.upper()} {url} elapsed time: {elapsed}")
@@ -397,8 +392,12 @@ async def async_request(method: str, server: t.Union[Server, str], view_or_url:
     status = None
     headers = None
 
+    close = False
     if session is None:
-        _session = aiohttp.ClientSession()
+        _session = pool.async_session()
+        if _session is None:
+            _session = aiohttp.ClientSession()
+            close = True
     else:
         _session = session
 
@@ -437,7 +436,7 @@ async def async_request(method: str, server: t.Union[Server, str], view_or_url:
         except Exception as e:
             exception = e
     finally:
-        if session is None:
+        if close:
             await _session.close()
     # elapsed = time.time() - start
     # if elapsed > log_requests_with_elapsed:
@@ -517,12 +516,11 @@ async def parallel_requests(servers: t.List[t.Union[Server, Id]], method: str, k
     else:
         servers = [db.session.merge(s) if s not in db.session else s for s in servers]
 
-    if not kwargs.get('session'):
+    close = False
+    _session = kwargs.get('session') or pool.async_session()
+    if _session is None:
         _session = aiohttp.ClientSession()
         close = True
-    else:
-        close = False
-        _session = kwargs.get('session')
     kwargs['session'] = _session
 
     try:
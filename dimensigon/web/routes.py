@@ -6,7 +6,7 @@ from flask_jwt_extended import create_access_token, create_refresh_token, get_jw
 
 import dimensigon
 from dimensigon import defaults
-from dimensigon.domain.entities import Server, Catalog, User
+from dimensigon.domain.entities import Server, Catalog, CatalogDigest, User
 from dimensigon.utils.helpers import get_now
 from dimensigon.web import errors
 from dimensigon.web.decorators import forward_or_dispatch, validate_schema, securizer
@@ -41,6 +41,7 @@ def healthcheck():
     catalog_ver = Catalog.max_catalog()
     data = {"version": dimensigon.__version__,
             "catalog_version": catalog_ver.strftime(defaults.DATEMARK_FORMAT) if catalog_ver else None,
+            "catalog_digest": CatalogDigest.catalog_digest(),
             "services": [],
 
             }
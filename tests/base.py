@@ -14,7 +14,8 @@ from flask_jwt_extended import create_access_token
 from sqlalchemy import event
 
 from dimensigon import defaults
-from dimensigon.domain.entities import User, Dimension, Server, Gate, Route, receive_after_commit
+from dimensigon.domain.entities import User, Dimension, Server, Gate, Route, receive_before_commit, \
+    receive_after_rollback
 from dimensigon.domain.entities.bootstrap import set_initial
 from dimensigon.domain.entities.user import ROOT
 from dimensigon.network.auth import HTTPBearerAuth
@@ -107,7 +108,8 @@ class OneNodeMixin(TestBase):
         with mock.patch('dimensigon.domain.entities.get_now') as mock_get_now:
             mock_get_now.return_value = defaults.INITIAL_DATEMARK
             db.create_all()
-            event.listen(db.session, 'after_commit', receive_after_commit)
+            event.listen(db.session, 'before_commit', receive_before_commit)
+            event.listen(db.session, 'after_rollback', receive_after_rollback)
 
             set_initial(**self.initials)
             d = Dimension.from_json(self.dim)
@@ -154,7 +156,8 @@ class TwoNodeMixin(TestBase):
 
             with app.app_context():
                 db.create_all()
-                event.listen(db.session, 'after_commit', receive_after_commit)
+                event.listen(db.session, 'before_commit', receive_before_commit)
+                event.listen(db.session, 'after_rollback', receive_after_rollback)
                 set_initial(**self.initials)
                 d = Dimension.from_json(self.dim)
                 d.current = True
@@ -227,7 +230,8 @@ class ThreeNodeMixin(TestBase):
             node = app.config['SERVER_NAME']
             with app.app_context():
                 db.create_all()
-                event.listen(db.session, 'after_commit', receive_after_commit)
+                event.listen(db.session, 'before_commit', receive_before_commit)
+                event.listen(db.session, 'after_rollback', receive_after_rollback)
                 set_initial(**self.initials)
                 d = Dimension.from_json(self.dim)
                 d.current = True
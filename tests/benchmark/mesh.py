@@ -0,0 +1,406 @@
+"""
+Local mesh benchmark.
+
+Starts N dimensigon nodes as subprocesses listening on different ports of the same address. The route manager never
+takes a loopback gate as a neighbour, so the first non loopback address of the host is used by default. Every node has
+its own configuration directory and SQLite database inside a working directory. The first node creates the dimension
+and the others join it through the ``dimensigon join`` command. Once the mesh is built, the following workloads are
+measured:
+
+join
+    ``dimensigon join`` of every node, including the interpreter start up
+catalog
+    time from the last join until all nodes report the same catalog version
+routes
+    time from the last join until every node has a route to every other node
+lock
+    prevent and lock of the ORCHESTRATION scope on all nodes. Unlock is measured as ``unlock``
+transfer
+    file sent from the first node to every other node
+orchestration
+    one step orchestration launched on all nodes
+
+Count, errors, throughput (operations per second) and latency percentiles (seconds) of every workload are
+written as JSON::
+
+    python -m tests.benchmark.mesh --nodes 5 --rounds 20 --output mesh.json
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import json
+import logging
+import math
+import multiprocessing as mp
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import typing as t
+import uuid
+
+import requests
+import urllib3
+
+import dimensigon
+from dimensigon.utils.helpers import get_ips
+
+logger = logging.getLogger('dm.benchmark')
+
+PASSWORD = 'benchmark'
+WORKLOADS = ('catalog', 'routes', 'lock', 'transfer', 'orchestration')
+
+
+def percentile(values: t.Sequence[float], p: float) -> t.Optional[float]:
+    """nearest-rank percentile of a sorted sequence"""
+    if not values:
+        return None
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+class Stats:
+
+    def __init__(self):
+        self.samples: t.Dict[str, t.List[float]] = {}
+        self.errors: t.Dict[str, int] = {}
+        self.wall: t.Dict[str, float] = {}
+
+    def add(self, workload: str, elapsed: float):
+        self.samples.setdefault(workload, []).append(elapsed)
+
+    def error(self, workload: str, exc: Exception):
+        logger.error(f"{workload} failed: {exc}")
+        self.errors[workload] = self.errors.get(workload, 0) + 1
+
+    @contextlib.contextmanager
+    def measure(self, workload: str):
+        """measures the block as a sample of the workload. An exception is logged and counted as an error"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.error(workload, e)
+        else:
+            self.add(workload, time.perf_counter() - start)
+
+    @contextlib.contextmanager
+    def workload(self, *workloads: str):
+        """measures the wall time used to compute the throughput of the workloads"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            for w in workloads:
+                self.wall[w] = self.wall.get(w, 0) + time.perf_counter() - start
+
+    def summary(self) -> t.Dict[str, t.Dict[str, t.Any]]:
+        result = {}
+        for w in sorted(set(self.samples) | set(self.errors)):
+            values = sorted(self.samples.get(w, []))
+            wall = self.wall.get(w) or sum(values)
+            result[w] = dict(count=len(values), errors=self.errors.get(w, 0),
+                             throughput=len(values) / wall if wall else None,
+                             min=values[0] if values else None,
+                             p50=percentile(values, 50),
+                             p90=percentile(values, 90),
+                             p99=percentile(values, 99),
+                             max=values[-1] if values else None)
+        return result
+
+
+def default_ip() -> str:
+    """first non loopback IPv4 address of the host"""
+    ips = [ip for ip in get_ips() if not ip.startswith('127.')]
+    if not ips:
+        raise RuntimeError("no non loopback address available")
+    return ips[0]
+
+
+def free_port(ip: str) -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((ip, 0))
+        return s.getsockname()[1]
+
+
+def wait_for(predicate: t.Callable[[], bool], timeout: float, interval: float = 0.5) -> float:
+    """waits until predicate is true and returns the elapsed time. Raises TimeoutError if timeout reached"""
+    start = time.perf_counter()
+    while True:
+        try:
+            if predicate():
+                return time.perf_counter() - start
+        except requests.RequestException:
+            pass
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError(f"condition not met after {timeout} seconds")
+        time.sleep(interval)
+
+
+def _prepare(config_dir: str, name: str, ip: str, port: int, create_dimension: bool) -> t.Optional[str]:
+    """creates the configuration of a node. Runs in a forked process to keep the global state of the harness clean.
+
+    Returns the join token if the dimension is created.
+    """
+    from dimensigon import bootstrap
+    from dimensigon.__main__ import RuntimeConfig, new
+    from dimensigon.domain.entities import Server, Gate
+    from dimensigon.web import db
+
+    os.makedirs(config_dir)
+    bootstrap._write_default_config(config_dir)
+    dm = bootstrap.setup_dm(RuntimeConfig(config_dir=config_dir, port=port, ips=[ip], logconfig={}))
+    dm.create_flask_instance()
+    with dm.flask_app.app_context():
+        server = Server.get_current()
+        server.name = name
+        for gate in server.gates:
+            gate.delete()
+        Gate(server=server, ip=ip, port=port)
+        db.session.commit()
+
+    if create_dimension:
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            new(dm, 'benchmark', password=PASSWORD)
+        # token is printed before the end token line
+        return out.getvalue().strip().splitlines()[-2]
+
+
+class Node:
+
+    def __init__(self, index: int, workdir: str, ip: str, port: int = None):
+        self.index = index
+        self.name = f"node{index}"
+        self.ip = ip
+        self.port = port or free_port(ip)
+        self.config_dir = os.path.join(workdir, self.name)
+        self.id = None
+        self.proc: t.Optional[subprocess.Popen] = None
+        self.session = requests.Session()
+        # nodes use self-signed certificates. Do not let REQUESTS_CA_BUNDLE or proxy variables take precedence
+        self.session.trust_env = False
+        self.session.verify = False
+        self.session.headers['D-Securizer'] = 'plain'
+
+    def __str__(self):
+        return self.name
+
+    def url(self, path: str) -> str:
+        return f"https://{self.ip}:{self.port}{path}"
+
+    def command(self, *args: str) -> t.List[str]:
+        return [sys.executable, '-m', 'dimensigon', '--config-dir', self.config_dir, *args]
+
+    @property
+    def logfile(self) -> str:
+        return os.path.join(self.config_dir, 'benchmark.log')
+
+    def prepare(self, create_dimension=False) -> t.Optional[str]:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context('fork')) as executor:
+            return executor.submit(_prepare, self.config_dir, self.name, self.ip, self.port,
+                                   create_dimension).result()
+
+    def run(self, *args: str, timeout=300):
+        with open(self.logfile, 'ab') as log:
+            subprocess.run(self.command(*args), stdout=log, stderr=subprocess.STDOUT, timeout=timeout, check=True)
+
+    def start(self):
+        with open(self.logfile, 'ab') as log:
+            self.proc = subprocess.Popen(self.command('--port', str(self.port), '--ip', self.ip,
+                                                      '--force-scan'),
+                                         stdout=log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self, timeout=120):
+        def ready():
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"{self} exited with code {self.proc.returncode}. See {self.logfile}")
+            return self.session.get(self.url('/healthcheck'), timeout=5).ok
+
+        wait_for(ready, timeout)
+        self.id = self.healthcheck()['server']['id']
+
+    def stop(self, timeout=90):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self.session.close()
+
+    def login(self):
+        resp = self.session.post(self.url('/login'), json={'username': 'root', 'password': PASSWORD}, timeout=10)
+        resp.raise_for_status()
+        return resp.json()['access_token']
+
+    def request(self, method: str, path: str, timeout=60, **kwargs) -> t.Any:
+        resp = self.session.request(method, self.url(path), timeout=timeout, **kwargs)
+        resp.raise_for_status()
+        return resp.json() if resp.content else None
+
+    def healthcheck(self) -> t.Dict[str, t.Any]:
+        return self.request('get', '/healthcheck', timeout=10)
+
+
+class Mesh:
+
+    def __init__(self, size: int, workdir: str, ip: str = None, base_port: int = None):
+        ip = ip or default_ip()
+        self.nodes = [Node(i, workdir, ip, base_port + i if base_port else None) for i in range(size)]
+        self.workdir = workdir
+        self.joined_at = None
+
+    @property
+    def ref(self) -> Node:
+        return self.nodes[0]
+
+    def build(self, stats: Stats):
+        token = self.ref.prepare(create_dimension=True)
+        self.ref.start()
+        self.ref.wait_ready()
+        with stats.workload('join'):
+            for node in self.nodes[1:]:
+                node.prepare()
+                with stats.measure('join'):
+                    node.run('join', self.ref.ip, token, '--port', str(self.ref.port))
+                node.start()
+        self.joined_at = time.perf_counter()
+        for node in self.nodes[1:]:
+            node.wait_ready()
+        auth = f"Bearer {self.ref.login()}"
+        for node in self.nodes:
+            node.session.headers['Authorization'] = auth
+
+    def stop(self):
+        for node in self.nodes:
+            node.stop()
+
+    def parallel(self, func: t.Callable[[Node], t.Any], nodes: t.List[Node] = None) -> t.List[t.Any]:
+        nodes = nodes or self.nodes
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(nodes)) as executor:
+            return list(executor.map(func, nodes))
+
+
+def bench_catalog(mesh: Mesh, stats: Stats, timeout=300, **kwargs):
+    def converged():
+        versions = mesh.parallel(lambda n: n.healthcheck()['catalog_version'])
+        return len(set(versions)) == 1
+
+    try:
+        wait_for(converged, timeout)
+    except TimeoutError as e:
+        stats.error('catalog', e)
+    else:
+        stats.add('catalog', time.perf_counter() - mesh.joined_at)
+
+
+def bench_routes(mesh: Mesh, stats: Stats, timeout=300, **kwargs):
+    def converged():
+        tables = mesh.parallel(lambda n: n.request('get', '/api/v1.0/routes')['route_list'])
+        return all(len([r for r in routes if r['cost'] is not None]) >= len(mesh.nodes) - 1 for routes in tables)
+
+    try:
+        wait_for(converged, timeout)
+    except TimeoutError as e:
+        stats.error('routes', e)
+    else:
+        stats.add('routes', time.perf_counter() - mesh.joined_at)
+
+
+def bench_lock(mesh: Mesh, stats: Stats, rounds: int, **kwargs):
+    def call(action, data):
+        return mesh.parallel(lambda n: n.request('post', f'/api/v1.0/locker/{action}', json=data))
+
+    with stats.workload('lock', 'unlock'):
+        for _ in range(rounds):
+            datemark = max(v for v in mesh.parallel(lambda n: n.healthcheck()['catalog_version']))
+            data = dict(scope='ORCHESTRATION', applicant=str(uuid.uuid4()))
+            with stats.measure('lock'):
+                call('prevent', dict(data, datemark=datemark))
+                call('lock', data)
+            with stats.measure('unlock'):
+                call('unlock', data)
+
+
+def bench_transfer(mesh: Mesh, stats: Stats, rounds: int, file_size: int, **kwargs):
+    file = os.path.join(mesh.workdir, 'transfer.bin')
+    with open(file, 'wb') as fd:
+        fd.write(os.urandom(file_size))
+    with stats.workload('transfer'):
+        for _ in range(rounds):
+            for node in mesh.nodes[1:]:
+                with stats.measure('transfer'):
+                    mesh.ref.request('post', '/api/v1.0/send', timeout=600,
+                                     json=dict(file=file, dest_server_id=node.id,
+                                               dest_path=os.path.join(node.config_dir, 'transfers'),
+                                               background=False, force=True))
+
+
+def bench_orchestration(mesh: Mesh, stats: Stats, rounds: int, **kwargs):
+    orch = mesh.ref.request('post', '/api/v1.0/orchestrations/full',
+                            json=dict(name=f"benchmark-{uuid.uuid4()}",
+                                      steps=[dict(id='1', undo=False, action_type='SHELL', code='true')]))
+    hosts = {'all': [n.id for n in mesh.nodes]}
+    with stats.workload('orchestration'):
+        for _ in range(rounds):
+            with stats.measure('orchestration'):
+                mesh.ref.request('post', f"/api/v1.0/launch/orchestration/{orch['id']}", timeout=600,
+                                 json=dict(hosts=hosts, background=False))
+
+
+def run(nodes: int = 3, rounds: int = 10, file_size: int = 1024 * 1024, workloads: t.Iterable[str] = WORKLOADS,
+        workdir: str = None, ip: str = None, base_port: int = None) -> t.Dict[str, t.Any]:
+    """builds a mesh of `nodes` nodes, runs the workloads on it and returns the results"""
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    tmpdir = None
+    if workdir is None:
+        workdir = tmpdir = tempfile.mkdtemp(prefix='dm-benchmark-')
+    stats = Stats()
+    mesh = Mesh(nodes, workdir, ip, base_port)
+    try:
+        mesh.build(stats)
+        for w in workloads:
+            logger.info(f"Running {w} workload")
+            globals()[f"bench_{w}"](mesh, stats, rounds=rounds, file_size=file_size)
+    finally:
+        mesh.stop()
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+    return dict(version=dimensigon.__version__, nodes=nodes, rounds=rounds, file_size=file_size,
+                workloads=stats.summary())
+
+
+def get_arguments(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark.mesh', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--nodes', type=int, default=3, help="number of nodes in the mesh")
+    parser.add_argument('--rounds', type=int, default=10, help="times every workload is repeated")
+    parser.add_argument('--file-size', type=int, default=1024 * 1024, help="size in bytes of the transferred file")
+    parser.add_argument('--workload', dest='workloads', action='append', choices=WORKLOADS,
+                        help="workload to run. May be repeated. Defaults to all")
+    parser.add_argument('--ip', help="address where nodes listen. Defaults to the first non loopback IPv4 address")
+    parser.add_argument('--base-port', type=int, help="port of the first node. Free ports are used if not set")
+    parser.add_argument('--workdir', help="directory where nodes are created. Kept after the run. "
+                                          "Defaults to a temporary directory")
+    parser.add_argument('--output', '-o', help="JSON file to write the results to. Defaults to stdout")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-8s %(message)s')
+    args = get_arguments(args)
+    result = run(nodes=args.nodes, rounds=args.rounds, file_size=args.file_size,
+                 workloads=args.workloads or WORKLOADS, workdir=args.workdir, ip=args.ip,
+                 base_port=args.base_port)
+    if args.output:
+        with open(args.output, 'w') as fd:
+            json.dump(result, fd, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
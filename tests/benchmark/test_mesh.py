@@ -0,0 +1,67 @@
+from unittest import TestCase, mock
+
+from tests.benchmark.mesh import percentile, Stats, Node, get_arguments, WORKLOADS
+
+
+class TestPercentile(TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(50, percentile(values, 50))
+        self.assertEqual(90, percentile(values, 90))
+        self.assertEqual(100, percentile(values, 100))
+        self.assertEqual(1, percentile(values, 0))
+        self.assertEqual(3, percentile([3], 99))
+        self.assertIsNone(percentile([], 50))
+
+
+class TestStats(TestCase):
+
+    def test_measure(self):
+        stats = Stats()
+        with mock.patch('tests.benchmark.mesh.time.perf_counter', side_effect=[0, 2, 10, 11]):
+            with stats.measure('lock'):
+                pass
+            with stats.measure('lock'):
+                raise RuntimeError('lock failed')
+
+        self.assertDictEqual({'lock': [2]}, stats.samples)
+        self.assertDictEqual({'lock': 1}, stats.errors)
+
+    def test_summary(self):
+        stats = Stats()
+        for v in (3, 1, 2):
+            stats.add('transfer', v)
+        stats.error('routes', TimeoutError())
+        with mock.patch('tests.benchmark.mesh.time.perf_counter', side_effect=[0, 4]):
+            with stats.workload('transfer'):
+                pass
+
+        summary = stats.summary()
+
+        self.assertDictEqual(dict(count=3, errors=0, throughput=0.75, min=1, p50=2, p90=3, p99=3, max=3),
+                             summary['transfer'])
+        self.assertDictEqual(dict(count=0, errors=1, throughput=None, min=None, p50=None, p90=None, p99=None,
+                                  max=None), summary['routes'])
+
+
+class TestNode(TestCase):
+
+    def test_node(self):
+        node = Node(1, '/tmp/mesh', '192.0.2.1', 5001)
+
+        self.assertEqual('node1', str(node))
+        self.assertEqual('https://192.0.2.1:5001/healthcheck', node.url('/healthcheck'))
+        self.assertListEqual(['--config-dir', '/tmp/mesh/node1', 'join'], node.command('join')[3:])
+        self.assertFalse(node.session.trust_env)
+
+
+class TestArguments(TestCase):
+
+    def test_get_arguments(self):
+        args = get_arguments(['--nodes', '5', '--workload', 'lock', '--workload', 'routes'])
+
+        self.assertEqual(5, args.nodes)
+        self.assertListEqual(['lock', 'routes'], args.workloads)
+        self.assertIsNone(get_arguments([]).workloads)
+        self.assertIn('lock', WORKLOADS)
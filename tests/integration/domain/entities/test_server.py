@@ -1,7 +1,11 @@
 from unittest import TestCase, mock
 
+from sqlalchemy import event
+from sqlalchemy.orm.exc import NoResultFound
+
 from dimensigon import defaults
 from dimensigon.domain.entities import Server, Route
+from dimensigon.network.resolver import Resolver
 from dimensigon.utils.helpers import get_now
 from dimensigon.web import db, errors
 from tests.base import OneNodeMixin
@@ -27,7 +31,7 @@ class TestServer(OneNodeMixin, TestCase):
         db.session.commit()
 
     @mock.patch('dimensigon.domain.entities.route.check_host')
-    @mock.patch('dimensigon.domain.entities.server.url_for')
+    @mock.patch('dimensigon.domain.entities.server.url_path')
     def test_url(self, mock_url, mock_check_host):
         self.set_servers_and_routes()
 
@@ -56,6 +60,15 @@ class TestServer(OneNodeMixin, TestCase):
         with self.assertRaises(errors.UnreachableDestination):
             s.url()
 
+    @mock.patch('dimensigon.domain.entities.server.resolver',
+                Resolver(resolve={'node1': '127.0.1.1', 'node2': '10.1.2.3'}.get))
+    def test_gates(self):
+        s = Server('s', gates=[('node1', 5000), ('node2', 5000), ('unknown', 5000), ('127.0.0.1', 5001),
+                               ('10.1.2.4', 5001)])
+
+        self.assertListEqual(['node1:5000', '127.0.0.1:5001'], [str(g) for g in s.localhost_gates])
+        self.assertListEqual(['node2:5000', 'unknown:5000', '10.1.2.4:5001'], [str(g) for g in s.external_gates])
+
     def test_get_neighbours(self):
         n1 = Server('n1', port=8000)
         n2 = Server('n2', port=8000)
@@ -119,3 +132,34 @@ class TestServer(OneNodeMixin, TestCase):
 
         self.assertListEqual([r1], me.get_reachable_servers(exclude=[n1.id, n2]))
 
+
+    def test_get_current(self):
+        executed = []
+        engine = db.get_engine()
+        listener = lambda *args, **kwargs: executed.append(args[2])
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            self.assertEqual(self.s1, Server.get_current())
+            db.session.expire_all()
+            executed.clear()
+            self.assertEqual(self.s1, Server.get_current())
+            # current server is looked up by its primary key
+            self.assertEqual(1, len(executed))
+            executed.clear()
+            self.assertEqual(self.s1, Server.get_current())
+            # already in session
+            self.assertEqual(0, len(executed))
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+
+        # current server changes
+        self.s1._me = False
+        me = Server('me', port=8000, me=True)
+        db.session.add(me)
+        db.session.commit()
+        self.assertEqual(me, Server.get_current())
+
+        me.delete()
+        db.session.commit()
+        with self.assertRaises(NoResultFound):
+            Server.get_current()
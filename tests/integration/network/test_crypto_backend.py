@@ -0,0 +1,57 @@
+from unittest import TestCase
+
+import rsa
+
+from dimensigon.network.crypto_backend import RsaBackend, CryptographyBackend, benchmark
+
+
+class TestCryptoBackend(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.pub_key, cls.priv_key = rsa.newkeys(1024)
+        cls.message = b'{"enveloped_data": "data"}'
+        cls.rsa = RsaBackend()
+        cls.cryptography = CryptographyBackend()
+
+    def test_sign_interoperability(self):
+        signature = self.cryptography.sign(self.message, self.priv_key)
+
+        # PKCS#1 v1.5 signatures are deterministic
+        self.assertEqual(self.rsa.sign(self.message, self.priv_key), signature)
+        self.rsa.verify(self.message, signature, self.pub_key)
+        self.cryptography.verify(self.message, signature, self.pub_key)
+
+    def test_verify_error(self):
+        signature = self.cryptography.sign(self.message, self.priv_key)
+
+        with self.assertRaises(rsa.pkcs1.VerificationError):
+            self.cryptography.verify(self.message + b' ', signature, self.pub_key)
+
+    def test_encrypt_interoperability(self):
+        self.assertEqual(b'key', self.rsa.decrypt(self.cryptography.encrypt(b'key', self.pub_key), self.priv_key))
+        self.assertEqual(b'key', self.cryptography.decrypt(self.rsa.encrypt(b'key', self.pub_key), self.priv_key))
+
+    def test_decrypt_error(self):
+        _, other_priv_key = self.cryptography.newkeys(1024)
+
+        crypto = self.cryptography.encrypt(b'key', self.pub_key)
+        try:
+            # OpenSSL >= 3.2 does not fail with the wrong key (implicit rejection). It returns random bytes
+            self.assertNotEqual(b'key', self.cryptography.decrypt(crypto, other_priv_key))
+        except rsa.pkcs1.DecryptionError:
+            pass
+
+    def test_newkeys(self):
+        pub_key, priv_key = self.cryptography.newkeys(1024)
+
+        self.assertIsInstance(pub_key, rsa.PublicKey)
+        self.assertIsInstance(priv_key, rsa.PrivateKey)
+        self.assertEqual(priv_key, rsa.PrivateKey.load_pkcs1(priv_key.save_pkcs1()))
+        self.rsa.verify(self.message, self.rsa.sign(self.message, priv_key), pub_key)
+
+    def test_benchmark(self):
+        result = benchmark(nbits=1024, rounds=2)
+
+        self.assertEqual({'rsa', 'cryptography'}, set(result.keys()))
+        self.assertEqual({'sign', 'verify', 'encrypt', 'decrypt'}, set(result['rsa'].keys()))
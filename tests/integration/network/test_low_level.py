@@ -0,0 +1,94 @@
+import threading
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from unittest import TestCase, mock
+
+from dimensigon.network.low_level import check_host, async_check_host, probe_cache, is_open2, async_is_open2
+from dimensigon.utils import asyncio
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        if self.path == '/alive' and self.server.legacy:
+            code, body = 404, b'not found'
+        else:
+            code, body = 200, b'OK'
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    legacy = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.paths = []
+
+
+class TestCheckHost(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = _Server(('127.0.0.1', 0), _Handler)
+        cls.port = cls.server.server_address[1]
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        probe_cache.clear()
+        self.server.paths.clear()
+        self.server.legacy = False
+
+    def test_is_open2(self):
+        self.assertTrue(is_open2('127.0.0.1', self.port, ssl=False))
+        self.assertListEqual(['/alive'], self.server.paths)
+
+    def test_is_open2_legacy_node(self):
+        self.server.legacy = True
+
+        self.assertTrue(is_open2('127.0.0.1', self.port, ssl=False))
+        self.assertListEqual(['/alive', '/'], self.server.paths)
+
+    def test_check_host_cache(self):
+        with mock.patch('dimensigon.network.low_level.is_open2', side_effect=[True, False]) as mocked_is_open2:
+            self.assertTrue(check_host('127.0.0.1', self.port))
+            self.assertTrue(check_host('127.0.0.1', self.port))
+            mocked_is_open2.assert_called_once()
+
+            with mock.patch('dimensigon.network.low_level.time.monotonic', return_value=time.monotonic() + 60):
+                self.assertFalse(check_host('127.0.0.1', self.port, retry=1, delay=0))
+            self.assertEqual(2, mocked_is_open2.call_count)
+
+    def test_async_is_open2(self):
+        self.assertTrue(asyncio.run(async_is_open2('127.0.0.1', self.port, ssl=False)))
+        self.server.legacy = True
+        self.assertTrue(asyncio.run(async_is_open2('127.0.0.1', self.port, ssl=False)))
+        self.assertListEqual(['/alive', '/alive', '/'], self.server.paths)
+
+        self.assertFalse(asyncio.run(async_is_open2('127.0.0.1', 1, ssl=False)))
+
+    def test_async_check_host_cache(self):
+        async def is_open(*args, **kwargs):
+            return False
+
+        with mock.patch('dimensigon.network.low_level.async_is_open2', side_effect=is_open) as mocked_is_open2:
+            self.assertFalse(asyncio.run(async_check_host('127.0.0.1', 1, retry=2, delay=0)))
+            self.assertFalse(asyncio.run(async_check_host('127.0.0.1', 1, retry=2, delay=0)))
+
+        self.assertEqual(2, mocked_is_open2.call_count)
+        self.assertFalse(probe_cache.get('127.0.0.1', 1))
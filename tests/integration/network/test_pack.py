@@ -5,7 +5,8 @@ from unittest.mock import patch
 import rsa
 from cryptography.fernet import Fernet
 
-from dimensigon.network.encryptation import pack_msg, unpack_msg
+from dimensigon.network import crypto_backend
+from dimensigon.network.encryptation import pack_msg, unpack_msg, SessionKeyCache, session_keys
 
 
 class TestPack_msg_pickle(TestCase):
@@ -312,3 +313,76 @@ class TestPack_msg_json(TestCase):
         unpacked_msg = unpack_msg(packed_msg)
 
         self.assertDictEqual({}, unpacked_msg)
+
+
+class TestSessionKeyCache(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.pub_key, cls.priv_key = rsa.newkeys(1024)
+        cls.data = {'test': 'some random data'}
+
+    def setUp(self) -> None:
+        session_keys.clear()
+
+    def test_pack_unpack_with_peer(self):
+        with patch.object(crypto_backend.backend, 'encrypt', wraps=crypto_backend.backend.encrypt) as mocked_encrypt, \
+                patch.object(crypto_backend.backend, 'decrypt', wraps=crypto_backend.backend.decrypt) as mocked_decrypt:
+            packed = [pack_msg(self.data, pub_key=self.pub_key, priv_key=self.priv_key, peer='dest')
+                      for _ in range(5)]
+            for packed_msg in packed:
+                self.assertIn('key', packed_msg)
+                self.assertDictEqual(self.data, unpack_msg(packed_msg, pub_key=self.pub_key, priv_key=self.priv_key))
+
+        self.assertEqual(1, mocked_encrypt.call_count)
+        # key negotiated by the sender is already known
+        self.assertEqual(0, mocked_decrypt.call_count)
+        self.assertEqual(1, len(set(p['key'] for p in packed)))
+
+    def test_pack_with_different_peers(self):
+        m1 = pack_msg(self.data, pub_key=self.pub_key, priv_key=self.priv_key, peer='dest1')
+        m2 = pack_msg(self.data, pub_key=self.pub_key, priv_key=self.priv_key, peer='dest2')
+
+        self.assertNotEqual(m1['key'], m2['key'])
+
+    def test_resolve_caches_decryption(self):
+        cache = SessionKeyCache()
+        sym_key = Fernet.generate_key()
+        cipher_key = rsa.encrypt(sym_key, self.pub_key)
+        with patch.object(crypto_backend.backend, 'decrypt', wraps=crypto_backend.backend.decrypt) as mocked_decrypt:
+            self.assertEqual(sym_key, cache.resolve(cipher_key, self.priv_key))
+            self.assertEqual(sym_key, cache.resolve(cipher_key, self.priv_key))
+
+        self.assertEqual(1, mocked_decrypt.call_count)
+
+    def test_resolve_wrong_key(self):
+        cache = SessionKeyCache()
+        _, other_priv_key = rsa.newkeys(1024)
+        cipher_key = rsa.encrypt(Fernet.generate_key(), self.pub_key)
+        # implicit rejection returns random bytes instead of failing
+        with patch.object(crypto_backend.backend, 'decrypt', return_value=b'\x8a\x01random bytes'):
+            with self.assertRaises(rsa.pkcs1.DecryptionError):
+                cache.resolve(cipher_key, other_priv_key)
+        with self.assertRaises(rsa.pkcs1.DecryptionError):
+            cache.resolve(cipher_key, other_priv_key)
+
+        # failed keys are not cached
+        self.assertEqual(0, len(cache._known))
+
+    @patch('dimensigon.network.encryptation.time.monotonic')
+    def test_rotation(self, mocked_monotonic):
+        cache = SessionKeyCache(ttl=60)
+        mocked_monotonic.return_value = 0
+        key1, _ = cache.get('dest', self.pub_key)
+        mocked_monotonic.return_value = 59
+        self.assertEqual(key1, cache.get('dest', self.pub_key)[0])
+        mocked_monotonic.return_value = 61
+        self.assertNotEqual(key1, cache.get('dest', self.pub_key)[0])
+
+    def test_maxsize(self):
+        cache = SessionKeyCache(maxsize=2)
+        key1, _ = cache.get('dest1', self.pub_key)
+        cache.get('dest2', self.pub_key)
+        cache.get('dest3', self.pub_key)
+
+        self.assertNotEqual(key1, cache.get('dest1', self.pub_key)[0])
@@ -0,0 +1,156 @@
+import datetime as dt
+import os
+import socketserver
+import ssl
+import tempfile
+import threading
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from unittest import TestCase, mock
+
+import requests
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from dimensigon.network.pool import SessionPool
+from dimensigon.utils import asyncio
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'{"msg": "ok"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _TLSServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args, context: ssl.SSLContext, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.context = context
+        self.handshakes = 0
+
+    def get_request(self):
+        sock, addr = super().get_request()
+        self.handshakes += 1
+        return self.context.wrap_socket(sock, server_side=True), addr
+
+
+def _generate_cert(folder):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, u"localhost")])
+    now = dt.datetime.utcnow()
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name) \
+        .not_valid_before(now).not_valid_after(now + dt.timedelta(days=1)) \
+        .serial_number(x509.random_serial_number()).public_key(key.public_key()) \
+        .sign(private_key=key, algorithm=hashes.SHA256(), backend=default_backend())
+    certfile, keyfile = os.path.join(folder, 'cert.pem'), os.path.join(folder, 'key.pem')
+    with open(certfile, 'wb') as fd:
+        fd.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(keyfile, 'wb') as fd:
+        fd.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+                                   serialization.NoEncryption()))
+    return certfile, keyfile
+
+
+class TestSessionPool(TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*_generate_cert(cls.tmpdir.name))
+        cls.server = _TLSServer(('127.0.0.1', 0), _Handler, context=context)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = f"https://127.0.0.1:{cls.server.server_address[1]}/"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.tmpdir.cleanup()
+
+    def setUp(self) -> None:
+        self.server.handshakes = 0
+        self.pool = SessionPool(max_destinations=2, maxsize=2, idle_timeout=60)
+
+    def tearDown(self) -> None:
+        self.pool.close()
+
+    def test_session_reuses_connection(self):
+        for _ in range(5):
+            resp = self.pool.session(self.url).get(self.url, verify=False, timeout=5)
+            self.assertEqual(200, resp.status_code)
+
+        self.assertEqual(1, self.server.handshakes)
+
+        # baseline without pool opens a connection per request
+        for _ in range(5):
+            requests.get(self.url, verify=False, timeout=5)
+        self.assertEqual(6, self.server.handshakes)
+
+    def test_session_per_destination(self):
+        s1 = self.pool.session(self.url + 'api/v1.0/routes')
+        s2 = self.pool.session(self.url + 'healthcheck')
+        s3 = self.pool.session('https://other:5000/')
+
+        self.assertIs(s1, s2)
+        self.assertIsNot(s1, s3)
+        self.assertEqual(2, len(self.pool))
+
+    def test_max_destinations(self):
+        s1 = self.pool.session('https://node1:5000/')
+        self.pool.session('https://node2:5000/')
+        self.pool.session('https://node3:5000/')
+
+        self.assertEqual(2, len(self.pool))
+        self.assertIsNot(s1, self.pool.session('https://node1:5000/'))
+
+    def test_idle_eviction(self):
+        s1 = self.pool.session(self.url)
+        with mock.patch('dimensigon.network.pool.time.monotonic', return_value=time.monotonic() + 120):
+            s2 = self.pool.session(self.url)
+
+        self.assertIsNot(s1, s2)
+
+    def test_fork_safety(self):
+        s1 = self.pool.session(self.url)
+        with mock.patch('dimensigon.network.pool.os.getpid', return_value=os.getpid() + 1):
+            s2 = self.pool.session(self.url)
+
+        self.assertIsNot(s1, s2)
+
+    def test_async_session_reuses_connection(self):
+        async def fetch():
+            session = self.pool.async_session()
+            async with session.get(self.url, ssl=False) as resp:
+                await resp.read()
+                return resp.status
+
+        loop = self.pool.new_event_loop()
+        try:
+            for _ in range(5):
+                self.assertEqual(200, loop.run_until_complete(fetch()))
+            self.assertEqual(1, self.server.handshakes)
+        finally:
+            loop.run_until_complete(self.pool.async_close())
+            loop.close()
+
+    def test_async_session_not_registered_loop(self):
+        async def get_session():
+            return self.pool.async_session()
+
+        self.assertIsNone(asyncio.run(get_session()))
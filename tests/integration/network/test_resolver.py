@@ -0,0 +1,94 @@
+import ipaddress
+import os
+import socket
+import threading
+from unittest import TestCase, mock
+
+from dimensigon.network.resolver import Resolver
+
+
+class FakeResolver:
+
+    def __init__(self, names):
+        self.names = names
+        self.calls = []
+        self.resolved = threading.Event()
+
+    def __call__(self, name):
+        self.calls.append(name)
+        self.resolved.set()
+        if name not in self.names:
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        return self.names[name]
+
+
+class TestResolver(TestCase):
+
+    def setUp(self) -> None:
+        self.fake = FakeResolver({'node1': '10.1.2.3', 'localhost': '127.0.0.1'})
+        self.resolver = Resolver(ttl=10, negative_ttl=2, max_entries=2, resolve=self.fake)
+
+    def wait_refresh(self):
+        self.fake.resolved.wait(1)
+        self.resolver._executor.shutdown(wait=True)
+        self.resolver._executor = None
+
+    @mock.patch('dimensigon.network.resolver.time.monotonic')
+    def test_resolve(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+
+        self.assertEqual(ipaddress.ip_address('10.1.2.3'), self.resolver.resolve('node1'))
+        self.assertEqual(ipaddress.ip_address('10.1.2.3'), self.resolver.resolve('node1'))
+        self.assertListEqual(['node1'], self.fake.calls)
+
+        # expired entries are returned while they are refreshed in background
+        self.fake.names['node1'] = '10.1.2.4'
+        self.fake.resolved.clear()
+        mock_monotonic.return_value = 111
+        self.assertEqual(ipaddress.ip_address('10.1.2.3'), self.resolver.resolve('node1'))
+        self.wait_refresh()
+        self.assertEqual(ipaddress.ip_address('10.1.2.4'), self.resolver.resolve('node1'))
+        self.assertListEqual(['node1', 'node1'], self.fake.calls)
+
+    @mock.patch('dimensigon.network.resolver.time.monotonic')
+    def test_resolve_negative(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+
+        self.assertIsNone(self.resolver.resolve('node2'))
+        self.assertIsNone(self.resolver.resolve('node2'))
+        self.assertListEqual(['node2'], self.fake.calls)
+
+        self.fake.names['node2'] = '10.1.2.5'
+        self.fake.resolved.clear()
+        mock_monotonic.return_value = 103
+        self.assertIsNone(self.resolver.resolve('node2'))
+        self.wait_refresh()
+        self.assertEqual(ipaddress.ip_address('10.1.2.5'), self.resolver.resolve('node2'))
+
+    def test_warm(self):
+        self.resolver.warm(['node1', 'node1'])
+        self.wait_refresh()
+        self.assertListEqual(['node1'], self.fake.calls)
+
+        self.assertEqual(ipaddress.ip_address('10.1.2.3'), self.resolver.resolve('node1'))
+        self.resolver.warm(['node1'])
+        self.assertIsNone(self.resolver._executor)
+        self.assertListEqual(['node1'], self.fake.calls)
+
+    def test_max_entries(self):
+        self.resolver.resolve('node1')
+        self.resolver.resolve('localhost')
+        self.resolver.resolve('node1')
+        self.resolver.resolve('node2')
+
+        self.assertEqual(2, len(self.resolver))
+        self.resolver.resolve('node1')
+        self.resolver.resolve('localhost')
+        self.assertListEqual(['node1', 'localhost', 'node2', 'localhost'], self.fake.calls)
+
+    def test_fork(self):
+        self.resolver.resolve('node1')
+        with mock.patch('dimensigon.network.resolver.os.getpid', return_value=os.getpid() + 1):
+            # child process does not use the names resolved by its parent
+            self.resolver.resolve('node1')
+        self.assertListEqual(['node1', 'node1'], self.fake.calls)
@@ -1,18 +1,25 @@
 import datetime as dt
+import json
 import os
 import re
 import threading
+import uuid
 from unittest import TestCase, mock
 from unittest.mock import patch
+from urllib.parse import urlsplit, parse_qs
 
 import responses
 from aioresponses import aioresponses
+from sqlalchemy import event
 
 from dimensigon import defaults
-from dimensigon.domain.entities import Server, Catalog, Software, ActionTemplate, ActionType, SoftwareServerAssociation
-from dimensigon.use_cases.catalog import CatalogManager, NewVersionFound, NoServerFound, CatalogFetchError
+from dimensigon.domain.entities import Server, Catalog, Software, ActionTemplate, ActionType, SoftwareServerAssociation, \
+    CatalogDigest, Orchestration, Step
+from dimensigon.use_cases.catalog import CatalogManager, NewVersionFound, NoServerFound, CatalogFetchError, \
+    update_db_catalog
 from dimensigon.web import db
-from dimensigon.web.api_1_0.urls.use_cases import fetch_catalog
+from dimensigon.utils.helpers import get_distributed_entities
+from dimensigon.web.api_1_0.urls.use_cases import fetch_catalog, fetch_catalog_page, CatalogCursor
 from tests.base import TwoNodeMixin, LockBypassMixin
 
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -97,6 +104,214 @@ class TestCatalog(LockBypassMixin, TwoNodeMixin, TestCase):
         self.assertEqual(now1, Catalog.query.get('Server').last_modified_at)
         self.assertEqual(now1, Catalog.query.get('Gate').last_modified_at)
 
+    @patch('dimensigon.use_cases.catalog.defaults.CATALOG_PAGE_SIZE', 2)
+    @responses.activate
+    @aioresponses()
+    def test_catalog_pages(self, m):
+        m.post(re.compile(r'https?://node2:\d+/healthcheck'),
+               status=200, payload=dict(server=dict(id=self.s2.id, name=self.s2.name),
+                                        version='1',
+                                        catalog_version=now3.strftime(defaults.DATEMARK_FORMAT)))
+        requested = []
+
+        def page(request):
+            query = parse_qs(urlsplit(request.url).query)
+            cursor = CatalogCursor.decode(query['cursor'][0]) if 'cursor' in query else None
+            with self.app2_context:
+                data, cursor = fetch_catalog_page(now1, int(query['limit'][0]), cursor)
+            requested.append(data)
+            return 200, {}, json.dumps({'catalog': data, 'cursor': cursor.encode() if cursor else None})
+
+        responses.add_callback(responses.GET, re.compile(
+            r'https?://node2:\d+/api/v1\.0/catalog/' + now1.strftime(defaults.DATEMARK_FORMAT).replace('+', '%2B')),
+                               callback=page)
+
+        self.cm.upgrade_process()
+
+        self.assertEqual(2, len(requested))
+        self.assertListEqual([self.at_json, self.soft_json], requested[0]['ActionTemplate'] + requested[0]['Software'])
+        soft = Software.query.get('aaaaaaaa-1234-5678-1234-56781234aaa1')
+        self.assertDictEqual(self.soft_json, soft.to_json())
+        self.assertEqual(1, SoftwareServerAssociation.query.count())
+        self.assertEqual(now3, Catalog.query.get('SoftwareServerAssociation').last_modified_at)
+
+    @patch('dimensigon.use_cases.catalog.defaults.CATALOG_PAGE_SIZE', 2)
+    @responses.activate
+    @aioresponses()
+    def test_catalog_pages_error(self, m):
+        m.post(re.compile(r'https?://node2:\d+/healthcheck'),
+               status=200, payload=dict(server=dict(id=self.s2.id, name=self.s2.name),
+                                        version='1',
+                                        catalog_version=now3.strftime(defaults.DATEMARK_FORMAT)))
+
+        def page(request):
+            if 'cursor' in request.url:
+                return 500, {}, json.dumps({'error': 'page not available'})
+            with self.app2_context:
+                data, cursor = fetch_catalog_page(now1, 2)
+            return 200, {}, json.dumps({'catalog': data, 'cursor': cursor.encode()})
+
+        responses.add_callback(responses.GET, re.compile(
+            r'https?://node2:\d+/api/v1\.0/catalog/' + now1.strftime(defaults.DATEMARK_FORMAT).replace('+', '%2B')),
+                               callback=page)
+
+        with self.assertRaises(CatalogFetchError):
+            self.cm.upgrade_process()
+
+        # pages already received are discarded
+        self.assertIsNone(Software.query.get('aaaaaaaa-1234-5678-1234-56781234aaa1'))
+        self.assertIsNone(Catalog.query.get('Software'))
+
+    def test_update_db_catalog_bulk(self):
+        def statements(n):
+            mark = (now3 + dt.timedelta(days=n)).strftime(defaults.DATEMARK_FORMAT)
+            catalog = {name: [] for name, _ in get_distributed_entities()}
+            for i in range(n):
+                soft = dict(id=str(uuid.uuid4()), name=f'soft{n}', version=str(i), family=None, filename='file',
+                            size=1, checksum='x', last_modified_at=mark)
+                catalog['Software'].append(soft)
+                catalog['SoftwareServerAssociation'].append(
+                    dict(software_id=soft['id'], server_id=self.s1.id, path='/root', last_modified_at=mark))
+            # update an existing software
+            catalog['Software'].append(dict(self.soft_json, version=str(n), last_modified_at=mark))
+
+            executed = []
+            engine = db.get_engine()
+            listener = lambda *args, **kwargs: executed.append(args[2])
+            event.listen(engine, 'before_cursor_execute', listener)
+            try:
+                update_db_catalog(catalog)
+            finally:
+                event.remove(engine, 'before_cursor_execute', listener)
+            self.assertEqual(n, Software.query.filter_by(name=f'soft{n}').count())
+            self.assertEqual(str(n), Software.query.get(self.soft_json['id']).version)
+            return len(executed)
+
+        statements(1)
+        # number of statements does not depend on the number of entities
+        self.assertEqual(statements(5), statements(50))
+
+    def test_catalog_digest_incremental(self):
+        def leaves():
+            return {name: CatalogDigest.leaves(name) for name, _ in get_distributed_entities()}
+
+        with self.app2_context:
+            soft = Software.query.get(self.soft_json['id'])
+            soft.version = '2'
+            db.session.delete(SoftwareServerAssociation.query.one())
+            db.session.commit()
+            incremental = leaves()
+
+            CatalogDigest.rebuild()
+            db.session.commit()
+
+            self.assertDictEqual(leaves(), incremental)
+            self.assertNotIn('SoftwareServerAssociation', CatalogDigest.roots())
+
+    def test_catalog_digest_rollback(self):
+        digest = CatalogDigest.catalog_digest()
+        db.session.add(Software(name='rollback', version='1', filename='file'))
+        db.session.flush()
+        db.session.rollback()
+        db.session.add(ActionTemplate(name='mkdir', version=1, action_type=ActionType.SHELL, code='mkdir {dir}'))
+        db.session.commit()
+        roots = CatalogDigest.roots()
+
+        self.assertNotEqual(digest, CatalogDigest.catalog_digest())
+        self.assertNotIn('Software', roots)
+        CatalogDigest.rebuild()
+        db.session.commit()
+        self.assertDictEqual(roots, CatalogDigest.roots())
+
+    def test_catalog_digest_stored(self):
+        db.session.add(Software(name='stored', version='1', filename='file'))
+        db.session.commit()
+
+        with mock.patch.object(CatalogDigest, 'roots', wraps=CatalogDigest.roots) as mock_roots:
+            digest = CatalogDigest.catalog_digest()
+            mock_roots.assert_not_called()
+        self.assertEqual(CatalogDigest._compute_digest(), digest)
+
+    @responses.activate
+    @aioresponses()
+    def test_catalog_repair(self, m):
+        with self.app2_context:
+            digest = CatalogDigest.catalog_digest()
+            roots = CatalogDigest.roots()
+        # same catalog version but different rows
+        m.post(re.compile(r'https?://node2:\d+/healthcheck'),
+               status=200, payload=dict(server=dict(id=self.s2.id, name=self.s2.name),
+                                        version='1',
+                                        catalog_version=now1.strftime(defaults.DATEMARK_FORMAT),
+                                        catalog_digest=digest))
+
+        def dispatch(request):
+            url = urlsplit(request.url)
+            resp = self.client2.open(url.path, method=request.method, query_string=url.query,
+                                     json=json.loads(request.body) if request.body else None,
+                                     headers=self.auth.header)
+            return resp.status_code, {}, resp.data
+
+        responses.add_callback(responses.GET, re.compile(r'https?://node2:\d+/api/v1\.0/catalog/digest'),
+                               callback=dispatch)
+        responses.add_callback(responses.POST, re.compile(r'https?://node2:\d+/api/v1\.0/catalog/digest'),
+                               callback=dispatch)
+
+        self.cm.upgrade_process()
+
+        # only the entities that differ are requested
+        self.assertSetEqual({'ActionTemplate', 'Software', 'SoftwareServerAssociation'},
+                            {json.loads(body)['entity'] for body in [r.request.body for r in responses.calls
+                                                                     if r.request.method == 'POST']})
+        self.assertDictEqual(self.soft_json, Software.query.get(self.soft_json['id']).to_json())
+        self.assertDictEqual(self.at_json, ActionTemplate.query.get(self.at_json['id']).to_json())
+        self.assertEqual(1, SoftwareServerAssociation.query.count())
+        for name in ('ActionTemplate', 'Software', 'SoftwareServerAssociation'):
+            self.assertEqual(roots[name], CatalogDigest.roots()[name])
+
+    @responses.activate
+    @aioresponses()
+    @patch('dimensigon.domain.entities.get_now')
+    def test_catalog_repair_hard_deleted(self, m, mocked_now):
+        mocked_now.return_value = now2
+        for context in (self.app_context, self.app2_context):
+            with context:
+                o = Orchestration(id='bbbbbbbb-1234-5678-1234-56781234bbb1', name='orch', version=1)
+                o.add_step(id='bbbbbbbb-1234-5678-1234-56781234bbb2', undo=False, action_type=ActionType.SHELL,
+                           code='mkdir {dir}')
+                db.session.add(o)
+                db.session.commit()
+        step = Step.query.get('bbbbbbbb-1234-5678-1234-56781234bbb2')
+        step.orchestration.delete_step(step)
+        db.session.delete(step)
+        db.session.commit()
+        with self.app2_context:
+            digest = CatalogDigest.catalog_digest()
+        m.post(re.compile(r'https?://node2:\d+/healthcheck'),
+               status=200, payload=dict(server=dict(id=self.s2.id, name=self.s2.name),
+                                        version='1',
+                                        catalog_version=now1.strftime(defaults.DATEMARK_FORMAT),
+                                        catalog_digest=digest))
+
+        def dispatch(request):
+            url = urlsplit(request.url)
+            resp = self.client2.open(url.path, method=request.method, query_string=url.query,
+                                     json=json.loads(request.body) if request.body else None,
+                                     headers=self.auth.header)
+            return resp.status_code, {}, resp.data
+
+        responses.add_callback(responses.GET, re.compile(r'https?://node2:\d+/api/v1\.0/catalog/digest'),
+                               callback=dispatch)
+        responses.add_callback(responses.POST, re.compile(r'https?://node2:\d+/api/v1\.0/catalog/digest'),
+                               callback=dispatch)
+
+        self.cm.upgrade_process()
+
+        self.assertNotIn('Step', {json.loads(body)['entity'] for body in [r.request.body for r in responses.calls
+                                                                          if r.request.method == 'POST']})
+        self.assertIsNone(Step.query.get('bbbbbbbb-1234-5678-1234-56781234bbb2'))
+        self.assertEqual(digest, CatalogDigest.catalog_digest())
+
     @responses.activate
     @aioresponses()
     def test_catalog_no_response_from_neighbour(self, m):
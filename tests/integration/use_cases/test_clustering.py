@@ -1,4 +1,6 @@
+import asyncio
 import datetime as dt
+import multiprocessing as mp
 import threading
 from unittest import TestCase, mock
 
@@ -11,7 +13,8 @@ except ImportError:
 
 import dimensigon.web.network as ntwrk
 from dimensigon import defaults
-from dimensigon.use_cases.cluster import ClusterManager, NewEvent, DeathEvent, ZombieEvent, _Entry, AliveEvent
+from dimensigon.use_cases.cluster import ClusterManager, NewEvent, DeathEvent, ZombieEvent, _Entry, AliveEvent, \
+    ClusterTable
 from dimensigon.web import db
 from tests.base import OneNodeMixin
 
@@ -33,7 +36,6 @@ class TestClusterManager(OneNodeMixin, TestCase):
         self.mock_dm = mock.Mock()
         self.mock_dm.flask_app = self.app
         self.mock_dm.engine = db.engine
-        self.mock_dm.manager.dict.return_value = dict()
         self.mock_dm.server_id = self.s1.id
 
         self.cm = ClusterManager("Cluster", startup_event=threading.Event(), shutdown_event=threading.Event(),
@@ -105,15 +107,15 @@ class TestClusterManager(OneNodeMixin, TestCase):
         for _ in range(3):
             self.cm.main_func()
         self.assertListEqual([1, 2, 3, self.s1.id], self.cm.get_alive())
-        self.cm._registry[2].death = True
-        self.cm._registry[3].zombie = True
+        self.cm._registry[2] = _Entry(2, now, death=True)
+        self.cm._registry[3] = _Entry(3, now, zombie=True)
         self.assertListEqual([1, self.s1.id], self.cm.get_alive())
 
     def test_get_zombies(self):
         self.cm.put(1, now)
         self.cm.main_func()
         self.assertListEqual([], self.cm.get_zombies())
-        self.cm._registry[1].zombie = True
+        self.cm._registry[1] = _Entry(1, now, zombie=True)
         self.assertListEqual([1], self.cm.get_zombies())
 
     @mock.patch('dimensigon.use_cases.cluster.get_now')
@@ -126,8 +128,8 @@ class TestClusterManager(OneNodeMixin, TestCase):
             self.cm.main_func()
         self.assertListEqual([(1, now, False), (2, now, False), (3, now, False), (self.s1.id, now, False)],
                              self.cm.get_cluster())
-        self.cm._registry[2].death = True
-        self.cm._registry[3].zombie = True
+        self.cm._registry[2] = _Entry(2, now, death=True)
+        self.cm._registry[3] = _Entry(3, now, zombie=True)
 
         self.assertListEqual([(1, now, False), (2, now, True), (3, now, False), (self.s1.id, now, False)],
                              self.cm.get_cluster())
@@ -149,19 +151,19 @@ class TestClusterManager(OneNodeMixin, TestCase):
         self.assertTrue(3 in self.cm)
         self.assertTrue(self.s1.id in self.cm)
 
-        self.cm._registry[2].death = True
-        self.cm._registry[3].zombie = True
+        self.cm._registry[2] = _Entry(2, now, death=True)
+        self.cm._registry[3] = _Entry(3, now, zombie=True)
 
         self.assertTrue(1 in self.cm)
         self.assertFalse(2 in self.cm)
         self.assertFalse(3 in self.cm)
         self.assertTrue(self.s1.id in self.cm)
 
-    @mock.patch('dimensigon.use_cases.cluster.threading', )
+    @mock.patch('dimensigon.use_cases.cluster.timer_wheel')
     @mock.patch('dimensigon.use_cases.cluster.ntwrk.parallel_requests', spec=AsyncMock)
     @mock.patch('dimensigon.use_cases.cluster.Server.get_neighbours')
     @mock.patch('dimensigon.use_cases.cluster.get_root_auth')
-    def test__send_data(self, mock_get_root_auth, mock_get_neighbours, mock_parallel_requests, mock_threading):
+    def test__send_data(self, mock_get_root_auth, mock_get_neighbours, mock_parallel_requests, mock_timer_wheel):
         async def parallel_responses(responses):
             return responses
 
@@ -221,9 +223,9 @@ class TestClusterManager(OneNodeMixin, TestCase):
         self.cm._route_initiated = mock.Mock()
         self.cm._notify_cluster_in()
         self.cm.main_func()
-        self.assertDictEqual({1: _Entry(id=1, keepalive=now, death=False),
-                              2: _Entry(id=2, keepalive=now, death=False)},
-                             self.cm._registry)
+        self.assertListEqual([_Entry(id=1, keepalive=now, death=False),
+                              _Entry(id=2, keepalive=now, death=False)],
+                             self.cm._registry.values())
 
         routes = [s2.route.to_json()]
         mock_post.assert_called_once_with(s2, 'api_1_0.cluster_in', view_data=dict(server_id=str(self.s1.id)),
@@ -267,3 +269,157 @@ class TestClusterManager(OneNodeMixin, TestCase):
             mock_parallel_requests.reset_mock()
             self.cm._notify_cluster_out()
             mock_parallel_requests.assert_not_called()
+
+
+    @mock.patch('dimensigon.use_cases.cluster.timer_wheel')
+    @mock.patch('dimensigon.use_cases.cluster.ntwrk.parallel_requests', spec=AsyncMock)
+    @mock.patch('dimensigon.use_cases.cluster.Server.get_neighbours')
+    @mock.patch('dimensigon.use_cases.cluster.get_root_auth')
+    def test__send_data_gossip(self, mock_get_root_auth, mock_get_neighbours, mock_parallel_requests,
+                               mock_timer_wheel):
+        async def parallel_responses(responses):
+            return responses
+
+        neighbours = [Server(f'node{i}', port=5000) for i in range(5)]
+        mock_get_neighbours.return_value = neighbours
+        self.cm.gossip_fanout = 2
+        self.cm.retransmit_mult = 1
+
+        for i in range(3):
+            self.cm.put(i + 1, now)
+            self.cm.main_func()
+
+        # limit = ceil(log2(3 + 1)) rounds
+        for _ in range(2):
+            self.assertEqual(3, len(self.cm._buffer))
+            mock_parallel_requests.return_value = parallel_responses([ntwrk.Response(code=200)])
+            self.cm._send_data()
+            peers = mock_parallel_requests.call_args[0][0]
+            self.assertEqual(2, len(peers))
+            self.assertTrue(set(peers).issubset(neighbours))
+            self.assertEqual(3, len(mock_parallel_requests.call_args[1]['json']))
+
+        self.assertEqual(0, len(self.cm._buffer))
+        self.assertEqual(2, mock_parallel_requests.call_count)
+
+        with self.subTest("Entry updated restarts its transmissions"):
+            self.cm.put(1, now + dt.timedelta(minutes=1))
+            self.cm.main_func()
+            mock_parallel_requests.return_value = parallel_responses([ntwrk.Response(code=200)])
+            self.cm._send_data()
+            self.cm.put(1, now + dt.timedelta(minutes=2))
+            self.cm.main_func()
+            self.assertNotIn(1, self.cm._transmissions)
+            self.assertEqual(now + dt.timedelta(minutes=2), self.cm._buffer[1].keepalive)
+
+    def test__suspect(self):
+        async def probe(value):
+            if isinstance(value, Exception):
+                raise value
+            return value
+
+        with mock.patch.object(self.cm, '_async_probe', new=mock.Mock()) as mock_async_probe:
+            mock_async_probe.return_value = probe(now + dt.timedelta(minutes=1))
+            self.cm._suspect(1, now)
+            self.assertEqual((1, now + dt.timedelta(minutes=1), False), self.cm.queue.get(block=True, timeout=5))
+
+            mock_async_probe.return_value = probe(None)
+            self.cm._suspect(1, now)
+            self.assertEqual((1, now, None, True), self.cm.queue.get(block=True, timeout=5))
+
+            mock_async_probe.return_value = probe(Exception())
+            self.cm._suspect(1, now)
+            self.assertEqual((1, now, None, True), self.cm.queue.get(block=True, timeout=5))
+
+            self.cm.probe_peers = 0
+            mock_async_probe.reset_mock()
+            self.cm._suspect(1, now)
+            self.assertEqual((1, now, None, True), self.cm.queue.get(block=True, timeout=5))
+            mock_async_probe.assert_not_called()
+
+    def test__suspect_does_not_wait_probe(self):
+        answer = threading.Event()
+
+        async def probe(ident):
+            while not answer.is_set():
+                await asyncio.sleep(0.01)
+            return now + dt.timedelta(minutes=ident)
+
+        with mock.patch.object(self.cm, '_async_probe', side_effect=probe):
+            self.cm._suspect(1, now)
+            self.cm._suspect(2, now)
+            # probes do not hold the loop used to send data
+            self.assertTrue(self.cm._loop_lock.acquire(blocking=False))
+            self.cm._loop_lock.release()
+            self.assertTrue(self.cm.queue.empty())
+
+            answer.set()
+            self.assertSetEqual({(1, now + dt.timedelta(minutes=1), False), (2, now + dt.timedelta(minutes=2), False)},
+                                {self.cm.queue.get(block=True, timeout=5) for _ in range(2)})
+
+    @mock.patch('dimensigon.use_cases.cluster.ntwrk.async_get', spec=AsyncMock)
+    @mock.patch('dimensigon.use_cases.cluster.async_probe', spec=AsyncMock)
+    @mock.patch('dimensigon.use_cases.cluster.Server.get_neighbours')
+    @mock.patch('dimensigon.use_cases.cluster.get_root_auth')
+    def test__async_probe(self, mock_get_root_auth, mock_get_neighbours, mock_async_probe, mock_async_get):
+        async def response(value):
+            return value
+
+        s2 = Server('node2', port=5000, id='00000000-0000-0000-0000-000000000002')
+        s3 = Server('node3', port=5000, id='00000000-0000-0000-0000-000000000003')
+        db.session.add_all([s2, s3])
+        db.session.commit()
+        mock_get_neighbours.return_value = [s2, s3]
+        self.cm.put(s3.id, now)
+        self.cm.main_func()
+
+        with self.subTest("Node answers directly"):
+            mock_async_probe.return_value = response(now)
+            self.assertEqual(now, self.cm._run(self.cm._async_probe(s2.id)))
+            mock_async_get.assert_not_called()
+
+        with self.subTest("Node answers through a peer"):
+            mock_async_probe.return_value = response(None)
+            mock_async_get.return_value = response(
+                ntwrk.Response(code=200, msg={'keepalive': now.strftime(defaults.DATEMARK_FORMAT)}))
+            self.assertEqual(now, self.cm._run(self.cm._async_probe(s2.id)))
+            mock_async_get.assert_called_once_with(s3, 'api_1_0.cluster_probe', view_data=dict(server_id=s2.id),
+                                                   auth=mock_get_root_auth.return_value, timeout=20)
+
+        with self.subTest("Node does not answer"):
+            mock_async_probe.return_value = response(None)
+            mock_async_get.return_value = response(ntwrk.Response(code=200, msg={'keepalive': None}))
+            self.assertIsNone(self.cm._run(self.cm._async_probe(s2.id)))
+
+        with self.subTest("Unknown node"):
+            self.assertIsNone(self.cm._run(self.cm._async_probe('unknown')))
+
+class TestClusterTable(TestCase):
+
+    def test_shared_between_processes(self):
+        table = ClusterTable(size=2)
+
+        def write():
+            table['aaaaaaaa-1234-5678-1234-56781234aaa1'] = _Entry('aaaaaaaa-1234-5678-1234-56781234aaa1', now)
+            table[2] = _Entry(2, now, death=True)
+            table[2] = _Entry(2, now + dt.timedelta(minutes=1), zombie=True)
+
+        p = mp.get_context('fork').Process(target=write)
+        p.start()
+        p.join(5)
+
+        self.assertEqual(2, len(table))
+        self.assertListEqual([_Entry('aaaaaaaa-1234-5678-1234-56781234aaa1', now),
+                              _Entry(2, now + dt.timedelta(minutes=1), zombie=True)], table.values())
+        self.assertEqual(_Entry(2, now + dt.timedelta(minutes=1), zombie=True), table.get(2))
+        self.assertIn(2, table)
+        self.assertIsNone(table.get(3))
+
+    def test_full(self):
+        table = ClusterTable(size=1)
+        table[1] = _Entry(1, now)
+        table[1] = _Entry(1, now, death=True)
+
+        with self.assertRaises(ValueError):
+            table[2] = _Entry(2, now)
+        self.assertListEqual([_Entry(1, now, death=True)], table.values())
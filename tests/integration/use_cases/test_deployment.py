@@ -1,4 +1,6 @@
 import datetime
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase, mock
 
@@ -310,6 +312,64 @@ class TestCompositeCommand(TestCase):
                              , cc.result)
 
 
+    def _imp(self, execute):
+        imp = mock.Mock()
+        imp.execute.side_effect = lambda *args, **kwargs: CompletedProcess(success=execute(), stdout='', stderr='',
+                                                                          rc=0, start_time=START, end_time=END)
+        return imp
+
+    def test_invoke_runs_command_when_its_parents_finish(self):
+        child_done = threading.Event()
+
+        c1 = Command(implementation=self._imp(lambda: child_done.wait(2)), var_context=self.mock_context, id_=1)
+        c2 = Command(implementation=self._imp(lambda: True), var_context=self.mock_context, id_=2)
+        c3 = Command(implementation=self._imp(lambda: True), var_context=self.mock_context, id_=3)
+        c4 = Command(implementation=self._imp(lambda: child_done.set() or True), var_context=self.mock_context,
+                     id_=4)
+
+        cc = CompositeCommand({c1: [c2], c3: [c4]}, stop_on_error=False, stop_undo_on_error=False)
+
+        # c4 does not wait for c1 to finish as it only depends on c3
+        self.assertTrue(cc.invoke(timeout=5))
+        self.assertTrue(c2.success)
+
+    def test_invoke_max_workers(self):
+        lock = threading.Lock()
+        running = []
+        max_running = []
+
+        def execute():
+            with lock:
+                running.append(1)
+                max_running.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+            return True
+
+        commands = [Command(implementation=self._imp(execute), var_context=self.mock_context, id_=i)
+                    for i in range(4)]
+
+        cc = CompositeCommand({c: [] for c in commands}, stop_on_error=False, max_workers=2)
+
+        self.assertTrue(cc.invoke())
+        self.assertEqual(2, max(max_running))
+
+    def test_invoke_exception(self):
+        imp = mock.Mock()
+        imp.execute.side_effect = RuntimeError
+
+        c1 = Command(implementation=imp, var_context=self.mock_context, id_=1)
+        c2 = Command(implementation=self.mocked_imp_succ, var_context=self.mock_context, id_=2)
+        c3 = Command(implementation=self.mocked_imp_succ, var_context=self.mock_context, id_=3)
+
+        cc = CompositeCommand({c1: [c3], c2: [c3]}, stop_on_error=True)
+
+        self.assertFalse(cc.invoke())
+        # c2 was already running when c1 failed
+        self.assertEqual(1, self.mocked_imp_succ.execute.call_count)
+
+
 class TestCreateCmdFromOrchestration2(TestCase):
 
     def setUp(self):
@@ -11,7 +11,8 @@ import dimensigon.use_cases
 from dimensigon.domain.entities import ActionTemplate, Server, Software, SoftwareServerAssociation, Scope
 from dimensigon.domain.entities.bootstrap import set_initial
 from dimensigon.domain.entities.user import ROOT
-from dimensigon.use_cases.operations import RequestOperation, NativeWaitOperation, NativeSoftwareSendOperation
+from dimensigon.use_cases.operations import RequestOperation, NativeWaitOperation, NativeSoftwareSendOperation, \
+    compile_template
 from dimensigon.web import db, errors
 from dimensigon.web.network import Response
 from tests.base import FlaskAppMixin, TestDimensigonBase
@@ -345,3 +346,29 @@ class TestShellOperation(TestCase):
         self.assertIsNone(cp.stdout)
         self.assertEqual('Timeout of 0.01 seconds while executing shell', cp.stderr)
         self.assertIsNone(cp.rc)
+
+
+class TestCompiledOperation(TestCase):
+
+    def test_rpl_params(self):
+        compile_template.cache_clear()
+        for i in range(3):
+            o = dimensigon.use_cases.operations.TestOperation('echo {{ input.message }} {{ env.server }}')
+            self.assertEqual(f'echo message{i} node1', o.rpl_params(input={'message': f'message{i}'},
+                                                                    env={'server': 'node1'}))
+        # code is compiled once for every operation with the same code
+        self.assertEqual(1, compile_template.cache_info().misses)
+        self.assertEqual(2, compile_template.cache_info().hits)
+
+    def test_evaluate_result(self):
+        context = mock.MagicMock()
+        o = dimensigon.use_cases.operations.TestOperation('', expected_stdout=r'^id=(?P<id>\d+)$', expected_stderr='warning', expected_rc=0)
+
+        cp = o.evaluate_result(dimensigon.use_cases.operations.CompletedProcess(stdout='id=12', stderr='warning',
+                                                                                 rc=0), context)
+        self.assertTrue(cp.success)
+        context.set.assert_called_once_with('id', '12')
+
+        cp = o.evaluate_result(dimensigon.use_cases.operations.CompletedProcess(stdout='id=', stderr='warning',
+                                                                                 rc=0), context)
+        self.assertFalse(cp.success)
@@ -4,13 +4,14 @@ from unittest import mock
 from unittest.mock import patch
 
 from aioresponses import aioresponses
+from sqlalchemy import event
 from flask import url_for
 
 from dimensigon.domain.entities import Server, Gate, Route
 from dimensigon.domain.entities.route import RouteContainer
 from dimensigon.use_cases.routing import RouteManager
 from dimensigon.utils import asyncio
-from dimensigon.web import db
+from dimensigon.web import db, network as ntwrk
 from tests.base import TestDimensigonBase
 
 
@@ -1439,3 +1440,91 @@ class TestRouteManager(TestDimensigonBase):
                                                             ]})
 
         self.assertDictEqual({}, new_routes)
+
+    def test__route_table_merge_incremental(self):
+        s2 = Server(id='00000000-0000-0000-0000-000000000002', name='node2')
+        g2 = Gate(id='00000000-0000-0000-0000-000000000012', server=s2, port=5002, dns=s2.name)
+        Route(s2, g2, cost=0)
+        s3 = Server(id='00000000-0000-0000-0000-000000000003', name='node3')
+        g3 = Gate(id='00000000-0000-0000-0000-000000000013', server=s3, port=5003, dns=s3.name)
+        Route(s3, g3, cost=0)
+        s4 = Server(id='00000000-0000-0000-0000-000000000004', name='node4')
+        g4 = Gate(id='00000000-0000-0000-0000-000000000014', server=s4, port=5004, dns=s4.name)
+        db.session.add_all([s2, s3, s4])
+        db.session.commit()
+
+        def response(server, cost):
+            return ntwrk.Response(code=200, msg={'server_id': server.id, 'route_list': [
+                dict(destination_id=s4.id, gate_id=None, proxy_server_id=None, cost=cost)]})
+
+        changed_routes = self.rm._route_table_merge({s2: response(s2, 1), s3: response(s3, 2)})
+
+        self.assertDictEqual({s4: RouteContainer(s2, None, 2)}, changed_routes)
+
+        # same tables do not evaluate destinations again
+        with patch.object(self.rm._graph, 'best', wraps=self.rm._graph.best) as mocked_best:
+            changed_routes = self.rm._route_table_merge({s2: response(s2, 1), s3: response(s3, 2)})
+        self.assertDictEqual({}, changed_routes)
+        mocked_best.assert_not_called()
+
+        changed_routes = self.rm._route_table_merge({s2: response(s2, 1), s3: response(s3, 0)})
+
+        self.assertDictEqual({s4: RouteContainer(s3, None, 1)}, changed_routes)
+
+        # routes from a neighbour that does not answer are discarded
+        changed_routes = self.rm._route_table_merge({s2: response(s2, 1),
+                                                     s3: ntwrk.Response(code=500, msg='error')})
+
+        self.assertDictEqual({s4: RouteContainer(s2, None, 2)}, changed_routes)
+
+    @patch('dimensigon.use_cases.routing.check_host')
+    @patch('dimensigon.use_cases.routing.ntwrk.ping')
+    def test__update_route_table_from_data_incremental(self, mocked_ping, mocked_check_host):
+        s2 = Server(id='00000000-0000-0000-0000-000000000002', name='node2')
+        g2 = Gate(id='00000000-0000-0000-0000-000000000012', server=s2, port=5002, dns=s2.name)
+        Route(s2, g2, cost=0)
+        s3 = Server(id='00000000-0000-0000-0000-000000000003', name='node3')
+        g3 = Gate(id='00000000-0000-0000-0000-000000000013', server=s3, port=5003, dns=s3.name)
+        s4 = Server(id='00000000-0000-0000-0000-000000000004', name='node4')
+        g4 = Gate(id='00000000-0000-0000-0000-000000000014', server=s4, port=5004, dns=s4.name)
+        db.session.add_all([s2, s3, s4])
+        db.session.commit()
+
+        data = {'server_id': s2.id, 'route_list': [
+            dict(destination_id=s3.id, gate_id=g3.id, proxy_server_id=None, cost=0),
+            dict(destination_id=s4.id, gate_id=None, proxy_server_id=s3.id, cost=1)]}
+        updates = []
+
+        def count_updates(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('UPDATE "L_route"') or statement.startswith('UPDATE L_route'):
+                updates.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count_updates)
+        try:
+            changed_routes = self.rm._update_route_table_from_data(data)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count_updates)
+
+        self.assertDictEqual({s3: RouteContainer(s2, None, 1), s4: RouteContainer(s2, None, 2)}, changed_routes)
+        # changed routes are written with one statement
+        self.assertEqual(1, len(updates))
+        self.assertEqual(s2, s3.route.proxy_server)
+        self.assertEqual(2, s4.route.cost)
+
+        # same routes do not evaluate destinations again
+        with patch.object(self.rm._graph, 'best', wraps=self.rm._graph.best) as mocked_best:
+            changed_routes = self.rm._update_route_table_from_data(data)
+        self.assertDictEqual({}, changed_routes)
+        mocked_best.assert_not_called()
+
+        # routes through a lost neighbour are reset and evaluated again on the next merge
+        mocked_check_host.return_value = False
+        changed_routes = self.rm._update_route_table_from_data(
+            {'server_id': s3.id, 'route_list': [dict(destination_id=s2.id, gate_id=None, proxy_server_id=None,
+                                                     cost=None)]})
+
+        self.assertDictEqual({s2: RouteContainer(None, None, None), s3: RouteContainer(None, None, None),
+                              s4: RouteContainer(None, None, None)}, changed_routes)
+        self.assertEqual(0, mocked_ping.call_count)
+        self.assertSetEqual({s2.id, s3.id, s4.id}, self.rm._graph.pop_invalidated())
+        self.assertListEqual([], self.rm._graph.neighbours)
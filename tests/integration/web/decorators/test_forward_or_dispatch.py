@@ -1,11 +1,15 @@
+import gzip
+import io
 from unittest import TestCase, mock
 from unittest.mock import patch, MagicMock
 
 import requests
 import responses
 from flask import Flask
+from urllib3 import HTTPResponse
 
 from dimensigon.domain.entities import Server, Route
+from dimensigon.network.resolver import Resolver
 from dimensigon.web import db, errors
 from dimensigon.web.decorators import forward_or_dispatch
 from tests.base import ValidateResponseMixin
@@ -219,18 +223,36 @@ class TestForwardOrDispatch(TestCase, ValidateResponseMixin):
 
         self.validate_error_response(resp, errors.EntityNotFound('Server', 'bbbbbbbb-1234-5678-1234-56781234bbb5'))
 
-    @patch('dimensigon.web.decorators.socket.gethostbyname')
     @patch('dimensigon.web.decorators.g')
-    def test_forward_or_dispatch_dns(self, mock_g, mock_gethostbyname):
+    @responses.activate
+    def test_forward_or_dispatch_raw(self, mock_g):
+        mock_g.server = MagicMock(id=self.srv1.id)
+        content = gzip.compress(b'response' * 1000)
+        responses.add(responses.POST, 'https://192.168.1.9:7123/', body=content, status=201,
+                      headers={'Content-Encoding': 'gzip', 'Content-Length': str(len(content))})
+
+        body = bytes(range(256)) * 1000
+        resp = self.client.post('/', data=body, content_type='application/octet-stream',
+                                headers={'D-Destination': self.srv2.id, 'Accept-Encoding': 'gzip'})
+
+        # response is relayed without decoding it
+        self.assertEqual(201, resp.status_code)
+        self.assertEqual(content, resp.get_data())
+        self.assertEqual('gzip', resp.headers['Content-Encoding'])
+        self.assertEqual(str(len(content)), resp.headers['Content-Length'])
+        # body is relayed as it came
+        request = responses.calls[0].request
+        self.assertEqual(body, b''.join(request.body))
+        self.assertEqual(str(len(body)), request.headers['Content-Length'])
+        self.assertEqual('application/octet-stream', request.headers['Content-Type'])
+        self.assertEqual(':bbbbbbbb-1234-5678-1234-56781234bbb1', request.headers['D-Source'])
+        self.assertNotIn('Transfer-Encoding', request.headers)
+
+    @patch('dimensigon.web.decorators.resolver', Resolver(resolve={'server2': '10.1.2.3'}.get))
+    @patch('dimensigon.web.decorators.g')
+    def test_forward_or_dispatch_dns(self, mock_g):
         mock_g.server = MagicMock(id=self.srv1.id)
 
-        def gethostbyname(dns: str):
-            if dns == 'server2':
-                return '10.1.2.3'
-            else:
-                return None
-
-        mock_gethostbyname.side_effect = gethostbyname
         self.srv2.add_new_gate('server2', 7124)
         db.session.commit()
 
@@ -242,18 +264,19 @@ class TestForwardOrDispatch(TestCase, ValidateResponseMixin):
 
         self.assertEqual(0, len(self.srv2.hidden_gates))
 
-    @patch('dimensigon.web.decorators.requests.request', autospec=True)
+    @patch('dimensigon.web.decorators.pool')
     @patch('dimensigon.web.decorators.g')
-    def test_forward_or_dispatch_proxy_request(self, mock_g, mock_request):
+    def test_forward_or_dispatch_proxy_request(self, mock_g, mock_pool):
         mock_g.server = MagicMock(id=self.srv1.id)
 
         def request(*args, **kwargs):
             r = requests.Response()
-            r._content = kwargs['headers'].get('d-source')
+            r.raw = HTTPResponse(body=io.BytesIO(kwargs['headers'].get('d-source').encode()),
+                                 preload_content=False)
             r.status_code = 222
             return r
 
-        mock_request.side_effect = request
+        mock_pool.session.return_value.request.side_effect = request
 
         # check if request is forwarded to the server without d-source header
         resp = self.client.post('/', json={'data': None},
@@ -278,11 +301,11 @@ class TestForwardOrDispatch(TestCase, ValidateResponseMixin):
 
         self.validate_error_response(resp, errors.UnreachableDestination(self.srv2, self.srv1))
 
-    @patch('dimensigon.web.decorators.requests.request', autospec=True)
+    @patch('dimensigon.web.decorators.pool')
     @patch('dimensigon.web.decorators.g')
-    def test_forward_or_dispatch_error_proxying(self, mock_g, mock_request):
+    def test_forward_or_dispatch_error_proxying(self, mock_g, mock_pool):
         mock_g.server = MagicMock(id=self.srv1.id)
-        mock_request.side_effect = requests.exceptions.ConnectionError('error')
+        mock_pool.session.return_value.request.side_effect = requests.exceptions.ConnectionError('error')
 
         # check if request is forwarded to the server
         resp = self.client.post('/', json={'data': None},
@@ -3,6 +3,7 @@ from unittest import TestCase
 from dimensigon.domain.entities import Server
 from dimensigon.web import create_app, db
 from dimensigon.web import errors
+from dimensigon.web.helpers import absent_identities
 
 
 class TestBaseQuery(TestCase):
@@ -25,3 +26,18 @@ class TestBaseQuery(TestCase):
                 Server.query.first_or_raise()
 
             self.assertEqual(cm.exception.args, ("Server",))
+
+    def test_absent_identities(self):
+        with self.app.app_context():
+            db.create_all()
+            s = Server('node1', port=5000)
+            db.session.add(s)
+            db.session.commit()
+
+            with absent_identities(Server, {(s.id,)}) as absent:
+                self.assertIsNone(Server.query.get(s.id))
+                self.assertIsNone(db.session.query(Server).get(s.id))
+                absent.discard((s.id,))
+                self.assertEqual(s, Server.query.get(s.id))
+
+            self.assertEqual(s, Server.query.get(s.id))
@@ -0,0 +1,35 @@
+from unittest import TestCase
+
+from flask import Flask, url_for
+
+from dimensigon.web import create_app
+from dimensigon.web.url_builder import url_path
+
+
+class TestUrlPath(TestCase):
+
+    def setUp(self) -> None:
+        self.app = create_app('test')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self) -> None:
+        self.app_context.pop()
+
+    def test_url_path(self):
+        for endpoint, values in [('root.ping', {}),
+                                 ('api_1_0.serverresource', dict(server_id='00000000-0000-0000-0000-000000000001')),
+                                 ('api_1_0.catalog_digest', dict(entity='Server', buckets=[1, 2])),
+                                 ('api_1_0.serverlist', dict(params='human'))]:
+            with self.app.test_request_context():
+                expected = url_for(endpoint, **values)
+            self.assertEqual(expected, url_path(endpoint, **values))
+            # memoized
+            self.assertEqual(expected, url_path(endpoint, **values))
+
+    def test_url_path_app(self):
+        app = Flask('other')
+        app.add_url_rule('/other/<id>', 'other', lambda id: id)
+        with app.app_context():
+            self.assertEqual('/other/1', url_path('other', id=1))
+        self.assertEqual('/ping', url_path('root.ping'))
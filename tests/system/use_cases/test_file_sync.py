@@ -1,14 +1,18 @@
+import base64
 import os
 import queue
 import threading
+import zlib
 from unittest import mock
 
 from pyfakefs.fake_filesystem_unittest import TestCase
+from watchdog.events import FileModifiedEvent, FileCreatedEvent
 
-from dimensigon.domain.entities import File, FileServerAssociation
-from dimensigon.use_cases.file_sync import FileSync
+from dimensigon.domain.entities import File, FileServerAssociation, Log
+from dimensigon.use_cases.file_sync import FileSync, LogEventHandler
 from dimensigon.utils.helpers import get_now
 from dimensigon.web import db
+from dimensigon.web.network import Response
 from tests import base
 
 now = get_now()
@@ -151,3 +155,103 @@ class TestFileSync(base.VirtualNetworkMixin, base.ThreeNodeMixin,  TestCase):
         self.file_sync.main_func()
 
         self.assertFalse(os.path.exists(os.path.join(self.dest_path2, self.filename) + 'x'))
+
+
+class TestLogFederation(base.TwoNodeMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.setUpPyfakefs()
+        self.fs.create_file('/node1/logs/app.log', contents='line 1\n')
+        self.sent = []
+
+        async def async_post(server, view_or_url, view_data=None, json=None, **kwargs):
+            self.sent.append(zlib.decompress(base64.b64decode(json['data'])).decode())
+            return Response(msg={}, code=200)
+
+        patcher = mock.patch('dimensigon.use_cases.file_sync.ntwrk.async_post', async_post)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.mock_dm = mock.Mock()
+        self.mock_dm.flask_app = self.app
+        self.mock_dm.engine = db.engine
+        self.mock_dm.cluster_manager.get_alive.return_value = [self.s1.id, self.s2.id]
+        self.mock_dm.server_id = self.s1.id
+        self.mock_dm.config.path.side_effect = lambda *args: os.path.join('/offset', *args)
+
+        with mock.patch('dimensigon.use_cases.file_sync.MPQueue', MPQueue):
+            self.file_sync = FileSync("FileSync", startup_event=threading.Event(), shutdown_event=threading.Event(),
+                                      publish_q=mock.Mock(), event_q=None, dimensigon=self.mock_dm,
+                                      file_sync_period=0, file_watches_refresh_period=3600)
+
+        log = Log(id='aaaaaaaa-1234-5678-1234-56781234aaa1', source_server=self.s1, target='/node1/logs/app.log',
+                  destination_server=self.s2, dest_folder='/node2/logs')
+        db.session.add(log)
+        db.session.commit()
+
+    def tearDown(self) -> None:
+        try:
+            self.file_sync.shutdown()
+        except:
+            pass
+        super().tearDown()
+
+    @mock.patch('dimensigon.use_cases.file_sync.Observer.schedule')
+    def test_log_changed(self, mock_schedule):
+        self.file_sync.startup()
+        self.file_sync.main_func()
+
+        mock_schedule.assert_called_once()
+        handler, path = mock_schedule.call_args[0]
+        self.assertEqual('/node1/logs', path)
+        self.assertListEqual(['line 1\n'], self.sent)
+
+        with open('/node1/logs/app.log', 'a') as fd:
+            fd.write('line 2\n')
+        # events from other files in the folder are discarded
+        handler.on_any_event(FileModifiedEvent('/node1/logs/other.log'))
+        self.assertFalse(self.file_sync._log_event.is_set())
+        handler.on_any_event(FileModifiedEvent('/node1/logs/app.log'))
+        self.assertTrue(self.file_sync._log_event.is_set())
+
+        changed, rescan = self.file_sync._take_changed_logs()
+        self.assertSetEqual({'aaaaaaaa-1234-5678-1234-56781234aaa1'}, changed)
+        self.assertSetEqual(set(), rescan)
+        with mock.patch('dimensigon.use_cases.file_sync.os.walk') as mock_walk:
+            self.file_sync._send_new_data(changed, rescan)
+            mock_walk.assert_not_called()
+
+        self.assertListEqual(['line 1\n', 'line 2\n'], self.sent)
+
+    def test_log_event_handler_folder(self):
+        fs = mock.Mock()
+        log = Log(id='aaaaaaaa-1234-5678-1234-56781234aaa2', source_server=self.s1, target='/var/log',
+                  destination_server=self.s2, include=r'^(app|.*\.log)$', recursive=True)
+        handler = LogEventHandler(log, fs)
+
+        handler.on_any_event(FileModifiedEvent('/var/log/app/access.txt'))
+        fs.log_changed.assert_not_called()
+
+        handler.on_any_event(FileCreatedEvent('/var/log/app/access.log'))
+        fs.log_changed.assert_called_once_with('aaaaaaaa-1234-5678-1234-56781234aaa2', rescan=True)
+
+    @mock.patch('dimensigon.use_cases.file_sync.defaults.LOG_BATCH_DELAY', 0.05)
+    def test_main_loop_log_changed(self):
+        self.file_sync.INTERVAL_SECS = 3600
+        sent = threading.Event()
+        with mock.patch.object(self.file_sync, '_send_new_data', side_effect=lambda *args: sent.set()) as mock_send:
+            th = threading.Thread(target=self.file_sync._main_loop)
+            th.start()
+            try:
+                self.file_sync.log_changed('aaaaaaaa-1234-5678-1234-56781234aaa1')
+                self.file_sync.log_changed('aaaaaaaa-1234-5678-1234-56781234aaa2', rescan=True)
+                self.assertTrue(sent.wait(1))
+            finally:
+                self.file_sync.shutdown_event.set()
+                th.join()
+
+        # changes are sent in one batch
+        mock_send.assert_called_once_with(
+            {'aaaaaaaa-1234-5678-1234-56781234aaa1', 'aaaaaaaa-1234-5678-1234-56781234aaa2'},
+            {'aaaaaaaa-1234-5678-1234-56781234aaa2'})
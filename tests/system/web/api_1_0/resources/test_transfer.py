@@ -1,6 +1,11 @@
 import base64
 import hashlib
 import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
 from unittest import mock
 from unittest.mock import patch
 
@@ -9,6 +14,7 @@ from pyfakefs.fake_filesystem_unittest import TestCase
 
 from dimensigon.domain.entities import Software, SoftwareServerAssociation, Transfer, TransferStatus
 from dimensigon.web import db, errors
+from dimensigon.web.api_1_0.resources.transfer import _chunks_lock
 from tests.base import OneNodeMixin, LockBypassMixin, ValidateResponseMixin
 
 app = mock.MagicMock()
@@ -75,6 +81,42 @@ class TestTransferList(OneNodeMixin, LockBypassMixin, ValidateResponseMixin, Tes
 
         self.assertFalse(os.path.exists(os.path.join('/new_dest_path', self.soft.filename + '_chunk.1')))
 
+    def test_post_create_transfer_in_place(self, mock_app):
+        resp = self.client.post(url_for('api_1_0.transferlist'),
+                                json={"filename": self.filename,
+                                      'size': self.size,
+                                      'checksum': self.checksum,
+                                      'dest_path': self.dest_path,
+                                      'num_chunks': 16,
+                                      'chunk_size': 4}, headers=self.auth.header)
+        self.assertEqual(202, resp.status_code)
+        t: Transfer = Transfer.query.get(resp.get_json().get('id'))
+        self.assertEqual(4, t.chunk_size)
+        self.assertEqual(self.size, os.path.getsize(os.path.join(self.dest_path, self.filename + '.part')))
+
+    def test_post_resume_transfer(self, mock_app):
+        t = Transfer(software=self.filename, size=self.size, checksum=self.checksum, dest_path=self.dest_path,
+                     num_chunks=16, chunk_size=4, status=TransferStatus.TRANSFER_ERROR)
+        t.set_chunk_received(0)
+        db.session.add(t)
+        db.session.commit()
+        self.fs.create_file(os.path.join(self.dest_path, self.filename + '.part'), contents=b'\0' * self.size)
+        json_data = {"filename": self.filename, 'size': self.size, 'checksum': self.checksum,
+                     'dest_path': self.dest_path, 'num_chunks': 16, 'chunk_size': 4, 'resume': True}
+
+        resp = self.client.post(url_for('api_1_0.transferlist'), json=json_data, headers=self.auth.header)
+
+        self.assertEqual(202, resp.status_code)
+        self.assertDictEqual({'id': str(t.id)}, resp.get_json())
+        db.session.refresh(t)
+        self.assertEqual(TransferStatus.IN_PROGRESS, t.status)
+        self.assertEqual(1, t.received_chunks)
+
+        # different chunks can not be resumed
+        resp = self.client.post(url_for('api_1_0.transferlist'), json=dict(json_data, num_chunks=8, chunk_size=8),
+                                headers=self.auth.header)
+        self.assertEqual(409, resp.status_code)
+
     def test_post_create_software_transfer_with_chunks_already_inside(self, mock_app):
         self.fs.create_file(os.path.join(self.dest_path, self.soft.filename + '_chunk.1'))
         resp = self.client.post(url_for('api_1_0.transferlist'),
@@ -295,6 +337,133 @@ class TestTransferResource(OneNodeMixin, LockBypassMixin, ValidateResponseMixin,
             resp.get_json())
         self.assertTrue(os.path.exists(os.path.join(self.dest_path, self.filename)))
 
+    def test_post_transfer_chunk_binary(self):
+        resp = self.client.post(url_for('api_1_0.transferchunkresource', transfer_id=str(self.transfer.id), chunk=3),
+                                data=self.content[12:16],
+                                headers={**self.auth.header, 'Content-Type': 'application/octet-stream'})
+
+        self.assertEqual(201, resp.status_code)
+        db.session.refresh(self.transfer)
+        self.assertDictEqual({'message': f"Chunk 3 from transfer {str(self.transfer.id)} generated successfully"},
+                             resp.get_json())
+        self.assertEqual(TransferStatus.IN_PROGRESS, self.transfer.status)
+        with open(os.path.join(self.dest_path, f"{self.filename}_chunk.3"), 'rb') as fh:
+            self.assertEqual(self.content[12:16], fh.read())
+
+    def test_post_transfer_chunk_binary_one_chunk(self):
+        self.transfer.num_chunks = 1
+        db.session.commit()
+        resp = self.client.post(url_for('api_1_0.transferchunkresource', transfer_id=str(self.transfer.id), chunk=0),
+                                data=self.content,
+                                headers={**self.auth.header, 'Content-Type': 'application/octet-stream'})
+
+        self.assertEqual(201, resp.status_code)
+        db.session.refresh(self.transfer)
+        self.assertEqual(TransferStatus.COMPLETED, self.transfer.status)
+        with open(os.path.join(self.dest_path, self.filename), 'rb') as fh:
+            self.assertEqual(self.content, fh.read())
+
+    def test_post_transfer_chunk_binary_errors(self):
+        resp = self.client.post(url_for('api_1_0.transferchunkresource', transfer_id=str(self.transfer.id), chunk=0),
+                                json={'content': 'abcd'}, headers=self.auth.header)
+        self.assertEqual(400, resp.status_code)
+
+        resp = self.client.post(url_for('api_1_0.transferchunkresource', transfer_id=str(self.transfer.id), chunk=16),
+                                data=b'abcd',
+                                headers={**self.auth.header, 'Content-Type': 'application/octet-stream'})
+        self.assertEqual(400, resp.status_code)
+        self.assertFalse(os.path.exists(os.path.join(self.dest_path, f"{self.filename}_chunk.16")))
+
+        self.transfer.status = TransferStatus.CANCELLED
+        db.session.commit()
+        resp = self.client.post(url_for('api_1_0.transferchunkresource', transfer_id=str(self.transfer.id), chunk=0),
+                                data=b'abcd',
+                                headers={**self.auth.header, 'Content-Type': 'application/octet-stream'})
+        self.assertEqual(410, resp.status_code)
+
+    def _post_chunks_in_place(self, content, chunk_ids, with_checksum=True):
+        for chunk_id in chunk_ids:
+            data = content[chunk_id * 4:chunk_id * 4 + 4]
+            headers = {**self.auth.header, 'Content-Type': 'application/octet-stream'}
+            if with_checksum:
+                headers.update({'D-Checksum': hashlib.md5(data).hexdigest()})
+            resp = self.client.post(url_for('api_1_0.transferchunkresource', transfer_id=str(self.transfer.id),
+                                            chunk=chunk_id), data=data, headers=headers)
+            self.assertEqual(201, resp.status_code)
+
+    def test_put_transfer_file_in_place(self):
+        self.transfer.chunk_size = 4
+        db.session.commit()
+        self.fs.create_file(os.path.join(self.dest_path, f"{self.filename}.part"), contents=b'\0' * self.size)
+
+        self._post_chunks_in_place(self.content, reversed(range(16)))
+        self.assertListEqual([f"{self.filename}.part"], os.listdir(self.dest_path))
+
+        with patch('dimensigon.web.api_1_0.resources.transfer.md5') as mock_md5:
+            resp = self.client.put(url_for('api_1_0.transferresource', transfer_id=str(self.transfer.id)),
+                                   headers=self.auth.header)
+            mock_md5.assert_not_called()
+        self.assertEqual(201, resp.status_code)
+        self.assertListEqual([self.filename], os.listdir(self.dest_path))
+        with open(os.path.join(self.dest_path, self.filename), 'rb') as fh:
+            self.assertEqual(self.content, fh.read())
+
+    def test_put_transfer_file_in_place_without_chunk_checksum(self):
+        self.transfer.chunk_size = 4
+        db.session.commit()
+        self.fs.create_file(os.path.join(self.dest_path, f"{self.filename}.part"), contents=b'\0' * self.size)
+        content = b'abcdefghijklmnopqrstuvwxyzXXXDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
+        self._post_chunks_in_place(content, range(16), with_checksum=False)
+
+        resp = self.client.put(url_for('api_1_0.transferresource', transfer_id=str(self.transfer.id)),
+                               headers=self.auth.header)
+        self.assertEqual(404, resp.status_code)
+        db.session.refresh(self.transfer)
+        self.assertEqual(TransferStatus.CHECKSUM_ERROR, self.transfer.status)
+
+    def test_put_transfer_file_in_place_missing_chunks(self):
+        self.transfer.chunk_size = 4
+        db.session.commit()
+        self.fs.create_file(os.path.join(self.dest_path, f"{self.filename}.part"), contents=b'\0' * self.size)
+
+        self._post_chunks_in_place(self.content, [0, 1, 2])
+
+        resp = self.client.put(url_for('api_1_0.transferresource', transfer_id=str(self.transfer.id)),
+                               headers=self.auth.header)
+        self.assertEqual(404, resp.status_code)
+        self.assertDictEqual({"error": f"Not enough chunks to generate the file"}, resp.get_json())
+
+    def test_post_transfer_chunk_in_place_errors(self):
+        self.transfer.chunk_size = 4
+        db.session.commit()
+        self.fs.create_file(os.path.join(self.dest_path, f"{self.filename}.part"), contents=b'\0' * self.size)
+
+        resp = self.client.post(url_for('api_1_0.transferchunkresource', transfer_id=str(self.transfer.id), chunk=0),
+                                data=b'abcd',
+                                headers={**self.auth.header, 'Content-Type': 'application/octet-stream',
+                                         'D-Checksum': hashlib.md5(b'abce').hexdigest()})
+        self.validate_error_response(resp, errors.TransferChunkError(str(self.transfer.id), 0, "checksum error"))
+
+        resp = self.client.post(url_for('api_1_0.transferchunkresource', transfer_id=str(self.transfer.id), chunk=15),
+                                data=b'9', headers={**self.auth.header, 'Content-Type': 'application/octet-stream'})
+        self.validate_error_response(resp, errors.TransferChunkError(str(self.transfer.id), 15,
+                                                                     "incomplete. Received 1 of 2 bytes"))
+        db.session.refresh(self.transfer)
+        self.assertIsNone(self.transfer.chunk_checksums)
+
+    def test_get_transfer_chunks(self):
+        self.transfer.chunk_size = 4
+        db.session.commit()
+        self.fs.create_file(os.path.join(self.dest_path, f"{self.filename}.part"), contents=b'\0' * self.size)
+        self._post_chunks_in_place(self.content, [0, 1, 5, 15])
+
+        resp = self.client.get(url_for('api_1_0.transferchunklist', transfer_id=str(self.transfer.id)),
+                               headers=self.auth.header)
+
+        self.assertEqual(200, resp.status_code)
+        self.assertDictEqual({'num_chunks': 16, 'received': 4, 'missing': [[2, 5], [6, 15]]}, resp.get_json())
+
     def test_put_transfer_file(self):
         self.transfer.status = TransferStatus.IN_PROGRESS
         db.session.commit()
@@ -402,3 +571,26 @@ class TestTransferResource(OneNodeMixin, LockBypassMixin, ValidateResponseMixin,
             {"error": f"Error on transfer '{str(self.transfer.id)}': Final file size does not match expected size"},
             resp.get_json())
         self.assertEqual(self.transfer.status, TransferStatus.SIZE_ERROR)
+
+
+class TestChunksLock(unittest.TestCase):
+
+    def test_lock_between_processes(self):
+        with tempfile.TemporaryDirectory() as dest_path:
+            script = ("import fcntl, os, sys, time\n"
+                      "fd = os.open(sys.argv[1], os.O_RDONLY)\n"
+                      "fcntl.flock(fd, fcntl.LOCK_EX)\n"
+                      "print('locked', flush=True)\n"
+                      "time.sleep(0.5)\n")
+            proc = subprocess.Popen([sys.executable, '-c', script, dest_path], stdout=subprocess.PIPE)
+            try:
+                self.assertEqual(b'locked\n', proc.stdout.readline())
+                start = time.time()
+                with _chunks_lock(mock.Mock(dest_path=dest_path)):
+                    elapsed = time.time() - start
+            finally:
+                proc.wait()
+                proc.stdout.close()
+
+        # waits until the other process releases the lock
+        self.assertGreater(elapsed, 0.2)
@@ -45,8 +45,8 @@ class TestLocker(OneNodeMixin, TestCase):
 
         self.assertEqual(State.UNLOCKED, l.state)
 
-    @mock.patch('dimensigon.web.api_1_0.urls.locker.threading')
-    def test_lock(self, mock_thread):
+    @mock.patch('dimensigon.web.api_1_0.urls.locker.timer_wheel')
+    def test_lock(self, mock_timer_wheel):
 
         resp = self.client.post(url_for('api_1_0.locker_prevent'),
                                 json=dict(scope=Scope.CATALOG.name, datemark=self.datemark,
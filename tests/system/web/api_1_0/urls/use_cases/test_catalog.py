@@ -4,7 +4,8 @@ from unittest.mock import patch
 from flask import url_for
 
 from dimensigon import defaults
-from dimensigon.domain.entities import Server, ActionTemplate, ActionType
+from dimensigon.domain.entities import Server, ActionTemplate, ActionType, CatalogDigest
+from dimensigon.domain.entities.catalog import digest_key, digest_bucket, to_datemark
 from dimensigon.web import db
 from tests.base import TestDimensigonBase
 
@@ -41,3 +42,88 @@ class TestCatalog(TestDimensigonBase):
 
         self.assertDictEqual({'ActionTemplate': [at2.to_json()]},
                              resp.get_json())
+
+    @patch('dimensigon.web.api_1_0.urls.use_cases.get_distributed_entities')
+    @patch('dimensigon.domain.entities.get_now')
+    def test_catalog_pages(self, mock_now, mock_get):
+        mock_get.return_value = [('ActionTemplate', ActionTemplate), ('Server', Server)]
+        data_mark = dt.datetime(2019, 4, 1, tzinfo=dt.timezone.utc).strftime(defaults.DATEMARK_FORMAT)
+
+        ats = []
+        for i in range(3):
+            mock_now.return_value = dt.datetime(2019, 4, 2, i, tzinfo=dt.timezone.utc)
+            at = ActionTemplate(name=f'ActionTest{i}', version=1, action_type=ActionType.ORCHESTRATION, code='')
+            db.session.add(at)
+            db.session.commit()
+            ats.append(at.to_json())
+        mock_now.return_value = dt.datetime(2019, 4, 2, 3, tzinfo=dt.timezone.utc)
+        s = Server('node2', port=5000)
+        db.session.add(s)
+        db.session.commit()
+        s_json = s.to_json()
+
+        resp = self.client.get(url_for('api_1_0.catalog', data_mark=data_mark, limit=2), headers=self.auth.header)
+
+        self.assertEqual(200, resp.status_code)
+        self.assertDictEqual({'ActionTemplate': ats[:2], 'Server': []}, resp.get_json()['catalog'])
+        cursor = resp.get_json()['cursor']
+        self.assertIsNotNone(cursor)
+
+        resp = self.client.get(url_for('api_1_0.catalog', data_mark=data_mark, limit=2, cursor=cursor),
+                               headers=self.auth.header)
+
+        self.assertDictEqual({'ActionTemplate': ats[2:], 'Server': [s_json]}, resp.get_json()['catalog'])
+        cursor = resp.get_json()['cursor']
+
+        # a full page is always followed by another request
+        resp = self.client.get(url_for('api_1_0.catalog', data_mark=data_mark, limit=2, cursor=cursor),
+                               headers=self.auth.header)
+
+        self.assertDictEqual({'ActionTemplate': [], 'Server': []}, resp.get_json()['catalog'])
+        self.assertIsNone(resp.get_json()['cursor'])
+
+        resp = self.client.get(url_for('api_1_0.catalog', data_mark=data_mark, limit=2, cursor='invalid'),
+                               headers=self.auth.header)
+
+        self.assertEqual(400, resp.status_code)
+
+    @patch('dimensigon.domain.entities.get_now')
+    def test_catalog_digest(self, mock_now):
+        mock_now.return_value = dt.datetime(2019, 4, 2, tzinfo=dt.timezone.utc)
+        at = ActionTemplate(name='ActionTest1', version=1, action_type=ActionType.ORCHESTRATION, code='')
+        db.session.add(at)
+        db.session.commit()
+        key = digest_key([at.id])
+        bucket = digest_bucket('ActionTemplate', key)
+
+        resp = self.client.get(url_for('api_1_0.catalog_digest'), headers=self.auth.header)
+
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(CatalogDigest.catalog_digest(), resp.get_json()['digest'])
+        self.assertIn('ActionTemplate', resp.get_json()['roots'])
+
+        resp = self.client.get(url_for('api_1_0.catalog_digest', entity='ActionTemplate'), headers=self.auth.header)
+
+        leaves = resp.get_json()['leaves']
+        self.assertEqual(defaults.CATALOG_DIGEST_BUCKETS, len(leaves))
+        self.assertNotEqual(0, leaves[bucket])
+
+        # requester does not have the row
+        rows = {digest_key([a.id]): to_datemark(a.last_modified_at) for a in ActionTemplate.query.all() if
+                a.id != at.id}
+        resp = self.client.post(url_for('api_1_0.catalog_digest'), headers=self.auth.header,
+                                json={'entity': 'ActionTemplate', 'buckets': [bucket], 'rows': rows})
+
+        self.assertDictEqual({'ActionTemplate': [at.to_json()]}, resp.get_json())
+
+        # requester has the row up to date
+        resp = self.client.post(url_for('api_1_0.catalog_digest'), headers=self.auth.header,
+                                json={'entity': 'ActionTemplate', 'buckets': [bucket],
+                                      'rows': dict(rows, **{key: to_datemark(at.last_modified_at)})})
+
+        self.assertDictEqual({'ActionTemplate': []}, resp.get_json())
+
+        resp = self.client.post(url_for('api_1_0.catalog_digest'), headers=self.auth.header,
+                                json={'entity': 'Unknown', 'buckets': [bucket], 'rows': {}})
+
+        self.assertEqual(404, resp.status_code)
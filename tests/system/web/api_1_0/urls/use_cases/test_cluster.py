@@ -0,0 +1,31 @@
+import datetime as dt
+from unittest.mock import patch
+
+from flask import url_for
+
+from dimensigon import defaults
+from tests.base import TestDimensigonBase
+
+
+class TestClusterProbe(TestDimensigonBase):
+
+    @patch('dimensigon.use_cases.cluster.probe')
+    def test_cluster_probe(self, mock_probe):
+        now = dt.datetime(2019, 4, 2, tzinfo=dt.timezone.utc)
+        mock_probe.return_value = now
+
+        resp = self.client.get(url_for('api_1_0.cluster_probe', server_id=self.s1.id), headers=self.auth.header)
+
+        self.assertEqual(200, resp.status_code)
+        self.assertDictEqual({'keepalive': now.strftime(defaults.DATEMARK_FORMAT)}, resp.get_json())
+        self.assertEqual(self.s1, mock_probe.call_args[0][0])
+
+        mock_probe.return_value = None
+        resp = self.client.get(url_for('api_1_0.cluster_probe', server_id=self.s1.id), headers=self.auth.header)
+
+        self.assertDictEqual({'keepalive': None}, resp.get_json())
+
+    def test_cluster_probe_not_found(self):
+        resp = self.client.get(url_for('api_1_0.cluster_probe', server_id='unknown'), headers=self.auth.header)
+
+        self.assertEqual(404, resp.status_code)
@@ -52,6 +52,55 @@ class TestAsyncSendFile(TwoNodeMixin, TestCase):
             self.assertEqual(self.size, os.path.getsize(os.path.join(self.dest_path, self.filename)))
             self.assertEqual(self.checksum, md5(os.path.join(self.dest_path, self.filename)))
 
+    def test_async_send_file_in_place(self):
+        with virtual_network(self.app, self.app2):
+            with self.app2.app_context():
+                transfer = Transfer(software=self.filename,
+                                    size=self.size,
+                                    checksum=self.checksum,
+                                    dest_path=self.dest_path,
+                                    num_chunks=16,
+                                    chunk_size=4,
+                                    status=TransferStatus.WAITING_CHUNKS)
+                db.session.add(transfer)
+                db.session.commit()
+                transfer_id = transfer.id
+            self.fs.create_file(os.path.join(self.dest_path, self.filename + '.part'), contents=b'\0' * self.size)
+
+            run(async_send_file(dest_server=self.s2, transfer_id=transfer_id,
+                                file=os.path.join(self.source_path, self.filename), chunk_size=4,
+                                identity=ROOT))
+
+            self.assertListEqual([self.filename], os.listdir(self.dest_path))
+            self.assertEqual(self.checksum, md5(os.path.join(self.dest_path, self.filename)))
+
+    def test_async_send_file_resume(self):
+        with virtual_network(self.app, self.app2) as (_, ar):
+            with self.app2.app_context():
+                transfer = Transfer(software=self.filename,
+                                    size=self.size,
+                                    checksum=self.checksum,
+                                    dest_path=self.dest_path,
+                                    num_chunks=16,
+                                    chunk_size=4,
+                                    status=TransferStatus.IN_PROGRESS)
+                for chunk in range(10):
+                    transfer.set_chunk_received(chunk)
+                transfer.chunk_checksums = {str(chunk): None for chunk in range(10)}
+                db.session.add(transfer)
+                db.session.commit()
+                transfer_id = transfer.id
+            self.fs.create_file(os.path.join(self.dest_path, self.filename + '.part'),
+                                contents=self.content[:40] + b'\0' * (self.size - 40))
+
+            run(async_send_file(dest_server=self.s2, transfer_id=transfer_id,
+                                file=os.path.join(self.source_path, self.filename), chunk_size=4,
+                                identity=ROOT))
+
+            sent = [url.path for method, url in ar.requests if method == 'POST']
+            self.assertEqual(6, len(sent))
+            self.assertEqual(self.checksum, md5(os.path.join(self.dest_path, self.filename)))
+
     def test_async_send_file_one_chunk(self):
         with virtual_network(self.app, self.app2):
             with self.app2.app_context():
@@ -80,7 +129,8 @@ class TestAsyncSendFile(TwoNodeMixin, TestCase):
         def post_callback_client(url, **kwargs):
             kwargs.pop('allow_redirects')
 
-            r = self.client2.post(url.path, json=kwargs['json'], headers=kwargs['headers'])
+            r = self.client2.post(url.path, json=kwargs.get('json'), data=kwargs.get('data'),
+                                  headers=kwargs['headers'])
 
             return CallbackResult('POST', status=r.status_code, body=r.data, content_type=r.content_type,
                                   headers=r.headers)
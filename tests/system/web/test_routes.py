@@ -11,3 +11,13 @@ class TestRoutes(OneNodeMixin, TestCase):
         mock_current_app.dm.cluster_manager.get_zombies.return_value = []
         response = self.client.get('/healthcheck')
         self.assertEqual(200, response.status_code)
+
+    @mock.patch('dimensigon.web.load_global_data_into_context')
+    def test_liveness(self, mock_load_global_data_into_context):
+        response = self.client.get('/alive')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(b'OK', response.data)
+        mock_load_global_data_into_context.assert_not_called()
+
+        response = self.client.post('/alive')
+        self.assertEqual(404, response.status_code)
@@ -52,3 +52,19 @@ class TestTransfer(TestDimensigonBase):
                  dest_path='/folder', num_chunks=0, file='/folder/filename',
                  status='WAITING_CHUNKS', created_on=d.strftime(defaults.DATETIME_FORMAT)),
             t.to_json())
+
+    def test_chunks_bitmap(self):
+        t = Transfer(software='filename', size=10, checksum='abc12', dest_path='/folder', num_chunks=20)
+
+        self.assertEqual(0, t.received_chunks)
+        self.assertListEqual([(0, 20)], t.missing_ranges())
+
+        for chunk in [0, 1, 5, 9, 10, 11, 19]:
+            t.set_chunk_received(chunk)
+        t.set_chunk_received(5)
+
+        self.assertEqual(3, len(t.chunks_bitmap))
+        self.assertEqual(7, t.received_chunks)
+        self.assertTrue(t.is_chunk_received(10))
+        self.assertFalse(t.is_chunk_received(12))
+        self.assertListEqual([(2, 5), (6, 9), (12, 19)], t.missing_ranges())
@@ -0,0 +1,57 @@
+from unittest import TestCase
+
+from dimensigon.use_cases.routing import RoutingGraph
+
+
+class TestRoutingGraph(TestCase):
+
+    def setUp(self) -> None:
+        self.graph = RoutingGraph()
+
+    def test_update(self):
+        self.assertSetEqual({'d1', 'd2'}, self.graph.update('n1', {'d1': 1, 'd2': None}))
+        self.assertSetEqual(set(), self.graph.update('n1', {'d1': 1, 'd2': None}, replace=True))
+        self.assertSetEqual({'d2'}, self.graph.update('n1', {'d2': 2}))
+        self.assertSetEqual({'d1', 'd3'}, self.graph.update('n1', {'d2': 2, 'd3': 1}, replace=True))
+        self.assertSetEqual({'d3'}, self.graph.update('n1', {}, removed=['d3']))
+        self.assertListEqual(['n1'], self.graph.neighbours)
+        self.assertTrue(self.graph.advertises('n1', 'd2'))
+        self.assertFalse(self.graph.advertises('n1', 'd3'))
+        self.assertFalse(self.graph.advertises('n2', 'd2'))
+
+    def test_best(self):
+        self.graph.update('n1', {'d1': 3, 'd2': None, 'd3': None})
+        self.graph.update('n2', {'d1': 2, 'd2': 4, 'd3': None})
+        self.graph.update('n3', {'d1': 2})
+
+        self.assertTupleEqual(('n2', 2), self.graph.best('d1'))
+        self.assertTupleEqual(('n2', 4), self.graph.best('d2'))
+        self.assertTupleEqual((None, None), self.graph.best('d3'))
+        self.assertIsNone(self.graph.best('d4'))
+
+        self.graph.reorder(['n3', 'n1'])
+        self.assertListEqual(['n3', 'n1', 'n2'], self.graph.neighbours)
+        self.assertTupleEqual(('n3', 2), self.graph.best('d1'))
+
+    def test_forget(self):
+        self.graph.update('n1', {'d1': 1, 'd2': 3})
+        self.graph.update('n2', {'d2': 2})
+
+        self.assertSetEqual({'d1', 'd2'}, self.graph.forget('n1'))
+        self.assertSetEqual(set(), self.graph.forget('n1'))
+        self.assertIsNone(self.graph.best('d1'))
+        self.assertTupleEqual(('n2', 2), self.graph.best('d2'))
+
+    def test_invalidate(self):
+        self.graph.invalidate('d1', 'd2')
+        self.graph.invalidate('d3')
+
+        self.assertSetEqual({'d1', 'd2', 'd3'}, self.graph.pop_invalidated())
+        self.assertSetEqual(set(), self.graph.pop_invalidated())
+
+    def test_clear(self):
+        self.graph.update('n1', {'d1': 1})
+        self.graph.clear()
+
+        self.assertListEqual([], self.graph.neighbours)
+        self.assertSetEqual({'d1'}, self.graph.update('n1', {'d1': 1}, replace=True))
@@ -148,6 +148,36 @@ class TestDAG(TestCase):
 
         self.assertEqual(5, g.depth)
 
+    def test_depth_long_chain(self):
+        g = DAG([(i, i + 1) for i in range(5000)])
+
+        self.assertEqual(5001, g.depth)
+        self.assertEqual(5001, g.level(5000))
+        self.assertListEqual(list(range(5001)), g.ordered_nodes)
+        self.assertFalse(g.is_cyclic())
+
+    def test_topology_invalidated(self):
+        g = DAG([(1, 2), (2, 3)])
+        self.assertEqual(3, g.depth)
+
+        g.add_edge(3, 4)
+        self.assertEqual(4, g.depth)
+        self.assertListEqual([4], g.get_nodes_at_level(4))
+
+        g.remove_edge(2, 3)
+        self.assertEqual(1, g.level(3))
+        self.assertListEqual([1, 3], g.get_nodes_at_level(1))
+
+        g.remove_node(1)
+        self.assertListEqual([2, 3], g.get_nodes_at_level(1))
+
+        g.add_edges_from([(4, 3)])
+        self.assertTrue(g.is_cyclic())
+        with self.assertRaises(DAGError):
+            g.level(3)
+        with self.assertRaises(DAGError):
+            g.depth
+
     def test_is_cyclic(self):
         g = DAG([(2, 0), (2, 3), (0, 1), (0, 2)])
         self.assertTrue(g.is_cyclic())
@@ -10,7 +10,7 @@ from unittest.mock import patch
 
 from pyfakefs.fake_filesystem_unittest import TestCase
 
-from dimensigon.utils.pygtail import Pygtail
+from dimensigon.utils.pygtail import Pygtail, BlockTail
 
 PY2 = sys.version_info[0] == 2
 
@@ -452,6 +452,120 @@ class PygtailTest(TestCase):
         self.assertEqual(pygtail.read(), "5,5.5\n6\n")
 
 
+class BlockTailTest(unittest.TestCase):
+
+    def setUp(self):
+        # file descriptors are not supported by pyfakefs
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.file = os.path.join(self.dir, 'app.log')
+        self.append(b'1\n2\n\x80\xff\n')
+
+    def append(self, data: bytes):
+        with open(self.file, 'ab') as fh:
+            fh.write(data)
+
+    def read_all(self, tail):
+        data = b''
+        block = tail.fetch()
+        while block:
+            data += block
+            tail.commit()
+            block = tail.fetch()
+        return data
+
+    def test_fetch_commit(self):
+        tail = BlockTail(self.file)
+        self.assertEqual(b'1\n2\n\x80\xff\n', tail.fetch())
+        # same block until committed
+        self.assertEqual(b'1\n2\n\x80\xff\n', tail.fetch())
+        tail.commit()
+        self.assertEqual(b'', tail.fetch())
+
+        self.append(b'3\n4')
+        self.assertEqual(b'3\n', tail.fetch())
+        tail.commit()
+        self.assertEqual(b'', tail.fetch())
+        self.append(b'\n')
+        self.assertEqual(b'4\n', tail.fetch())
+
+    def test_block_size(self):
+        self.append(b'x' * 10 + b'\n')
+        tail = BlockTail(self.file, block_size=4)
+
+        self.assertEqual(b'1\n2\n', tail.fetch())
+        self.assertTrue(tail.pending)
+        tail.commit()
+        self.assertEqual(b'\x80\xff\n', tail.fetch())
+        tail.commit()
+        # lines longer than a block are split
+        self.assertEqual(b'xxxx', tail.fetch())
+        tail.commit()
+        self.assertEqual(b'xxxxxx\n', self.read_all(tail))
+        self.assertFalse(tail.pending)
+
+    def test_checkpoint(self):
+        tail = BlockTail(self.file, checkpoint_period=3600)
+        self.read_all(tail)
+        self.assertFalse(os.path.exists(self.file + '.offset'))
+        tail.close()
+        with open(self.file + '.offset') as fh:
+            self.assertEqual([os.stat(self.file).st_ino, 7], [int(line) for line in fh])
+
+        self.append(b'3\n')
+        tail = BlockTail(self.file, checkpoint_period=0)
+        self.assertEqual(b'3\n', tail.fetch())
+        tail.commit()
+        with open(self.file + '.offset') as fh:
+            self.assertEqual([os.stat(self.file).st_ino, 9], [int(line) for line in fh])
+
+    def test_read_from_end(self):
+        tail = BlockTail(self.file, read_from_end=True)
+        self.assertEqual(b'', tail.fetch())
+        self.append(b'3\n')
+        self.assertEqual(b'3\n', tail.fetch())
+
+    def test_rotation(self):
+        tail = BlockTail(self.file)
+        self.read_all(tail)
+        self.append(b'3\n4')
+        os.rename(self.file, self.file + '.1')
+        self.append(b'5\n')
+
+        # rest of the rotated file, partial line included, is read before the new file
+        self.assertEqual(b'3\n4', tail.fetch())
+        self.assertTrue(tail.pending)
+        tail.commit()
+        self.assertEqual(b'5\n', self.read_all(tail))
+
+    def test_rotation_while_stopped(self):
+        tail = BlockTail(self.file)
+        self.read_all(tail)
+        tail.close()
+        self.append(b'3\n')
+        os.rename(self.file, self.file + '-20160616')
+        self.append(b'4\n')
+
+        tail = BlockTail(self.file)
+        self.assertEqual(b'3\n4\n', self.read_all(tail))
+
+    def test_copytruncate(self):
+        tail = BlockTail(self.file)
+        self.read_all(tail)
+        with open(self.file, 'wb') as fh:
+            fh.write(b'3\n')
+
+        self.assertEqual(b'3\n', self.read_all(tail))
+
+    def test_file_not_exists(self):
+        self.file = os.path.join(self.dir, 'other.log')
+        tail = BlockTail(self.file)
+        self.assertEqual(b'', tail.fetch())
+        self.append(b'1\n')
+        self.assertEqual(b'1\n', tail.fetch())
+
+
 def main():
     unittest.main(buffer=True)
 
@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from unittest import TestCase, mock
+
+from dimensigon.utils.timer_wheel import TimerWheel
+
+
+class TestTimerWheel(TestCase):
+
+    def setUp(self) -> None:
+        self.wheel = TimerWheel(tick=0.01, slots=8, max_workers=2)
+
+    def tearDown(self) -> None:
+        self.wheel.stop()
+
+    def test_schedule(self):
+        fired = threading.Event()
+        result = []
+
+        def func(*args, **kwargs):
+            result.append((args, kwargs, time.monotonic()))
+            fired.set()
+
+        start = time.monotonic()
+        self.wheel.schedule(0.05, func, args=(1,), kwargs=dict(a=2))
+
+        self.assertEqual(1, len(self.wheel))
+        self.assertTrue(fired.wait(2))
+        self.assertEqual(((1,), dict(a=2)), result[0][:2])
+        self.assertGreaterEqual(result[0][2] - start, 0.05)
+        self.assertEqual(0, len(self.wheel))
+
+    def test_schedule_further_than_a_rotation(self):
+        fired = []
+        done = threading.Event()
+        # 8 slots of 0.01 seconds. Timers share bucket with timers from other rotations
+        self.wheel.schedule(0.02, fired.append, args=('first',))
+        self.wheel.schedule(0.1, fired.append, args=('second',))
+        self.wheel.schedule(0.15, done.set)
+
+        self.assertTrue(done.wait(2))
+        self.assertListEqual(['first', 'second'], fired)
+
+    def test_cancel(self):
+        func = mock.Mock()
+        done = threading.Event()
+
+        timer = self.wheel.schedule(0.02, func)
+        self.wheel.schedule(0.05, done.set)
+        timer.cancel()
+        timer.cancel()
+
+        self.assertEqual(1, len(self.wheel))
+        self.assertTrue(done.wait(2))
+        func.assert_not_called()
+
+    def test_function_error_does_not_stop_wheel(self):
+        done = threading.Event()
+        self.wheel.schedule(0, mock.Mock(side_effect=RuntimeError))
+        self.wheel.schedule(0.02, done.set)
+
+        self.assertTrue(done.wait(2))
+
+    def test_single_thread(self):
+        threads = threading.active_count()
+        for i in range(500):
+            self.wheel.schedule(60 + i, mock.Mock())
+
+        self.assertEqual(500, len(self.wheel))
+        self.assertEqual(threads + 1, threading.active_count())
+
+    def test_stop(self):
+        func = mock.Mock()
+        self.wheel.schedule(0.02, func)
+        self.wheel.stop()
+        time.sleep(0.05)
+
+        func.assert_not_called()
+        self.assertEqual(0, len(self.wheel))
+
+        # wheel starts again
+        done = threading.Event()
+        self.wheel.schedule(0.01, done.set)
+        self.assertTrue(done.wait(2))
+
+    def test_fork_safety(self):
+        self.wheel.schedule(60, mock.Mock())
+        with mock.patch('dimensigon.utils.timer_wheel.os.getpid', return_value=os.getpid() + 1):
+            self.wheel.schedule(60, mock.Mock())
+
+        self.assertEqual(1, len(self.wheel))
@@ -47,7 +47,7 @@ class Test(ValidateResponseMixin, OneNodeMixin, TestCase):
         server, view = mock_post.call_args[0]
         kwargs = mock_post.call_args[1]
         self.assertEqual(self.node2, db.session.merge(server))
-        self.assertDictEqual({'software_id': str(self.soft.id), 'num_chunks': 1,
+        self.assertDictEqual({'software_id': str(self.soft.id), 'num_chunks': 1, 'chunk_size': 2097152,
                               'dest_path': self.dest_path}, kwargs['json'])
         self.assertEqual(202, resp.status_code)
         self.assertDictEqual({'transfer_id': '1'}, resp.get_json())
@@ -68,7 +68,7 @@ class Test(ValidateResponseMixin, OneNodeMixin, TestCase):
         server, view = mock_post.call_args[0]
         kwargs = mock_post.call_args[1]
         self.assertEqual(self.node2, db.session.merge(server))
-        self.assertDictEqual({'software_id': str(self.soft.id), 'num_chunks': 1,
+        self.assertDictEqual({'software_id': str(self.soft.id), 'num_chunks': 1, 'chunk_size': 2097152,
                               'dest_path': self.dest_path}, kwargs['json'])
         self.assertEqual(201, resp.status_code)
         self.assertDictEqual({'transfer_id': '1'}, resp.get_json())
@@ -95,7 +95,7 @@ class Test(ValidateResponseMixin, OneNodeMixin, TestCase):
         kwargs = mock_post.call_args[1]
         mock_asyncio_run.assert_called_once()
         self.assertEqual(self.node2, db.session.merge(server))
-        self.assertDictEqual({'filename': self.filename, 'num_chunks': 1, 'dest_path': self.dest_path,
+        self.assertDictEqual({'filename': self.filename, 'num_chunks': 1, 'chunk_size': 2097152, 'dest_path': self.dest_path,
                               'checksum': self.checksum, 'size': self.size},
                              kwargs['json'])
         self.assertEqual(201, resp.status_code)
@@ -123,7 +123,7 @@ class Test(ValidateResponseMixin, OneNodeMixin, TestCase):
         kwargs = mock_post.call_args[1]
         mock_executor_submit.assert_called_once()
         self.assertEqual(self.node2, db.session.merge(server))
-        self.assertDictEqual({'filename': self.filename, 'num_chunks': 1, 'dest_path': self.dest_path,
+        self.assertDictEqual({'filename': self.filename, 'num_chunks': 1, 'chunk_size': 2097152, 'dest_path': self.dest_path,
                               'checksum': self.checksum, 'size': self.size},
                              kwargs['json'])
         self.assertEqual(202, resp.status_code)